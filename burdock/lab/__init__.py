@@ -1,24 +1,54 @@
-from notebook.notebookapp import NotebookWebApplication
-from notebook.utils import url_path_join
-
-from burdock.lab.handlers import default_handlers
-from burdock.lab.manager import MultiBurdockManager
+import atexit
+import os
 
 __all__ = [
-    'load_jupyter_server_extension'
+    'load_ipython_extension',
+    'load_jupyter_server_extension',
 ]
 
+# Set to 0 to stop kernels from importing the analysis modules in the
+# background as soon as the extension is loaded.
+PREWARM_ENV = 'BURDOCK_PREWARM'
+
+
+def load_ipython_extension(ipython):
+    """
+    Called when the extension is loaded into an IPython kernel, i.e. by
+    `%load_ext burdock.lab`, or at startup for kernels launched with
+    `--ext=burdock.lab` (as the server extension launches IPython kernels).
+
+    Installs the agent. This only imports what the agent needs to talk to
+    the front end; the analysis modules are then loaded in the background,
+    unless BURDOCK_PREWARM=0.
 
-def load_jupyter_server_extension(nb_server_app: NotebookWebApplication):
+    Args:
+        ipython (InteractiveShell): the kernel's shell.
+    """
+    from burdock.lab.agent import install_agent
+
+    install_agent(ipython, prewarm=os.environ.get(PREWARM_ENV, '1') != '0')
+
+
+def load_jupyter_server_extension(nb_server_app):
     """
     Called when the extension is loaded.
 
     Args:
         nb_server_app (NotebookWebApplication): handle to the Notebook webserver instance.
     """
+    # Imported here, so that kernels importing the agent (this package's
+    # __init__ included) do not import the notebook server as well.
+    from notebook.utils import url_path_join
+
+    from burdock.lab.analysis.csv_file import CsvFileAnalyzer
+    from burdock.lab.handlers import default_handlers
+    from burdock.lab.manager import MultiBurdockManager
 
     multi_kernel_manager = nb_server_app.kernel_manager
     multi_burdock_manager = MultiBurdockManager(multi_kernel_manager)
+    file_analyzer = CsvFileAnalyzer()
+    # Removes the traces of the files analyzed when the server exits.
+    atexit.register(file_analyzer.close)
 
     # noinspection PyUnresolvedReferences
     web_app = nb_server_app.web_app
@@ -26,7 +56,8 @@ def load_jupyter_server_extension(nb_server_app: NotebookWebApplication):
 
     web_app.add_handlers(r'.*$', [
         (url_path_join(base_url, handler[0]), handler[1], {
-            'multi_burdock_manager': multi_burdock_manager
+            'multi_burdock_manager': multi_burdock_manager,
+            'file_analyzer': file_analyzer
         })
         for handler in default_handlers
     ])
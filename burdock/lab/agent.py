@@ -1,38 +1,135 @@
-import re
+import json
+import os
 import tempfile
-from typing import List
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
 
-import pandas as pd
 from IPython import InteractiveShell
 from IPython.utils.tokenutil import token_at_cursor
-from burdock.core import Burdock
-from burdock.util import run_daikon
-from burdock.matcher.common import numeric_matcher
-from burdock.expander.common import statistics_expander
 from ipykernel.comm import CommManager, Comm
 from ipykernel.ipkernel import IPythonKernel
 from jupyter_client.session import Session
 
+from burdock.lab.util.metrics import REGISTRY
+from burdock.lab.util.profiling import ProfileCapture
+from burdock.lab.util.timing import StageTimer
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from burdock.lab.analysis.catalog import InvariantPages
+    from burdock.lab.analysis.daikon import DaikonRun
+    from burdock.lab.analysis.incremental import IncrementalAnalyzer, IncrementalResult
+    from burdock.lab.analysis.layout import LayoutCache, SchemaLayout
+    from burdock.lab.analysis.profiles import AnalysisProfile
+    from burdock.lab.analysis.windows import WindowedAnalyzer
+
+# Minimum number of seconds between reports of the agent's metrics to the
+# server, and how often metrics recorded since the last report are sent.
+METRICS_REPORT_INTERVAL = 10.0
+
+# Attributes which are only set once the analysis modules are loaded (see
+# BurdockAgent.load), unless they were assigned before then.
+LOADED_ATTRIBUTES = ('layouts', 'incremental', 'windows', 'pages', 'analysis_profile', 'chunk_rows')
+
 
 class BurdockAgent:
     """
     A Burdock "agent" is installed into an IPython kernel, and is used
     to fulfill requests for information.
+
+    Installing an agent is cheap: the analysis modules (pandas, Burdock's
+    matchers and expanders, ...) are only imported by load, which happens
+    on the first analysis, or ahead of time in the background (see
+    prewarm). Until then, the attributes in LOADED_ATTRIBUTES are loaded
+    when they are first read.
     """
     shell: InteractiveShell
     # comm_manager:
 
     dataframes: List[str]
-
-    def __init__(self, shell: InteractiveShell):
+    layouts: 'LayoutCache'
+    incremental: 'IncrementalAnalyzer'
+    windows: 'WindowedAnalyzer'
+    # Result sets of inspections, whose later pages are asked for by cursor.
+    pages: 'InvariantPages'
+    # Used when a request does not name a profile (see analysis.profiles).
+    analysis_profile: 'AnalysisProfile'
+    # Frames with more rows than this are traced in chunks of this many rows
+    # (see analysis.chunked), or never if None.
+    chunk_rows: Optional[int]
+
+    # Open comms, by id (the front end's and the server's).
+    _comms: Dict[str, Comm]
+    _metrics_thread: Optional[threading.Thread]
+    _last_metrics_report: float
+    _loaded: bool
+    _load_lock: threading.Lock
+
+    def __init__(self, shell: InteractiveShell, install: bool = True):
         self.shell = shell
 
         self.session = Session()
         self.dataframes = list()
 
-        self.install()
+        self._comms = dict()
+        self._metrics_thread = None
+        self._last_metrics_report = time.monotonic()
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+        # An agent which is not installed (e.g. for benchmarking) can still
+        # analyze the shell's dataframes, but cannot talk to the front end.
+        if install:
+            self.install()
         self.update_dataframes()
 
+    def __getattr__(self, name):
+        # Only called for attributes which are not set, i.e. before load.
+        if name in LOADED_ATTRIBUTES and not self.__dict__.get('_loaded', True):
+            self.load()
+            return getattr(self, name)
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+    def load(self):
+        """Imports the analysis modules, and sets up the caches which depend
+           on them, if that has not happened yet. Safe to call from any
+           thread; concurrent callers wait for the first to finish."""
+        with self._load_lock:
+            if self._loaded:
+                return
+
+            with REGISTRY.span('burdock_agent_load_seconds',
+                               'Time taken to import the analysis modules into a kernel.'):
+                from burdock.lab.analysis.catalog import InvariantPages
+                from burdock.lab.analysis.chunked import DEFAULT_CHUNK_ROWS
+                from burdock.lab.analysis.incremental import IncrementalAnalyzer
+                from burdock.lab.analysis.layout import LayoutCache
+                from burdock.lab.analysis.profiles import get_profile
+                from burdock.lab.analysis.windows import WindowedAnalyzer
+
+                defaults = {
+                    'layouts': LayoutCache(),
+                    'incremental': IncrementalAnalyzer(),
+                    'windows': WindowedAnalyzer(),
+                    'pages': InvariantPages(),
+                    'analysis_profile': get_profile(None),
+                    'chunk_rows': DEFAULT_CHUNK_ROWS,
+                }
+
+            for name, value in defaults.items():
+                self.__dict__.setdefault(name, value)
+            self._loaded = True
+
+    def prewarm(self) -> threading.Thread:
+        """Loads the analysis modules in a background (daemon) thread, so
+           that the first inspection does not wait for them. The import
+           competes with the kernel's own work for the GIL while it runs."""
+        thread = threading.Thread(target=self.load, name='burdock-prewarm', daemon=True)
+        thread.start()
+        return thread
+
     # --------------------------------------------------------------------------
     # Delegated Properties
     # --------------------------------------------------------------------------
@@ -55,23 +152,103 @@ class BurdockAgent:
         self.shell.user_ns['__burdock__'] = self
 
         # Register for post_execute events (so that we can update our dataframes).
-        self.shell.events.register('post_execute', self.update_dataframes)
+        if self.update_dataframes not in self.shell.events.callbacks['post_execute']:
+            self.shell.events.register('post_execute', self.update_dataframes)
 
         # Establish a comm target to talk to the front end.
         def dummy_target_func(comm: Comm, open_msg):
+            self._comms[comm.comm_id] = comm
+
             @comm.on_msg
             def _recv(msg):
-                code = msg['content']['data']['code']
-                cursor_pos = msg['content']['data']['cursor_pos']
-
-                comm.send(self.do_inspect(code, cursor_pos))
+                reply, buffers = self.handle_request(msg['content']['data'])
+                comm.send(reply, metadata=self._metrics_report(), buffers=buffers)
 
             @comm.on_close
             def _close(msg):
-                pass
+                self._comms.pop(comm.comm_id, None)
+                self._send_metrics(comm, force=True)
 
         self.comm_manager.register_target('burdocklab_target', dummy_target_func)
 
+        # Metrics recorded after the last reply would otherwise wait for the next one.
+        if self._metrics_thread is None or not self._metrics_thread.is_alive():
+            self._metrics_thread = threading.Thread(target=self._report_metrics, name='burdock-metrics', daemon=True)
+            self._metrics_thread.start()
+
+    def handle_request(self, data: dict) -> Tuple[dict, list]:
+        """
+        Answers a request sent over the comm, returning the reply and its
+        buffers. Requests are inspections (from the front end), unless
+        data['request'] says otherwise:
+
+            statistics   per-column statistics of the named dataframe
+            profile      a profile of one analysis of the named dataframe
+
+        If data['binary'] is set, bulk data (invariants, statistics) is sent
+        in the message's buffers (see kernel.buffers) rather than as JSON.
+        """
+        buffers = [] if data.get('binary') else None
+        request = data.get('request', 'inspect')
+
+        if request == 'statistics':
+            reply = self.column_statistics(data['name'], buffers=buffers)
+        elif request == 'profile':
+            reply = self.profile_reply(data['name'])
+        elif request == 'inspect':
+            reply = self.do_inspect(data['code'], data['cursor_pos'],
+                                    profile=data.get('profile', False),
+                                    analysis_profile=data.get('analysis_profile'),
+                                    columns=data.get('columns'),
+                                    kinds=data.get('kinds'),
+                                    min_confidence=data.get('min_confidence'),
+                                    limit=data.get('limit'),
+                                    cursor=data.get('cursor'),
+                                    buffers=buffers)
+        else:
+            reply = {
+                'status': 'error',
+                'ename': 'KeyError',
+                'evalue': f"Unknown request: {request!r}",
+            }
+        return reply, buffers or []
+
+    def _metrics_report(self, force: bool = False) -> Optional[dict]:
+        """Returns the metrics recorded since the last report, as message
+           metadata, if there are any and it is time to report them (or force
+           is set). The server picks these up from iopub, so reporting along
+           with a reply costs no extra messages."""
+        now = time.monotonic()
+        if not force and now - self._last_metrics_report < METRICS_REPORT_INTERVAL:
+            return None
+        if REGISTRY.is_empty():
+            return None
+
+        self._last_metrics_report = now
+        return {'burdock_metrics': REGISTRY.drain()}
+
+    def _send_metrics(self, comm: Comm, force: bool = False):
+        """Sends a report (see _metrics_report) on comm on its own, i.e. not
+           along with a reply. It has no parent, so it answers nothing: with
+           comm.send, it would look like a reply to whatever request the
+           kernel is handling at the time."""
+        report = self._metrics_report(force)
+        if report is None:
+            return
+
+        kernel = self.kernel
+        kernel.session.send(kernel.iopub_socket, 'comm_msg',
+                            {'comm_id': comm.comm_id, 'data': {'status': 'ok', 'request': 'metrics'}},
+                            metadata=report, parent=None, ident=comm.topic)
+
+    def _report_metrics(self):
+        # Runs in the burdock-metrics thread (see install), until the kernel exits.
+        while True:
+            time.sleep(METRICS_REPORT_INTERVAL)
+            comms = list(self._comms.values())
+            if comms:
+                self._send_metrics(comms[-1])
+
     # --------------------------------------------------------------------------
     # DataFrame variable tracking
     # --------------------------------------------------------------------------
@@ -98,13 +275,129 @@ class BurdockAgent:
     def update_dataframes(self):
         self.dataframes = self.get_dataframes()
 
+    def column_statistics(self, name: str, buffers: Optional[list] = None) -> dict:
+        """
+        The count (of values present), mean, standard deviation, minimum
+        and maximum of each numeric column of the named dataframe, as one
+        array per statistic, in column order. Missing statistics (e.g. the
+        mean of an empty column) are NaN, or None in JSON.
+
+        If buffers is given, the arrays are packed into it (see
+        kernel.buffers.pack_arrays) rather than encoded as JSON.
+        """
+        import numpy as np
+        import pandas as pd
+        from burdock.lab.kernel.buffers import pack_arrays
+
+        df = self.shell.user_ns.get(name)
+        if not isinstance(df, pd.DataFrame):
+            return {'status': 'ok', 'found': False}
+
+        numeric = df.select_dtypes('number')
+        # Each a single reduction over the whole frame (DataFrame.agg goes column by column).
+        arrays = {statistic: getattr(numeric, statistic)().to_numpy(dtype=np.float64)
+                  for statistic in ('count', 'mean', 'std', 'min', 'max')}
+
+        if buffers is not None:
+            statistics = {'arrays': pack_arrays(arrays, buffers)}
+        else:
+            statistics = {statistic: [None if np.isnan(value) else value for value in array.tolist()]
+                          for statistic, array in arrays.items()}
+
+        return {
+            'status': 'ok',
+            'found': True,
+            'columns': [str(column) for column in numeric.columns],
+            'statistics': statistics,
+        }
+
     # --------------------------------------------------------------------------
     # Running Daikon (via Burdock)
     # --------------------------------------------------------------------------
 
-    def do_inspect(self, code, cursor_pos):
+    def do_inspect(self, code, cursor_pos, timer: Optional[StageTimer] = None, profile: bool = False,
+                   analysis_profile: Optional[str] = None, columns: Optional[List[str]] = None,
+                   kinds: Optional[List[str]] = None, min_confidence: Optional[float] = None,
+                   limit: Optional[int] = None, cursor: Optional[str] = None, buffers: Optional[list] = None):
+        """
+        Answers an inspection request from the front end, analyzing with
+        the named analysis profile (by default, self.analysis_profile). If
+        profile is set, the analysis is profiled (see profile) and the
+        report is included in the reply.
+
+        The reply holds the first page of (at most limit) invariants which
+        mention any of columns, are of any of kinds and have at least
+        min_confidence (see analysis.catalog), and a cursor to the next page,
+        if any. Given a cursor, the page it points to is returned instead,
+        without analyzing anything. If buffers is given, the page's
+        invariants are packed into it (see kernel.buffers.pack_invariants)
+        rather than encoded as JSON.
+        """
+        with REGISTRY.span('burdock_agent_inspect_seconds',
+                           'Time taken by the agent to answer an inspection request.'):
+            return self._do_inspect(code, cursor_pos, timer, profile, analysis_profile,
+                                    columns, kinds, min_confidence, limit, cursor, buffers)
+
+    def _do_inspect(self, code, cursor_pos, timer: Optional[StageTimer] = None, profile: bool = False,
+                    analysis_profile: Optional[str] = None, columns: Optional[List[str]] = None,
+                    kinds: Optional[List[str]] = None, min_confidence: Optional[float] = None,
+                    limit: Optional[int] = None, cursor: Optional[str] = None, buffers: Optional[list] = None):
+        if timer is None:
+            timer = StageTimer(registry=REGISTRY)
+
+        with timer.stage('load'):
+            self.load()
+
+        import pandas as pd
+        from burdock.lab.analysis.catalog import DEFAULT_PAGE_SIZE, InvariantFilter, structure_invariants
+        from burdock.lab.analysis.profiles import get_profile
+
+        limit = DEFAULT_PAGE_SIZE if limit is None else max(int(limit), 1)
+
+        if cursor is not None:
+            try:
+                page = self.pages.page(cursor, limit)
+            except KeyError:
+                return {
+                    'status': 'error',
+                    'ename': 'KeyError',
+                    'evalue': f"Unknown or expired cursor: {cursor!r}",
+                    'mimebundle': {},
+                    'found': False,
+                }
+            return {
+                'status': 'ok',
+                'mimebundle': {'application/json': {'is_dataframe': True, **page.as_dict(buffers)}},
+                'found': True,
+            }
+
+        try:
+            invariant_filter = InvariantFilter.create(columns, kinds, min_confidence)
+        except KeyError as e:
+            return {
+                'status': 'error',
+                'ename': 'KeyError',
+                'evalue': e.args[0],
+                'mimebundle': {},
+                'found': False,
+            }
+
         name = token_at_cursor(code, cursor_pos)
 
+        if analysis_profile is None:
+            analysis = self.analysis_profile
+        else:
+            try:
+                analysis = get_profile(analysis_profile)
+            except KeyError:
+                return {
+                    'status': 'error',
+                    'ename': 'KeyError',
+                    'evalue': f"Unknown analysis profile: {analysis_profile!r}",
+                    'mimebundle': {},
+                    'found': False,
+                }
+
         reply_data = {
             'status': 'ok',
             'mimebundle': {},
@@ -114,20 +407,27 @@ class BurdockAgent:
             reply_data['mimebundle'].update({'application/json': {'is_dataframe': is_dataframe}})
 
             if is_dataframe:
-                daikon_stdout: str = self.analyze(name)
-                regex = r"(?::::POINT$\s+)((?:.*\s+)+)?Exiting Daikon."
+                if profile:
+                    result, reply_data['profile'] = self._profile(name, timer, analysis)
+                else:
+                    result = self._inspect_invariants(name, timer, analysis)
 
-                matches = re.findall(regex, daikon_stdout, re.MULTILINE)
-                invariants = matches[0].splitlines()
+                with timer.stage('paginate'):
+                    structured = structure_invariants(result.by_columns, self.shell.user_ns[name])
+                    page = self.pages.first(invariant_filter.apply(structured), limit)
 
                 reply_data['mimebundle'].update(
                     {
                         'application/json': {
                             'is_dataframe': is_dataframe,
-                            'invariants': invariants
+                            **page.as_dict(buffers)
                         }
                     }
                 )
+                reply_data['reuse'] = result.report.as_dict()
+                if result.trace is not None:
+                    reply_data['trace'] = result.trace
+                reply_data['analysis_profile'] = analysis.name
             # if not self.shell.enable_html_pager:
             #     reply_content['mimebundle'].pop('text/html')
             reply_data['found'] = True
@@ -136,32 +436,183 @@ class BurdockAgent:
 
         return reply_data
 
-    def analyze(self, name: str) -> (str, str):
+    def _layout(self, name: str, timer: StageTimer,
+                analysis: 'AnalysisProfile') -> Tuple['pd.DataFrame', 'SchemaLayout']:
+        import pandas as pd
+
         user_ns = self.shell.user_ns
         assert name in user_ns
 
         df = user_ns.get(name)
         assert isinstance(df, pd.DataFrame)
 
-        burdock = Burdock(name, df,
-                          matchers=[numeric_matcher],
-                          expanders=[statistics_expander])
-        burdock.match()
-        burdock.expand()
-
-        # todo: don't spew so many tmp files...
-        decls_tmp = tempfile.NamedTemporaryFile(mode='w+',
-                                                prefix='burdock-',
-                                                suffix='.decls',
-                                                delete=False)
-        burdock.write_decls(decls_tmp)
-        decls_tmp.flush()
-
-        dtrace_tmp = tempfile.NamedTemporaryFile(mode='w+',
-                                                 prefix='burdock-',
-                                                 suffix='.dtrace',
-                                                 delete=False)
-        burdock.write_dtrace(dtrace_tmp)
-        dtrace_tmp.flush()
-
-        return run_daikon(decls_tmp.name, dtrace_tmp.name)
\ No newline at end of file
+        # Matching, and declaring the variables, depend only on the schema.
+        with timer.stage('match'):
+            layout = self.layouts.get(name, df,
+                                      matchers=analysis.matchers,
+                                      expanders=analysis.expanders)
+        return df, layout
+
+    def _inspect_invariants(self, name: str, timer: StageTimer,
+                            analysis: 'AnalysisProfile') -> 'IncrementalResult':
+        """The invariants of the named dataframe, recomputing only those
+           involving columns which changed since it was last inspected."""
+        df, layout = self._layout(name, timer, analysis)
+        return self.incremental.analyze(layout, df, timer, analysis, self.chunk_rows)
+
+    def generate_daikon_inputs(self, name: str, timer: Optional[StageTimer] = None) -> Tuple[str, str]:
+        """Writes the .decls and .dtrace files for the named dataframe, and
+           returns their paths. The caller is responsible for removing them.
+           The frame is declared as a single program point, i.e. wide frames
+           are not split as they are for inspection."""
+        if timer is None:
+            timer = StageTimer(registry=REGISTRY)
+
+        with timer.stage('load'):
+            self.load()
+
+        from burdock.lab.analysis.chunked import ChunkedTraceWriter
+
+        df, layout = self._layout(name, timer, self.analysis_profile)
+        if self.chunk_rows is not None and len(df) > self.chunk_rows:
+            with timer.stage('expand'):
+                writer = ChunkedTraceWriter(layout, df, self.chunk_rows)
+            write_decls, write_dtrace = writer.write_decls, writer.write_dtrace
+        else:
+            with timer.stage('expand'):
+                expansion = layout.expand(df)
+
+            def write_decls(out):
+                layout.write_decls(out, expansion)
+
+            def write_dtrace(out):
+                layout.write_dtrace(out, df, expansion)
+
+        # The trace is written first, as chunked declarations depend on it.
+        with timer.stage('write_dtrace'):
+            dtrace_tmp = tempfile.NamedTemporaryFile(mode='w+',
+                                                     prefix='burdock-',
+                                                     suffix='.dtrace',
+                                                     delete=False)
+            with dtrace_tmp:
+                write_dtrace(dtrace_tmp)
+
+        with timer.stage('write_decls'):
+            decls_tmp = tempfile.NamedTemporaryFile(mode='w+',
+                                                    prefix='burdock-',
+                                                    suffix='.decls',
+                                                    delete=False)
+            with decls_tmp:
+                write_decls(decls_tmp)
+
+        return decls_tmp.name, dtrace_tmp.name
+
+    def _analyze(self, name: str, timer: StageTimer) -> 'DaikonRun':
+        from burdock.lab.analysis.daikon import run_daikon
+
+        decls_path, dtrace_path = self.generate_daikon_inputs(name, timer)
+        try:
+            with timer.stage('run_daikon'):
+                return run_daikon(decls_path, dtrace_path, self.analysis_profile.daikon_options())
+        finally:
+            os.remove(decls_path)
+            os.remove(dtrace_path)
+
+    def analyze(self, name: str, timer: Optional[StageTimer] = None) -> str:
+        if timer is None:
+            timer = StageTimer(registry=REGISTRY)
+
+        return self._analyze(name, timer).stdout
+
+    def _profile(self, name: str, timer: StageTimer,
+                 analysis: 'AnalysisProfile') -> Tuple['IncrementalResult', dict]:
+        start = time.perf_counter()
+        with ProfileCapture() as capture:
+            result = self._inspect_invariants(name, timer, analysis)
+        wall = time.perf_counter() - start
+
+        report = capture.report()
+        report.update({
+            'name': name,
+            'analysis_profile': analysis.name,
+            'wall': wall,
+            'stages': timer.as_dict(),
+            'reuse': result.report.as_dict(),
+            'trace': result.trace,
+            'daikon': result.run.stats() if result.run is not None else None,
+        })
+        return result, report
+
+    def profile(self, name: str) -> dict:
+        """
+        Analyzes the named dataframe once under cProfile and tracemalloc, and
+        returns a JSON-safe report: the pstats data and a summary of it, the
+        top allocations, per-stage times, and Daikon's own wall time, CPU
+        time and peak RSS (Daikon runs in a separate JVM, so cProfile and
+        tracemalloc cannot see inside it).
+
+        The frame is analyzed in full, i.e. nothing is reused from earlier
+        inspections of it.
+        """
+        self.incremental.forget(name)
+        _, report = self._profile(name, StageTimer(registry=REGISTRY), self.analysis_profile)
+        return report
+
+    def profile_reply(self, name: str) -> dict:
+        """The reply to a profile request: the report (see profile), unless
+           there is no such dataframe."""
+        import pandas as pd
+
+        if not isinstance(self.shell.user_ns.get(name), pd.DataFrame):
+            return {'status': 'ok', 'found': False}
+        return {'status': 'ok', 'found': True, 'report': self.profile(name)}
+
+    # --------------------------------------------------------------------------
+    # Windowed (time series) analysis
+    # --------------------------------------------------------------------------
+
+    def analyze_windows(self, name: str, time_column: Optional[str] = None, freq: str = 'Y',
+                        size: Optional[str] = None, analysis_profile: Optional[str] = None) -> Iterator[dict]:
+        """
+        Analyzes the named dataframe per time window (see
+        analysis.windows.split_windows), yielding each window's invariants,
+        and those which appeared or disappeared since the previous window,
+        in window order.
+        """
+        self.load()
+
+        import pandas as pd
+        from burdock.lab.analysis.profiles import get_profile
+
+        df = self.shell.user_ns[name]
+        assert isinstance(df, pd.DataFrame)
+        analysis = self.analysis_profile if analysis_profile is None else get_profile(analysis_profile)
+
+        frame = df if time_column is None else df.drop(columns=[time_column])
+        layout = self.layouts.get(name, frame, matchers=analysis.matchers, expanders=analysis.expanders)
+
+        for result in self.windows.analyze(layout, df, time_column, freq, size, analysis):
+            yield result.model()
+
+    def print_windows(self, *args, **kwargs):
+        """Prints the results of analyze_windows as they become available,
+           one JSON object per line. This is how they are streamed to the
+           server, as each line is sent on iopub as soon as it is flushed."""
+        for model in self.analyze_windows(*args, **kwargs):
+            print(json.dumps(model), flush=True)
+
+
+def install_agent(shell: InteractiveShell, prewarm: bool = False) -> BurdockAgent:
+    """Installs an agent into the shell, unless one already is (e.g. by the
+       IPython extension, see burdock.lab.load_ipython_extension), and
+       returns it. If prewarm is set, the analysis modules are loaded in
+       the background (see BurdockAgent.prewarm)."""
+    agent = shell.user_ns.get('__burdock__')
+    if isinstance(agent, BurdockAgent):
+        agent.install()
+    else:
+        agent = BurdockAgent(shell)
+
+    if prewarm:
+        agent.prewarm()
+    return agent
@@ -0,0 +1,182 @@
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+from pandas import DataFrame
+
+from burdock.lab.analysis.incremental import ColumnSet
+from burdock.lab.analysis.invariants import INVARIANT_KINDS, classify_invariant
+from burdock.lab.kernel.buffers import pack_invariants
+
+# Invariants per page, unless a request asks for another number.
+DEFAULT_PAGE_SIZE = 50
+
+
+@dataclass(frozen=True)
+class StructuredInvariant:
+    """
+    An invariant, along with its kind (see classify_invariant), the columns
+    it mentions (in frame order), and its confidence: the fraction of the
+    frame's rows in which none of those columns is missing, i.e. from which
+    it was inferred. Daikon's own confidence is not part of its output.
+    """
+    text: str
+    kind: str
+    columns: Tuple[str, ...]
+    confidence: float
+
+
+def structure_invariants(by_columns: Mapping[ColumnSet, List[str]], df: DataFrame) -> List[StructuredInvariant]:
+    """Structures invariants keyed by the columns they mention (see
+       IncrementalResult.by_columns), in order."""
+    order = {column: i for i, column in enumerate(df.columns)}
+    # Only columns with missing values lower anyone's confidence.
+    present = {column: df[column].notna().to_numpy() for column in df.columns if df[column].hasnans}
+
+    structured = []
+    for columns, invariants in by_columns.items():
+        sparse = [present[column] for column in columns if column in present]
+        confidence = float(np.logical_and.reduce(sparse).mean()) if sparse and len(df) else 1.0
+        names = tuple(str(column) for column in sorted(columns, key=lambda column: order.get(column, len(order))))
+
+        structured.extend(StructuredInvariant(invariant, classify_invariant(invariant), names, confidence)
+                          for invariant in invariants)
+    return structured
+
+
+@dataclass(frozen=True)
+class InvariantFilter:
+    """Which invariants an inspection request asks for: those mentioning
+       any of columns, of any of kinds, with at least min_confidence. Any
+       criterion left as None is not applied."""
+    columns: Optional[FrozenSet[str]] = None
+    kinds: Optional[FrozenSet[str]] = None
+    min_confidence: Optional[float] = None
+
+    @staticmethod
+    def create(columns: Optional[Iterable[str]] = None, kinds: Optional[Iterable[str]] = None,
+               min_confidence: Optional[float] = None) -> 'InvariantFilter':
+        """Raises KeyError for kinds not in INVARIANT_KINDS."""
+        if kinds is not None:
+            unknown = set(kinds) - set(INVARIANT_KINDS)
+            if unknown:
+                raise KeyError(f"Unknown invariant kinds: {sorted(unknown)!r}")
+
+        return InvariantFilter(
+            columns=frozenset(str(column) for column in columns) if columns is not None else None,
+            kinds=frozenset(kinds) if kinds is not None else None,
+            min_confidence=float(min_confidence) if min_confidence is not None else None,
+        )
+
+    def __call__(self, invariant: StructuredInvariant) -> bool:
+        return ((self.columns is None or not self.columns.isdisjoint(invariant.columns))
+                and (self.kinds is None or invariant.kind in self.kinds)
+                and (self.min_confidence is None or invariant.confidence >= self.min_confidence))
+
+    def apply(self, invariants: Iterable[StructuredInvariant]) -> List[StructuredInvariant]:
+        return [invariant for invariant in invariants if self(invariant)]
+
+
+def encode_invariants(invariants: Sequence[StructuredInvariant]) -> dict:
+    """
+    Encodes invariants column-wise, with the column names and kinds they
+    mention listed once and referred to by index:
+
+        {'columns': ['hp', 'hp_max'], 'kinds': ['bounds', 'comparison'],
+         'text': ['hp >= 0', 'hp_max >= hp'], 'kind': [0, 1],
+         'column_ids': [[0], [0, 1]], 'confidence': [1.0, 0.98]}
+    """
+    columns: Dict[str, int] = OrderedDict()
+    kinds: Dict[str, int] = OrderedDict()
+
+    column_ids = [[columns.setdefault(column, len(columns)) for column in invariant.columns]
+                  for invariant in invariants]
+    kind_ids = [kinds.setdefault(invariant.kind, len(kinds)) for invariant in invariants]
+
+    return {
+        'columns': list(columns),
+        'kinds': list(kinds),
+        'text': [invariant.text for invariant in invariants],
+        'kind': kind_ids,
+        'column_ids': column_ids,
+        'confidence': [round(invariant.confidence, 4) for invariant in invariants],
+    }
+
+
+@dataclass
+class InvariantPage:
+    invariants: List[StructuredInvariant]
+    # The number of invariants across every page.
+    total: int
+    # Where the next page starts, if there is one.
+    next_cursor: Optional[str] = None
+
+    def as_dict(self, buffers: Optional[list] = None) -> dict:
+        """If buffers is given, the invariants are packed into it (see
+           pack_invariants) rather than encoded as JSON."""
+        if buffers is not None:
+            invariants = pack_invariants(self.invariants, buffers)
+        else:
+            invariants = encode_invariants(self.invariants)
+        return {
+            'invariants': invariants,
+            'total': self.total,
+            'next_cursor': self.next_cursor,
+        }
+
+
+class InvariantPages:
+    """
+    Serves (filtered) invariants a page at a time. The first page is cut
+    from a fresh result set, which is kept if there is more to it, so that
+    later pages (asked for by cursor) are served without analyzing the
+    frame again, and are consistent with the first even if the frame has
+    since changed.
+
+    Result sets are kept least recently used first, up to maxsize of them;
+    the cursors into those evicted become unknown.
+    """
+    maxsize: int
+
+    _results: Dict[str, List[StructuredInvariant]]
+    _lock: threading.Lock
+
+    def __init__(self, maxsize: int = 32):
+        self.maxsize = maxsize
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+    def _cut(self, result_id: str, invariants: List[StructuredInvariant], offset: int, limit: int) -> InvariantPage:
+        end = offset + limit
+        next_cursor = f'{result_id}:{end}' if end < len(invariants) else None
+        return InvariantPage(invariants[offset:end], len(invariants), next_cursor)
+
+    def first(self, invariants: List[StructuredInvariant], limit: int = DEFAULT_PAGE_SIZE) -> InvariantPage:
+        if len(invariants) <= limit:
+            return InvariantPage(invariants, len(invariants))
+
+        result_id = uuid.uuid4().hex
+        with self._lock:
+            self._results[result_id] = invariants
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+        return self._cut(result_id, invariants, 0, limit)
+
+    def page(self, cursor: str, limit: int = DEFAULT_PAGE_SIZE) -> InvariantPage:
+        """Raises KeyError if the cursor is malformed, or its result set is
+           unknown (e.g. evicted)."""
+        result_id, _, offset = cursor.partition(':')
+        if not offset.isdigit():
+            raise KeyError(cursor)
+
+        with self._lock:
+            invariants = self._results[result_id]
+            self._results.move_to_end(result_id)
+        return self._cut(result_id, invariants, int(offset), limit)
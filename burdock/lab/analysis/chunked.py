@@ -0,0 +1,146 @@
+from typing import Dict, Mapping, Optional, Sequence, TextIO
+
+import pandas as pd
+from burdock.core import DaikonType, DaikonVariable
+from burdock.expander.common import StatisticsExpander
+from pandas import DataFrame
+
+from burdock.lab.analysis.layout import Expansion, SchemaLayout
+from burdock.lab.analysis.serialize import write_dtrace_records
+from burdock.lab.analysis.statistics import RunningStatistics
+from burdock.lab.util.memory import TracedPeak
+
+# Default number of rows expanded and serialized at once.
+DEFAULT_CHUNK_ROWS = 100_000
+
+
+class ChunkedTraceWriter:
+    """
+    Writes the .dtrace and .decls for a frame (as SchemaLayout.write_dtrace
+    and write_decls do, or their group variants if groups are given) one
+    block of chunk_rows rows at a time: each block is expanded and written
+    out before the next one is, so the memory needed beyond the frame
+    itself is proportional to the block size rather than the frame's.
+
+    The StatisticsExpander's constants are accumulated across blocks with
+    RunningStatistics. Unlike a file's (see CsvFileAnalyzer), the frame's
+    columns are all in memory, so their quantiles are then computed exactly,
+    one column at a time. Other expanders' constants are computed from
+    whole columns, and their latent variables a block at a time, i.e. they
+    are assumed to be row-wise.
+
+    The trace must be written before the declarations, which depend on the
+    statistics accumulated while tracing.
+
+    Memory is only measured (see TracedPeak) if tracemalloc is already
+    tracing, e.g. while profiling an inspection or benchmarking, as it
+    makes writing the trace several times slower.
+    """
+    layout: SchemaLayout
+    df: DataFrame
+    chunk_rows: int
+    groups: Optional[Mapping[str, Sequence[str]]]
+
+    rows: int
+    chunks: int
+    # The largest peak memory allocated (as seen by tracemalloc) while
+    # expanding and writing any one block, beyond what was allocated before,
+    # or None if tracemalloc was not tracing.
+    peak_bytes: Optional[int]
+
+    _statistics: Dict[str, RunningStatistics]
+    _sample: Expansion
+    _expansion: Optional[Expansion]
+
+    def __init__(self, layout: SchemaLayout, df: DataFrame, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                 groups: Optional[Mapping[str, Sequence[str]]] = None):
+        self.layout = layout
+        self.df = df
+        self.chunk_rows = chunk_rows
+        self.groups = groups
+
+        self.rows = 0
+        self.chunks = 0
+        self.peak_bytes = None
+
+        self._statistics = {column: RunningStatistics(column)
+                            for column, expander in layout.expansions
+                            if isinstance(expander, StatisticsExpander)}
+        # Expanding the first block declares the layout's latent variables
+        # (if that has not happened yet), and tells us where they come from.
+        self._sample = layout.expand(df.iloc[:chunk_rows])
+        self._expansion = None
+
+    def _expand_block(self, block: DataFrame) -> DataFrame:
+        latent_frames = []
+        for column, expander in self.layout.expansions:
+            vars_df = expander.expand_variables(block[column])
+            if len(vars_df.columns):
+                latent_frames.append(vars_df.set_axis(block.index, axis=0))
+
+        if latent_frames:
+            block = pd.concat([block, *latent_frames], axis=1)
+        return block
+
+    def write_dtrace(self, out: TextIO):
+        if self.groups is None:
+            ppts = {self.layout.name: self.layout.variables + self.layout.latent_variables}
+        else:
+            ppts = {ppt: [var for var in self.layout.group_variables(columns, self._sample) if not var.is_constant]
+                    for ppt, columns in self.groups.items()}
+
+        for start in range(0, len(self.df), self.chunk_rows):
+            with TracedPeak() as peak:
+                block = self.df.iloc[start:start + self.chunk_rows]
+                for column, statistics in self._statistics.items():
+                    statistics.update(block[column])
+
+                block = self._expand_block(block)
+                for ppt, variables in ppts.items():
+                    write_dtrace_records(out, ppt, block, variables)
+
+            if peak.bytes is not None:
+                self.peak_bytes = max(self.peak_bytes or 0, peak.bytes)
+            self.rows += len(block)
+            self.chunks += 1
+
+    @property
+    def expansion(self) -> Expansion:
+        """The frame's constants, and the sources of every expanded variable,
+           as SchemaLayout.expand would return them (without latent traces,
+           which are never held for the whole frame)."""
+        if self._expansion is None:
+            assert self.chunks or not len(self.df), "write_dtrace must be called first"
+
+            expansion = Expansion(sources=dict(self._sample.sources))
+            for column, expander in self.layout.expansions:
+                if column in self._statistics:
+                    statistics = self._statistics[column]
+                    statistics.update_quantiles(self.df[column])
+                    constants = list(statistics.constants().values())
+                else:
+                    const_df = expander.expand_constants(self.df[column])
+                    constants = [DaikonVariable(const_name, DaikonType.from_dtype(dtype),
+                                                constant_value=const_df[const_name].iloc[0])
+                                 for const_name, dtype in const_df.dtypes.items()]
+
+                for var in constants:
+                    expansion.constants.append(var)
+                    expansion.sources[var.name] = column
+            self._expansion = expansion
+
+        return self._expansion
+
+    def write_decls(self, out: TextIO):
+        if self.groups is None:
+            self.layout.write_decls(out, self.expansion)
+        else:
+            self.layout.write_group_decls(out, self.expansion, self.groups)
+
+    def stats(self) -> dict:
+        return {
+            'rows': self.rows,
+            'chunks': self.chunks,
+            'chunk_rows': self.chunk_rows,
+            'peak_bytes': self.peak_bytes,
+        }
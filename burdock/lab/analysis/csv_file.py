@@ -0,0 +1,418 @@
+import hashlib
+import io
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from os import path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+from pandas import DataFrame
+
+from burdock.core import DaikonType, DaikonVariable
+from burdock.matcher.common import numeric_matcher
+
+from burdock.lab.analysis.daikon import run_daikon
+from burdock.lab.analysis.invariants import parse_invariants
+from burdock.lab.analysis.serialize import write_decls, write_dtrace_records
+from burdock.lab.analysis.statistics import RunningStatistics
+from burdock.lab.util.metrics import REGISTRY
+from burdock.lab.util.timing import StageTimer
+
+# Default number of bytes of the file parsed (and held in memory) at once.
+DEFAULT_CHUNK_BYTES = 4 * 1024 * 1024
+
+# Default number of files whose analyses are cached (with their traces on
+# disk); the least recently used are discarded beyond it.
+DEFAULT_MAX_FILES = 64
+
+# Number of bytes on either side of a previously analyzed region that are
+# hashed to decide whether a grown file has only been appended to.
+_DIGEST_SPAN = 4096
+
+
+class CsvFormatError(ValueError):
+    """Raised when a file is empty (or has no rows), cannot be parsed or
+       decoded, or when rows later in a file cannot be represented with the
+       types inferred from its first chunk. The message does not name the
+       file (whose path on the server is not for clients to see)."""
+    pass
+
+
+def _read_csv(data: bytes, **kwargs) -> DataFrame:
+    """pd.read_csv over data read from a file, raising CsvFormatError
+       for anything wrong with the data itself."""
+    try:
+        return pd.read_csv(io.BytesIO(data), **kwargs)
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+        raise CsvFormatError(f"it could not be parsed: {e}")
+
+
+@dataclass(frozen=True)
+class FileIdentity:
+    """Identifies a particular version of a file on disk."""
+    inode: int
+    size: int
+    mtime_ns: int
+
+    @staticmethod
+    def of(file_path: str) -> 'FileIdentity':
+        st = os.stat(file_path)
+        return FileIdentity(st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+@dataclass
+class FileAnalysis:
+    """
+    The cached result (and the state needed to extend it) of analyzing a
+    single CSV/TSV file. The generated .decls and .dtrace files are kept
+    on disk so that appended rows can be traced without re-reading the
+    rows before them.
+    """
+    path: str
+    name: str
+    sep: str
+    identity: FileIdentity
+
+    columns: List[str]
+    dtypes: Dict[str, object]
+    variables: List[DaikonVariable]
+    statistics: Dict[str, RunningStatistics]
+
+    decls_path: str
+    dtrace_path: str
+
+    # Digests of the head and of the last bytes analyzed, used to check
+    # that a grown file still starts with the bytes we analyzed.
+    head_digest: bytes = b''
+    tail_digest: bytes = b''
+
+    rows: int = 0
+    invariants: List[str] = field(default_factory=list)
+
+    def model(self, status: str, new_rows: int) -> dict:
+        """Return a JSON-safe dict, for use in the JSON API."""
+        return {
+            'path': self.path,
+            'status': status,
+            'rows': self.rows,
+            'new_rows': new_rows,
+            'columns': self.columns,
+            'invariants': self.invariants,
+        }
+
+
+def _separator_for(file_path: str) -> str:
+    ext = path.splitext(file_path)[1].lower()
+    return '\t' if ext in ('.tsv', '.tab') else ','
+
+
+def _digest(mm: mmap.mmap, start: int, end: int) -> bytes:
+    return hashlib.blake2b(mm[max(start, 0):end], digest_size=16).digest()
+
+
+def _iter_blocks(mm: mmap.mmap, start: int, end: int, chunk_bytes: int) -> Iterator[Tuple[int, int]]:
+    """Yields (begin, end) byte offsets covering mm[start:end], each roughly
+       chunk_bytes long and ending just after a newline (or at the end)."""
+    begin = start
+    while begin < end:
+        stop = mm.find(b'\n', min(begin + chunk_bytes, end) - 1, end)
+        stop = end if stop == -1 else stop + 1
+        yield begin, stop
+        begin = stop
+
+
+class CsvFileAnalyzer:
+    """
+    Analyzes CSV/TSV files on the server, without loading them into a
+    kernel. Files are memory-mapped and parsed a chunk at a time, and each
+    chunk is written out as trace records before the next one is parsed,
+    so memory use is bounded by the chunk size rather than the file size.
+
+    Results are cached by file identity (inode, size, mtime). When a file
+    has grown but its previously analyzed bytes are unchanged, only the
+    new tail is parsed and appended to the existing trace.
+
+    Only tracing is incremental: Daikon is still re-run over the whole
+    trace after an append.
+
+    Each file is analyzed under a lock of its own, so different files are
+    analyzed concurrently, while concurrent requests for the same file wait
+    for (and then reuse) one analysis.
+
+    At most max_files analyses are cached; beyond that, the least recently
+    used are discarded (with their traces). Unless a workdir is given, the
+    traces are kept in a temporary directory, which close removes.
+
+    Note: chunks are split on newlines, so quoted fields containing
+    newlines are not supported.
+    """
+    chunk_bytes: int
+    max_files: int
+    workdir: str
+
+    # In order of use, the least recently used first.
+    _cache: 'OrderedDict[str, FileAnalysis]'
+    _file_locks: Dict[str, threading.Lock]
+    # Guards _cache and _file_locks (but is never held while analyzing).
+    _lock: threading.Lock
+    _owns_workdir: bool
+
+    def __init__(self, chunk_bytes: int = DEFAULT_CHUNK_BYTES, workdir: Optional[str] = None,
+                 max_files: int = DEFAULT_MAX_FILES):
+        self.chunk_bytes = chunk_bytes
+        self.max_files = max_files
+        self._owns_workdir = not workdir
+        self.workdir = workdir if workdir else tempfile.mkdtemp(prefix='burdock-files-')
+        self._cache = OrderedDict()
+        self._file_locks = dict()
+        self._lock = threading.Lock()
+
+    def _file_lock(self, file_path: str) -> threading.Lock:
+        with self._lock:
+            return self._file_locks.setdefault(file_path, threading.Lock())
+
+    def analyze(self, file_path: str) -> dict:
+        """Analyze the file at file_path (or reuse a cached analysis), and
+           return a JSON-safe model of the result."""
+        file_path = path.realpath(file_path)
+
+        try:
+            return self._analyze(file_path)
+        finally:
+            self._evict_least_recently_used()
+
+    def _analyze(self, file_path: str) -> dict:
+        with self._file_lock(file_path):
+            identity = FileIdentity.of(file_path)
+            with self._lock:
+                cached = self._cache.get(file_path)
+                if cached:
+                    self._cache.move_to_end(file_path)
+
+            if cached and cached.identity == identity:
+                self._count('hit')
+                return cached.model('cached', 0)
+
+            try:
+                if cached and self._is_append(cached, identity):
+                    new_rows = self._trace_tail(cached, identity)
+                    status = 'appended'
+                else:
+                    if cached:
+                        self._discard(cached)
+                    cached = self._trace_file(file_path, identity)
+                    new_rows = cached.rows
+                    status = 'analyzed'
+            except CsvFormatError:
+                # A partially extended trace is useless, so don't keep it.
+                if cached:
+                    self._discard(cached)
+                with self._lock:
+                    self._cache.pop(file_path, None)
+                raise
+
+            self._count('append' if status == 'appended' else 'miss')
+            with self._lock:
+                self._cache[file_path] = cached
+                self._cache.move_to_end(file_path)
+            self._run_daikon(cached)
+            return cached.model(status, new_rows)
+
+    @staticmethod
+    def _count(result: str):
+        REGISTRY.inc('burdock_file_cache_total',
+                     'File analysis cache lookups, by result (hit, append or miss).',
+                     result=result)
+
+    def evict(self, file_path: str):
+        file_path = path.realpath(file_path)
+        with self._file_lock(file_path):
+            with self._lock:
+                analysis = self._cache.pop(file_path, None)
+            if analysis:
+                self._discard(analysis)
+
+    def _evict_least_recently_used(self):
+        """Discards the least recently used analyses beyond max_files. Each
+           is discarded under its file's lock (and no other, so that this
+           cannot deadlock with another file's analysis), unless it has been
+           used again meanwhile."""
+        with self._lock:
+            excess = len(self._cache) - self.max_files
+            evicted = [self._cache.popitem(last=False) for _ in range(max(excess, 0))]
+
+        for file_path, analysis in evicted:
+            with self._file_lock(file_path):
+                with self._lock:
+                    if self._cache.get(file_path) is analysis:
+                        continue
+                self._discard(analysis)
+
+    def close(self):
+        """Discards every cached analysis, and removes the workdir if it was
+           created for this analyzer."""
+        with self._lock:
+            analyses = list(self._cache.values())
+            self._cache.clear()
+        for analysis in analyses:
+            self._discard(analysis)
+
+        if self._owns_workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+    @staticmethod
+    def _discard(analysis: FileAnalysis):
+        for generated_path in (analysis.decls_path, analysis.dtrace_path):
+            if path.exists(generated_path):
+                os.remove(generated_path)
+
+    # --------------------------------------------------------------------------
+    # Tracing
+    # --------------------------------------------------------------------------
+
+    def _read_block(self, analysis: FileAnalysis, block: bytes) -> DataFrame:
+        df = _read_csv(block, sep=analysis.sep, header=None, names=analysis.columns)
+
+        # Later chunks may infer narrower types than the first one did (e.g.
+        # a float column whose values happen to be whole). Only conversions
+        # which cannot lose information are allowed.
+        for i, var in enumerate(analysis.variables):
+            chunk_type = DaikonType.from_dtype(df[var.name].dtype)
+            if chunk_type == var.rep_type:
+                continue
+
+            if var.rep_type == DaikonType.string \
+                    or (var.rep_type == DaikonType.float and chunk_type == DaikonType.integer):
+                df[var.name] = df[var.name].astype(analysis.dtypes[var.name])
+            elif var.rep_type == DaikonType.integer and chunk_type == DaikonType.float:
+                # e.g. missing values in a column which had none so far. The
+                # column becomes a float from now on; the integers already
+                # traced are read by Daikon as floats just the same, and the
+                # decls are written after tracing.
+                analysis.variables[i] = DaikonVariable(var.name, DaikonType.float)
+                analysis.dtypes[var.name] = df[var.name].dtype
+            else:
+                raise CsvFormatError(
+                    f"its column {var.name} contains values that are not {var.rep_type}."
+                )
+        return df
+
+    def _trace_blocks(self, analysis: FileAnalysis, mm: mmap.mmap, start: int, end: int) -> int:
+        rows = 0
+        with open(analysis.dtrace_path, 'a') as dtrace:
+            for begin, stop in _iter_blocks(mm, start, end, self.chunk_bytes):
+                df = self._read_block(analysis, mm[begin:stop])
+
+                for column, stats in analysis.statistics.items():
+                    stats.update(df[column])
+
+                write_dtrace_records(dtrace, analysis.name, df, analysis.variables)
+                rows += len(df)
+        return rows
+
+    def _trace_file(self, file_path: str, identity: FileIdentity) -> FileAnalysis:
+        if identity.size == 0:
+            raise CsvFormatError("it is empty.")
+
+        name = path.splitext(path.basename(file_path))[0]
+        sep = _separator_for(file_path)
+
+        fd, decls_path = tempfile.mkstemp(prefix=f'{name}-', suffix='.decls', dir=self.workdir)
+        os.close(fd)
+        fd, dtrace_path = tempfile.mkstemp(prefix=f'{name}-', suffix='.dtrace', dir=self.workdir)
+        os.close(fd)
+
+        try:
+            return self._trace_new_file(file_path, identity, name, sep, decls_path, dtrace_path)
+        except BaseException:
+            # Nothing refers to the generated files but the analysis which failed.
+            for generated_path in (decls_path, dtrace_path):
+                if path.exists(generated_path):
+                    os.remove(generated_path)
+            raise
+
+    def _trace_new_file(self, file_path: str, identity: FileIdentity, name: str, sep: str,
+                        decls_path: str, dtrace_path: str) -> FileAnalysis:
+        with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            end = identity.size
+            header_end = mm.find(b'\n', 0, end)
+            header_end = end if header_end == -1 else header_end + 1
+            _, first_end = next(_iter_blocks(mm, 0, end, self.chunk_bytes))
+
+            # The first chunk (including the header) determines the schema.
+            first = _read_csv(mm[0:first_end], sep=sep)
+            columns = [str(c) for c in first.columns]
+
+            analysis = FileAnalysis(
+                path=file_path,
+                name=name,
+                sep=sep,
+                identity=identity,
+                columns=columns,
+                dtypes={c: first[c].dtype for c in columns},
+                variables=[DaikonVariable(c, DaikonType.from_dtype(first[c].dtype)) for c in columns],
+                statistics={c: RunningStatistics(c) for c in columns if numeric_matcher(first[c])},
+                decls_path=decls_path,
+                dtrace_path=dtrace_path,
+            )
+            del first
+
+            analysis.rows = self._trace_blocks(analysis, mm, header_end, end)
+            if analysis.rows == 0:
+                raise CsvFormatError("it has no rows.")
+            analysis.head_digest = _digest(mm, 0, min(_DIGEST_SPAN, end))
+            analysis.tail_digest = _digest(mm, end - _DIGEST_SPAN, end)
+
+        self._write_decls(analysis)
+        return analysis
+
+    def _is_append(self, analysis: FileAnalysis, identity: FileIdentity) -> bool:
+        old = analysis.identity
+        if identity.inode != old.inode or identity.size <= old.size:
+            return False
+
+        with open(analysis.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # A row which was cut off (no trailing newline) cannot be extended.
+            if mm[old.size - 1:old.size] != b'\n':
+                return False
+
+            return _digest(mm, 0, min(_DIGEST_SPAN, old.size)) == analysis.head_digest \
+                and _digest(mm, old.size - _DIGEST_SPAN, old.size) == analysis.tail_digest
+
+    def _trace_tail(self, analysis: FileAnalysis, identity: FileIdentity) -> int:
+        start, end = analysis.identity.size, identity.size
+
+        with open(analysis.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            new_rows = self._trace_blocks(analysis, mm, start, end)
+            analysis.tail_digest = _digest(mm, end - _DIGEST_SPAN, end)
+
+        analysis.rows += new_rows
+        analysis.identity = identity
+
+        # The statistics constants have changed, so the decls must be rewritten.
+        self._write_decls(analysis)
+        return new_rows
+
+    # --------------------------------------------------------------------------
+    # Running Daikon
+    # --------------------------------------------------------------------------
+
+    @staticmethod
+    def _write_decls(analysis: FileAnalysis):
+        constants = []
+        for stats in analysis.statistics.values():
+            constants.extend(stats.constants().values())
+
+        with open(analysis.decls_path, 'w') as decls:
+            write_decls(decls, analysis.name, analysis.variables + constants)
+
+    @staticmethod
+    def _run_daikon(analysis: FileAnalysis):
+        with StageTimer(registry=REGISTRY).stage('run_daikon'):
+            run = run_daikon(analysis.decls_path, analysis.dtrace_path)
+        analysis.invariants = parse_invariants(run.stdout)
@@ -0,0 +1,104 @@
+import os
+import subprocess
+import tempfile
+import time
+from dataclasses import dataclass, field
+from os import path
+from typing import Callable, List, Optional, Sequence, TextIO
+
+from burdock.lab.util.timing import StageTimer
+
+
+@dataclass
+class DaikonRun:
+    """The output of a single Daikon run, along with what it cost. Resource
+       usage is only available on platforms with os.wait4 (i.e. not Windows)."""
+    stdout: str
+    wall: float
+    max_rss: Optional[int] = None
+    user_time: Optional[float] = None
+    system_time: Optional[float] = None
+    args: List[str] = field(default_factory=list)
+
+    def stats(self) -> dict:
+        return {
+            'wall': self.wall,
+            'max_rss': self.max_rss,
+            'user_time': self.user_time,
+            'system_time': self.system_time,
+        }
+
+
+def daikon_command(decls_path: str, dtrace_path: str, options: Sequence[str] = ()) -> List[str]:
+    daikon_jar = path.join(os.environ.get('DAIKONDIR', ''), 'daikon.jar')
+    return ['java', '-cp', daikon_jar, 'daikon.Daikon', '--nohierarchy', *options, decls_path, dtrace_path]
+
+
+def _exit_code(status: int) -> int:
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def run_daikon(decls_path: str, dtrace_path: str, options: Sequence[str] = ()) -> DaikonRun:
+    """
+    Runs Daikon over the given .decls and .dtrace files, as burdock.util.run_daikon
+    does, but returns its output rather than printing it, and also measures
+    the subprocess's own wall time, CPU time and peak RSS.
+
+    Raises subprocess.CalledProcessError if Daikon fails.
+    """
+    args = daikon_command(decls_path, dtrace_path, options)
+
+    start = time.perf_counter()
+    process = subprocess.Popen(args, stdout=subprocess.PIPE)
+
+    if not hasattr(os, 'wait4'):
+        stdout, _ = process.communicate()
+        run = DaikonRun(stdout.decode(), time.perf_counter() - start, args=args)
+    else:
+        with process.stdout:
+            stdout = process.stdout.read()
+
+        # Reap the process ourselves, so that we get its resource usage.
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = _exit_code(status)
+
+        # ru_maxrss is in kilobytes on Linux, but in bytes on macOS.
+        max_rss = usage.ru_maxrss if os.uname().sysname == 'Darwin' else usage.ru_maxrss * 1024
+        run = DaikonRun(stdout.decode(), time.perf_counter() - start,
+                        max_rss=max_rss,
+                        user_time=usage.ru_utime,
+                        system_time=usage.ru_stime,
+                        args=args)
+
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, args, output=run.stdout)
+
+    return run
+
+
+def run_daikon_on(write_decls: Callable[[TextIO], None],
+                  write_dtrace: Callable[[TextIO], None],
+                  timer: StageTimer,
+                  options: Sequence[str] = ()) -> DaikonRun:
+    """Runs Daikon over inputs written by the given functions to temporary
+       files, which are removed afterwards. Writing and running are timed
+       as the write_decls, write_dtrace and run_daikon stages. The trace is
+       written first, so that the declarations may depend on what was traced
+       (see ChunkedTraceWriter)."""
+    fd, decls_path = tempfile.mkstemp(prefix='burdock-', suffix='.decls')
+    os.close(fd)
+    fd, dtrace_path = tempfile.mkstemp(prefix='burdock-', suffix='.dtrace')
+    os.close(fd)
+
+    try:
+        with timer.stage('write_dtrace'), open(dtrace_path, 'w') as dtrace:
+            write_dtrace(dtrace)
+        with timer.stage('write_decls'), open(decls_path, 'w') as decls:
+            write_decls(decls)
+        with timer.stage('run_daikon'):
+            return run_daikon(decls_path, dtrace_path, options)
+    finally:
+        os.remove(decls_path)
+        os.remove(dtrace_path)
@@ -0,0 +1,280 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from itertools import combinations
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import pandas as pd
+from pandas import DataFrame, Series
+
+from burdock.lab.analysis.chunked import ChunkedTraceWriter
+from burdock.lab.analysis.daikon import DaikonRun, run_daikon_on
+from burdock.lab.analysis.invariants import parse_ppt_invariants
+from burdock.lab.analysis.layout import Expansion, SchemaLayout
+from burdock.lab.analysis.profiles import STANDARD, AnalysisProfile
+from burdock.lab.util.metrics import REGISTRY
+from burdock.lab.util.timing import StageTimer
+
+ColumnSet = FrozenSet[str]
+
+
+def column_fingerprint(series: Series) -> Optional[str]:
+    """A digest of a column's dtype, index and values. Returns None for
+       columns whose values cannot be hashed (e.g. lists), which are then
+       always treated as changed."""
+    try:
+        hashes = pd.util.hash_pandas_object(series, index=True).values
+    except TypeError:
+        return None
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(series.dtype).encode())
+    digest.update(hashes.tobytes())
+    return digest.hexdigest()
+
+
+def _choose(n: int, k: int) -> int:
+    result = 1
+    for i in range(k):
+        result = result * (n - i) // (i + 1)
+    return result
+
+
+def _cost(groups: Mapping[str, Sequence[str]], arity: int) -> int:
+    """An estimate of the cost of running Daikon over the given program
+       points: the number of combinations of arity columns within each,
+       which Daikon checks every invariant of that arity against, and which
+       dominate its running time."""
+    return sum(_choose(len(columns), arity) for columns in groups.values())
+
+
+def _names_pattern(names: Iterable[str]) -> re.Pattern:
+    # Longest first, so that e.g. 'hp_max' is never read as 'hp'.
+    alternatives = sorted((str(name) for name in names), key=len, reverse=True)
+    return re.compile('|'.join(f'(?<![\\w.]){re.escape(name)}(?!\\w)' for name in alternatives))
+
+
+@dataclass
+class FrameState:
+    """What is remembered about the last analysis of a frame: a fingerprint
+       per column, and its invariants keyed by the columns they involve."""
+    fingerprints: Dict[str, Optional[str]]
+    invariants: Dict[ColumnSet, List[str]]
+
+
+@dataclass
+class ReuseReport:
+    """How much of an analysis was reused from the previous one."""
+    mode: str
+    columns: int
+    changed_columns: List[str] = field(default_factory=list)
+    reused_invariants: int = 0
+    recomputed_invariants: int = 0
+
+    def as_dict(self) -> dict:
+        total = self.reused_invariants + self.recomputed_invariants
+        return {
+            'mode': self.mode,
+            'columns': self.columns,
+            'changed_columns': [str(column) for column in self.changed_columns],
+            'reused_invariants': self.reused_invariants,
+            'recomputed_invariants': self.recomputed_invariants,
+            'reused_fraction': self.reused_invariants / total if total else 1.0,
+        }
+
+
+@dataclass
+class IncrementalResult:
+    invariants: List[str]
+    report: ReuseReport
+    run: Optional[DaikonRun] = None
+    # ChunkedTraceWriter.stats, if the frame was traced in chunks.
+    trace: Optional[dict] = None
+    # The same invariants, keyed by the columns they mention.
+    by_columns: Dict[ColumnSet, List[str]] = field(default_factory=dict)
+
+
+class IncrementalAnalyzer:
+    """
+    Analyzes frames, reusing the invariants of columns which have not
+    changed since the frame was last analyzed (e.g. after `df['x'] = ...`).
+
+    Each column is fingerprinted, and each invariant is stored under the
+    set of columns it mentions. When only some columns have changed (or
+    been added), invariants over untouched columns are reused as they are,
+    and Daikon is run over one program point holding the changed columns,
+    plus one per untouched column pairing it with the changed ones (or, if
+    the profile finds ternary invariants, one per pair of untouched
+    columns, so that invariants relating a changed column to two untouched
+    ones are found too).
+
+    Where the analysis profile splits the frame into groups of columns
+    (see AnalysisProfile.column_groups), only the groups containing a
+    changed column are analyzed again.
+
+    A frame is analyzed in full instead whenever that is estimated to be
+    cheaper (see _cost), e.g. when most of its columns have changed.
+    Invariants which mention no column at all are recomputed whenever
+    anything has changed. Invariants are only reused between analyses with
+    the same profile.
+    """
+    maxsize: int
+
+    _states: Dict[Tuple[str, str], FrameState]
+    _lock: threading.Lock
+
+    def __init__(self, maxsize: int = 32):
+        self.maxsize = maxsize
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def forget(self, name: str):
+        with self._lock:
+            for key in [key for key in self._states if key[0] == name]:
+                del self._states[key]
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+
+    def _remember(self, key: Tuple[str, str], state: FrameState):
+        with self._lock:
+            self._states[key] = state
+            self._states.move_to_end(key)
+            while len(self._states) > self.maxsize:
+                self._states.popitem(last=False)
+
+    @staticmethod
+    def _attribute(layout: SchemaLayout, expansion: Expansion, columns: Iterable[str],
+                   invariants: List[str]) -> Dict[ColumnSet, List[str]]:
+        variables = layout.group_variables(columns, expansion)
+        sources = {str(var.name): layout.source_of(var.name, expansion) for var in variables}
+        pattern = _names_pattern(sources)
+
+        by_columns: Dict[ColumnSet, List[str]] = OrderedDict()
+        for invariant in invariants:
+            mentioned = frozenset(sources[match] for match in pattern.findall(invariant))
+            by_columns.setdefault(mentioned, []).append(invariant)
+        return by_columns
+
+    def analyze(self, layout: SchemaLayout, df: DataFrame, timer: StageTimer,
+                profile: AnalysisProfile = STANDARD, chunk_rows: Optional[int] = None) -> IncrementalResult:
+        """Frames with more than chunk_rows rows are traced in chunks of that
+           many rows (see ChunkedTraceWriter)."""
+        name = layout.name
+        key = (name, profile.name)
+        columns = list(df.columns)
+
+        with timer.stage('fingerprint'):
+            fingerprints = {column: column_fingerprint(df[column]) for column in columns}
+
+        with self._lock:
+            previous = self._states.get(key)
+
+        if previous is None:
+            changed = columns
+        else:
+            changed = [column for column in columns
+                       if fingerprints[column] is None or previous.fingerprints.get(column) != fingerprints[column]]
+        untouched = [column for column in columns if column not in changed]
+
+        kept: Dict[ColumnSet, List[str]] = OrderedDict()
+        if previous is not None:
+            untouched_set = frozenset(untouched)
+            kept.update((cols, invs) for cols, invs in previous.invariants.items()
+                        if cols <= untouched_set and (cols or not changed))
+
+        changed_set = frozenset(changed)
+        # The only program point which may contribute invariants over
+        # changed columns alone (the others would duplicate them), if any.
+        primary = None
+
+        column_groups = None
+        if changed:
+            with timer.stage('relate'):
+                column_groups = profile.column_groups(df)
+
+        if column_groups is not None:
+            full_groups = OrderedDict((f'{name}_g{i}', list(group)) for i, group in enumerate(column_groups))
+        else:
+            full_groups = {name: columns}
+
+        partial_groups = OrderedDict()
+        if previous is not None and changed:
+            if column_groups is not None:
+                partial_groups.update((ppt, group) for ppt, group in full_groups.items() if changed_set & set(group))
+            else:
+                primary = f'{name}_changed'
+                partners = combinations(untouched, 2) if profile.finds_ternary and len(untouched) >= 2 \
+                    else ((column,) for column in untouched)
+                partial_groups[primary] = changed
+                partial_groups.update((f'{name}_u{i}', changed + list(group)) for i, group in enumerate(partners))
+
+        arity = 3 if profile.finds_ternary else min(profile.max_arity, 2)
+        if previous is not None and not changed:
+            mode = 'reused'
+        elif partial_groups and _cost(partial_groups, arity) < _cost(full_groups, arity):
+            mode = 'partial'
+        else:
+            mode = 'full'
+            kept.clear()
+
+        report = ReuseReport(mode, len(columns), changed,
+                             reused_invariants=sum(len(invs) for invs in kept.values()))
+        REGISTRY.inc('burdock_incremental_analyses_total',
+                     'Analyses by how much could be reused (reused, partial or full).', mode=mode)
+
+        run = None
+        trace = None
+        recomputed: Dict[ColumnSet, List[str]] = OrderedDict()
+
+        if mode != 'reused':
+            options = profile.daikon_options()
+            groups = partial_groups if mode == 'partial' else full_groups
+
+            ppt_groups = None if groups.keys() == {name} else groups
+
+            if chunk_rows is not None and len(df) > chunk_rows:
+                with timer.stage('expand'):
+                    writer = ChunkedTraceWriter(layout, df, chunk_rows, ppt_groups)
+                run = run_daikon_on(writer.write_decls, writer.write_dtrace, timer, options)
+                expansion = writer.expansion
+                trace = writer.stats()
+            else:
+                with timer.stage('expand'):
+                    expansion = layout.expand(df)
+                if ppt_groups is None:
+                    run = run_daikon_on(lambda out: layout.write_decls(out, expansion),
+                                        lambda out: layout.write_dtrace(out, df, expansion),
+                                        timer, options)
+                else:
+                    run = run_daikon_on(lambda out: layout.write_group_decls(out, expansion, ppt_groups),
+                                        lambda out: layout.write_group_dtrace(out, df, expansion, ppt_groups),
+                                        timer, options)
+
+            with timer.stage('parse_invariants'):
+                ppt_invariants = parse_ppt_invariants(run.stdout)
+                seen = set()
+
+                for ppt, group_columns in groups.items():
+                    by_columns = self._attribute(layout, expansion, group_columns, ppt_invariants.get(ppt, []))
+                    for cols, invariants in by_columns.items():
+                        if mode == 'partial' and ((cols and not cols & changed_set)
+                                                  or (primary and ppt != primary and cols <= changed_set)):
+                            continue
+                        for invariant in invariants:
+                            if invariant not in seen:
+                                seen.add(invariant)
+                                recomputed.setdefault(cols, []).append(invariant)
+
+            report.recomputed_invariants = len(seen)
+
+        store = OrderedDict(kept)
+        for cols, invariants in recomputed.items():
+            store.setdefault(cols, []).extend(invariants)
+        self._remember(key, FrameState(fingerprints, store))
+
+        invariants = [invariant for invs in store.values() for invariant in invs]
+        return IncrementalResult(invariants, report, run, trace, store)
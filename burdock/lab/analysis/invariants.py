@@ -0,0 +1,85 @@
+import re
+from typing import Dict, List
+
+_invariants_re = re.compile(r"(?::::POINT$\s+)((?:.*\s+)+)?Exiting Daikon.", re.MULTILINE)
+_ppt_re = re.compile(r"^(.+)\.data:::POINT$")
+
+_string_re = re.compile(r'"(?:[^"\\]|\\.)*"')
+# Variables, but not functions (e.g. max(a, b)) or numbers.
+_variable_re = re.compile(r'(?<![\w.])([A-Za-z_][\w.]*(?:\[\])?)(?![\w(]|\s*\()')
+# Printed by Daikon as values, but read as variables by _variable_re.
+_literals = frozenset({'null', 'true', 'false'})
+_comparison_re = re.compile(r'\s(==|!=|<=|>=|<|>)\s')
+_arithmetic_re = re.compile(r'\s[-+*/]\s|\w\(')
+
+# The kinds of invariant told apart by classify_invariant: the families of
+# analysis.profiles.INVARIANT_FAMILIES, plus equality between variables
+# (which Daikon always looks for) and anything else.
+INVARIANT_KINDS = ('bounds', 'one_of', 'nonzero', 'modulus', 'comparison', 'equality', 'linear', 'ternary', 'other')
+
+
+def parse_invariants(daikon_stdout: str) -> List[str]:
+    """Extracts the invariant lines (one per invariant) from Daikon's
+       textual output for a single program point."""
+    matches = _invariants_re.findall(daikon_stdout)
+    return matches[0].splitlines()
+
+
+def parse_ppt_invariants(daikon_stdout: str) -> Dict[str, List[str]]:
+    """Extracts the invariant lines from Daikon's textual output for any
+       number of program points, keyed by program point name (without the
+       '.data:::POINT' suffix)."""
+    ppts: Dict[str, List[str]] = dict()
+    current = None
+
+    for line in daikon_stdout.splitlines():
+        if line.startswith('Exiting Daikon.'):
+            break
+        if line.startswith('====='):
+            current = None
+            continue
+
+        match = _ppt_re.match(line)
+        if current is None and match:
+            current = ppts.setdefault(match.group(1), [])
+        elif current is not None and line:
+            current.append(line)
+
+    return ppts
+
+
+def classify_invariant(invariant: str) -> str:
+    """The kind (one of INVARIANT_KINDS) of an invariant, as printed by
+       Daikon, e.g. 'bounds' for "hp >= 0" or 'linear' for
+       "hp_max == 2 * hp + 1"."""
+    if ' one of ' in invariant or invariant.endswith(' has only one value'):
+        return 'one_of'
+
+    text = _string_re.sub('""', invariant)
+    # As variables may have % in their names (e.g. 'hp_25%').
+    if ' % ' in text:
+        return 'modulus'
+
+    parts = _comparison_re.split(text)
+    variables = set(_variable_re.findall(text)) - _literals
+    sides, operators = [part.strip() for part in parts[::2]], parts[1::2]
+
+    if (len(sides) > 2 and set(operators) == {'=='}
+            and all(_variable_re.fullmatch(side) and side not in _literals for side in sides)):
+        return 'equality'
+    if len(sides) != 2:
+        return 'other'
+    if len(variables) >= 3:
+        return 'ternary'
+
+    lhs, rhs = sides
+    operator = operators[0]
+    if len(variables) == 1:
+        if operator == '!=':
+            return 'nonzero' if rhs in ('0', 'null') else 'other'
+        return 'one_of' if operator == '==' else 'bounds'
+    if len(variables) == 2:
+        if _arithmetic_re.search(lhs) or _arithmetic_re.search(rhs):
+            return 'linear'
+        return 'equality' if operator == '==' else 'comparison'
+    return 'other'
@@ -0,0 +1,211 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Set, TextIO, Tuple
+
+import pandas as pd
+from pandas import DataFrame
+
+from burdock.core import DaikonType, DaikonVariable
+from burdock.expander import Expander
+from burdock.matcher import Matcher
+
+from burdock.lab.analysis.serialize import DECLS_PREAMBLE, decl_block, decls_header, ppt_header, \
+    write_dtrace_records
+from burdock.lab.util.metrics import REGISTRY
+
+# (column, dtype) for each column, then the matchers and expanders used. The
+# frame's name is not part of it: the same feed loaded under another name
+# has the same layout.
+SchemaKey = Tuple[Tuple[Tuple[str, str], ...], Tuple[Matcher, ...], Tuple[Expander, ...]]
+
+
+def schema_key(df: DataFrame, matchers: Sequence[Matcher], expanders: Sequence[Expander]) -> SchemaKey:
+    columns = tuple((str(column), str(dtype)) for column, dtype in df.dtypes.items())
+    return columns, tuple(matchers), tuple(expanders)
+
+
+@dataclass
+class Expansion:
+    """The data-dependent results of running a layout's expanders on a
+       particular frame: constants (e.g. statistics) and latent columns.
+       Sources maps the name of each of these to the column it came from."""
+    constants: List[DaikonVariable] = field(default_factory=list)
+    latent_traces: DataFrame = field(default_factory=DataFrame)
+    sources: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class LatentDeclarations:
+    """The latent (expanded, non-constant) variables of a schema, and the
+       serialized declarations of every non-constant variable. Since the
+       latent variables' types are only known once an expander has run,
+       these are filled in by the first expand, for every layout sharing
+       them (i.e. whatever the frame is named)."""
+    variables: Optional[List[DaikonVariable]] = None
+    decls: Optional[str] = None
+
+
+@dataclass
+class SchemaLayout:
+    """
+    Everything about an analysis which depends only on a frame's schema
+    (its column names and dtypes) and not on its values: which tags each
+    column matched, which expanders apply to which columns, the declared
+    variables, and their serialized declarations.
+
+    The frame's name only names the program point, so layouts for frames
+    of the same schema differ only by name (see with_name), and share the
+    rest.
+
+    Matchers are assumed to depend only on dtypes, as the common matchers
+    do. Expanders' constants (e.g. statistics) depend on the values, so
+    they are computed per frame by expand, and only their declarations are
+    appended to the cached decls.
+    """
+    name: str
+    variables: List[DaikonVariable]
+    tags: Dict[str, Set[str]]
+    expansions: List[Tuple[str, Expander]]
+    latent: LatentDeclarations = field(default_factory=LatentDeclarations)
+
+    @property
+    def latent_variables(self) -> Optional[List[DaikonVariable]]:
+        return self.latent.variables
+
+    def with_name(self, name: str) -> 'SchemaLayout':
+        return self if name == self.name else replace(self, name=name)
+
+    @staticmethod
+    def build(name: str, df: DataFrame,
+              matchers: Sequence[Matcher], expanders: Sequence[Expander]) -> 'SchemaLayout':
+        variables = [DaikonVariable(column, DaikonType.from_dtype(dtype)) for column, dtype in df.dtypes.items()]
+
+        tags = dict()
+        expansions = []
+        for column in df.columns:
+            tags[column] = {matcher.tag for matcher in matchers if matcher.match(df[column])}
+            expansions += [(column, expander) for expander in expanders if expander.tag in tags[column]]
+
+        return SchemaLayout(name, variables, tags, expansions)
+
+    def expand(self, df: DataFrame) -> Expansion:
+        expansion = Expansion()
+        latent_frames = []
+
+        for column, expander in self.expansions:
+            const_df = expander.expand_constants(df[column])
+            for const_name, dtype in const_df.dtypes.items():
+                expansion.constants.append(DaikonVariable(const_name, DaikonType.from_dtype(dtype),
+                                                          constant_value=const_df[const_name].iloc[0]))
+                expansion.sources[const_name] = column
+
+            vars_df = expander.expand_variables(df[column])
+            if len(vars_df.columns):
+                latent_frames.append(vars_df.set_axis(df.index, axis=0))
+                expansion.sources.update((latent, column) for latent in vars_df.columns)
+
+        if latent_frames:
+            expansion.latent_traces = pd.concat(latent_frames, axis=1)
+
+        if self.latent.decls is None:
+            latent_variables = [DaikonVariable(column, DaikonType.from_dtype(dtype))
+                                for column, dtype in expansion.latent_traces.dtypes.items()]
+            self.latent.variables = latent_variables
+            self.latent.decls = ''.join(decl_block(var) for var in self.variables + latent_variables)
+
+        return expansion
+
+    def write_decls(self, out: TextIO, expansion: Expansion):
+        out.write(decls_header(self.name))
+        out.write(self.latent.decls)
+        for var in expansion.constants:
+            out.write(decl_block(var))
+
+    def write_dtrace(self, out: TextIO, df: DataFrame, expansion: Expansion):
+        if self.latent_variables:
+            df = pd.concat([df, expansion.latent_traces], axis=1)
+        write_dtrace_records(out, self.name, df, self.variables + self.latent_variables)
+
+    # --------------------------------------------------------------------------
+    # Program points over groups of columns
+    # --------------------------------------------------------------------------
+
+    def source_of(self, var_name: str, expansion: Expansion) -> str:
+        """The frame column a (possibly expanded) variable was derived from."""
+        return expansion.sources.get(var_name, var_name)
+
+    def group_variables(self, columns: Iterable[str], expansion: Expansion) -> List[DaikonVariable]:
+        """Every variable declared for the given columns, in declaration
+           order: their own, then latent variables, then constants."""
+        columns = set(columns)
+        return [var for var in self.variables + self.latent_variables + expansion.constants
+                if self.source_of(var.name, expansion) in columns]
+
+    def write_group_decls(self, out: TextIO, expansion: Expansion, groups: Mapping[str, Sequence[str]]):
+        """Writes decls with one program point per group of columns, named
+           by the keys of groups. Daikon then only relates variables within
+           the same group, which is how analyses can be restricted to the
+           combinations of columns that matter."""
+        out.write(DECLS_PREAMBLE)
+        for i, (ppt, columns) in enumerate(groups.items()):
+            if i:
+                out.write('\n')
+            out.write(ppt_header(ppt))
+            for var in self.group_variables(columns, expansion):
+                out.write(decl_block(var))
+
+    def write_group_dtrace(self, out: TextIO, df: DataFrame, expansion: Expansion,
+                           groups: Mapping[str, Sequence[str]]):
+        if self.latent_variables:
+            df = pd.concat([df, expansion.latent_traces], axis=1)
+        for ppt, columns in groups.items():
+            variables = [var for var in self.group_variables(columns, expansion) if not var.is_constant]
+            write_dtrace_records(out, ppt, df, variables)
+
+
+class LayoutCache:
+    """
+    A bounded (least recently used) cache of SchemaLayouts, so that
+    repeated analyses of frames with the same schema (e.g. every batch of
+    a daily feed, under whatever name) skip matching and decls generation.
+    """
+    maxsize: int
+
+    _layouts: Dict[SchemaKey, SchemaLayout]
+    _lock: threading.Lock
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self._layouts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name: str, df: DataFrame,
+            matchers: Sequence[Matcher], expanders: Sequence[Expander]) -> SchemaLayout:
+        key = schema_key(df, matchers, expanders)
+
+        with self._lock:
+            layout = self._layouts.get(key)
+            if layout is not None:
+                self._layouts.move_to_end(key)
+                REGISTRY.inc('burdock_layout_cache_total', 'Schema layout cache lookups, by result.',
+                             result='hit')
+                return layout.with_name(name)
+
+        REGISTRY.inc('burdock_layout_cache_total', 'Schema layout cache lookups, by result.',
+                     result='miss')
+        layout = SchemaLayout.build(name, df, matchers, expanders)
+
+        with self._lock:
+            self._layouts[key] = layout
+            while len(self._layouts) > self.maxsize:
+                self._layouts.popitem(last=False)
+
+        return layout
+
+    def clear(self):
+        with self._lock:
+            self._layouts.clear()
+
+    def __len__(self):
+        return len(self._layouts)
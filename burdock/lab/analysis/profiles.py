@@ -0,0 +1,209 @@
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+import numpy as np
+from burdock.expander import Expander
+from burdock.expander.common import statistics_expander
+from burdock.matcher import Matcher
+from burdock.matcher.common import numeric_matcher
+from pandas import DataFrame
+
+ColumnGroup = Tuple[str, ...]
+
+# Daikon's invariant classes, by family. Each is disabled with
+# --config_option <class>.enabled=false (equality is always enabled, as
+# Daikon relies on it internally).
+INVARIANT_FAMILIES: Dict[str, Tuple[str, ...]] = {
+    'bounds': (
+        'daikon.inv.unary.scalar.LowerBound',
+        'daikon.inv.unary.scalar.UpperBound',
+        'daikon.inv.unary.scalar.LowerBoundFloat',
+        'daikon.inv.unary.scalar.UpperBoundFloat',
+    ),
+    'one_of': (
+        'daikon.inv.unary.scalar.OneOfScalar',
+        'daikon.inv.unary.scalar.OneOfFloat',
+        'daikon.inv.unary.string.OneOfString',
+    ),
+    'nonzero': (
+        'daikon.inv.unary.scalar.NonZero',
+        'daikon.inv.unary.scalar.NonZeroFloat',
+    ),
+    'modulus': (
+        'daikon.inv.unary.scalar.Modulus',
+        'daikon.inv.unary.scalar.NonModulus',
+    ),
+    'comparison': (
+        'daikon.inv.binary.twoScalar.IntNonEqual',
+        'daikon.inv.binary.twoScalar.IntLessThan',
+        'daikon.inv.binary.twoScalar.IntLessEqual',
+        'daikon.inv.binary.twoScalar.IntGreaterThan',
+        'daikon.inv.binary.twoScalar.IntGreaterEqual',
+        'daikon.inv.binary.twoScalar.FloatNonEqual',
+        'daikon.inv.binary.twoScalar.FloatLessThan',
+        'daikon.inv.binary.twoScalar.FloatLessEqual',
+        'daikon.inv.binary.twoScalar.FloatGreaterThan',
+        'daikon.inv.binary.twoScalar.FloatGreaterEqual',
+    ),
+    'linear': (
+        'daikon.inv.binary.twoScalar.LinearBinary',
+        'daikon.inv.binary.twoScalar.LinearBinaryFloat',
+    ),
+    'ternary': (
+        'daikon.inv.ternary.threeScalar.LinearTernary',
+        'daikon.inv.ternary.threeScalar.LinearTernaryFloat',
+        'daikon.inv.ternary.threeScalar.FunctionBinary',
+        'daikon.inv.ternary.threeScalar.FunctionBinaryFloat',
+    ),
+}
+
+# Rows sampled by the pre-pass which picks related columns in wide frames.
+RELATION_SAMPLE_ROWS = 1000
+
+
+def relation_candidates(df: DataFrame, per_column: int,
+                        sample_rows: int = RELATION_SAMPLE_ROWS) -> Dict[str, List[str]]:
+    """
+    For each numeric column, up to per_column other numeric columns it is
+    most likely to be related to, best first. Pairs which are ordered (one
+    is never greater than the other) over a sample of the rows come first,
+    then pairs by absolute (Pearson) correlation. Columns with no numeric
+    partners are omitted.
+
+    This is a heuristic: it finds the orderings and linear relations Daikon
+    would report, but may miss e.g. modular ones.
+    """
+    numeric = df.select_dtypes('number')
+    if len(numeric.columns) < 2 or per_column < 1:
+        return dict()
+
+    if len(numeric) > sample_rows:
+        numeric = numeric.sample(sample_rows, random_state=0)
+    values = numeric.to_numpy(dtype=float)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scores = np.abs(np.nan_to_num(np.corrcoef(values, rowvar=False)))
+
+    for i in range(values.shape[1]):
+        column = values[:, i:i + 1]
+        ordered = (column <= values).all(axis=0) | (column >= values).all(axis=0)
+        scores[i, ordered] += 1.0
+    np.fill_diagonal(scores, -1.0)
+
+    columns = list(numeric.columns)
+    candidates = dict()
+    for i, column in enumerate(columns):
+        best = np.argsort(-scores[i], kind='stable')[:per_column]
+        candidates[column] = [columns[j] for j in best]
+    return candidates
+
+
+@dataclass(frozen=True)
+class AnalysisProfile:
+    """
+    How thoroughly to analyze a frame: which matchers and expanders to use,
+    the largest number of columns an invariant may relate (1, 2 or 3),
+    which families of invariants (see INVARIANT_FAMILIES) Daikon skips, and
+    how many values a one-of invariant may list (Daikon's default, 3, if
+    one_of_size is None).
+
+    Frames with more than wide_columns columns are "wide": rather than
+    relating every column to every other, each column is only related to
+    the per_column others picked by relation_candidates, so the cost of
+    analysis grows roughly linearly with the number of columns.
+    """
+    name: str
+    matchers: Tuple[Matcher, ...]
+    expanders: Tuple[Expander, ...]
+    max_arity: int = 3
+    disabled_families: FrozenSet[str] = frozenset()
+    wide_columns: Optional[int] = None
+    per_column: int = 4
+    one_of_size: Optional[int] = None
+
+    def daikon_options(self) -> List[str]:
+        families = set(self.disabled_families)
+        if self.max_arity < 3:
+            families.add('ternary')
+        if self.max_arity < 2:
+            families.update(('comparison', 'linear'))
+
+        options = []
+        for family in sorted(families):
+            for invariant in INVARIANT_FAMILIES[family]:
+                options += ['--config_option', f'{invariant}.enabled=false']
+        if self.one_of_size is not None and 'one_of' not in families:
+            for invariant in INVARIANT_FAMILIES['one_of']:
+                options += ['--config_option', f'{invariant}.size={self.one_of_size}']
+        return options
+
+    @property
+    def finds_ternary(self) -> bool:
+        """Whether Daikon may report invariants relating three columns."""
+        return self.max_arity >= 3 and 'ternary' not in self.disabled_families
+
+    def is_wide(self, df: DataFrame) -> bool:
+        return self.wide_columns is not None and len(df.columns) > self.wide_columns
+
+    def column_groups(self, df: DataFrame) -> Optional[List[ColumnGroup]]:
+        """The groups of columns to analyze together, each as its own
+           program point, or None if the frame should be analyzed as a whole."""
+        columns = list(df.columns)
+        if self.max_arity < 2:
+            return [(column,) for column in columns]
+        if not self.is_wide(df):
+            return None
+
+        candidates = relation_candidates(df, self.per_column)
+        order = {column: i for i, column in enumerate(columns)}
+
+        groups = dict()
+
+        def add(group: Sequence[str]):
+            group = tuple(sorted(set(group), key=order.get))
+            groups.setdefault(group, None)
+
+        for column in columns:
+            partners = candidates.get(column, [])
+            if not partners:
+                add((column,))
+            for partner in partners:
+                add((column, partner))
+            if self.max_arity >= 3 and len(partners) >= 2:
+                add((column, *partners[:2]))
+
+        # Drop groups contained in a larger one, which would only repeat it.
+        triples = [set(group) for group in groups if len(group) == 3]
+        return [group for group in groups
+                if len(group) == 3 or not any(set(group) <= triple for triple in triples)]
+
+
+FAST = AnalysisProfile('fast',
+                       matchers=(numeric_matcher,),
+                       expanders=(),
+                       max_arity=2,
+                       disabled_families=frozenset({'nonzero', 'modulus', 'linear'}),
+                       wide_columns=10,
+                       per_column=2)
+
+STANDARD = AnalysisProfile('standard',
+                           matchers=(numeric_matcher,),
+                           expanders=(statistics_expander,),
+                           wide_columns=20,
+                           per_column=4)
+
+# Never prunes, however wide the frame.
+DEEP = AnalysisProfile('deep',
+                       matchers=(numeric_matcher,),
+                       expanders=(statistics_expander,),
+                       one_of_size=8)
+
+PROFILES: Dict[str, AnalysisProfile] = {profile.name: profile for profile in (FAST, STANDARD, DEEP)}
+
+
+def get_profile(name: Optional[str]) -> AnalysisProfile:
+    """The named profile (STANDARD if name is None). Raises KeyError for
+       unknown names."""
+    if name is None:
+        return STANDARD
+    return PROFILES[name]
@@ -0,0 +1,84 @@
+from typing import Iterable, Sequence, TextIO
+
+from pandas import DataFrame, Series
+
+from burdock.core import DaikonVariable
+
+
+def daikon_value(var: DaikonVariable, value) -> str:
+    """Formats a single value as Daikon expects it for the given variable.
+       Mirrors the 'daikon' template filter used by Burdock itself."""
+    if var.is_integer or var.is_float:
+        return "{}".format(value)
+    elif var.is_boolean:
+        return "{}".format(1 if value else 0)
+    elif var.is_string:
+        return "\"{}\"".format(value)
+
+
+DECLS_PREAMBLE = (
+    "decl-version 2.0\n"
+    "input-language data\n"
+)
+
+
+def ppt_header(name: str) -> str:
+    """The declaration of a program point, to be followed by decl_blocks.
+       A .decls file may declare several, separated by blank lines."""
+    return (
+        "\n"
+        f"ppt {name}.data:::POINT\n"
+        "ppt-type point"
+    )
+
+
+def decls_header(name: str) -> str:
+    """The start of a .decls file declaring a single program point."""
+    return DECLS_PREAMBLE + ppt_header(name)
+
+
+def decl_block(var: DaikonVariable) -> str:
+    """The declaration of a single variable, to follow decls_header."""
+    block = (
+        f"\n    variable {var.name}"
+        f"\n        var-kind variable"
+        f"\n        dec-type {var.dec_type}"
+        f"\n        rep-type {var.rep_type}"
+    )
+    if var.is_constant:
+        block += f"\n        constant {daikon_value(var, var.constant_value)}"
+    return block
+
+
+def write_decls(out: TextIO, name: str, variables: Iterable[DaikonVariable]):
+    """Writes a .decls file with a single program point. The output is
+       identical to Burdock.write_decls, but does not need a Burdock."""
+    out.write(decls_header(name))
+    for var in variables:
+        out.write(decl_block(var))
+
+
+def _column_records(var: DaikonVariable, column: Series) -> Iterable[str]:
+    prefix = f"{var.name}\n"
+    return (f"{prefix}{daikon_value(var, value)}\n1\n" for value in column)
+
+
+def write_dtrace_records(out: TextIO, name: str, df: DataFrame, variables: Sequence[DaikonVariable]):
+    """Appends one trace record per row of df to out. The variables are
+       given in the order they were declared, and must name columns of df.
+
+       Unlike Burdock.write_dtrace this never renders the whole trace in
+       memory, so it can be called repeatedly on successive chunks of rows.
+
+       Values are formatted by the type their variable is declared with,
+       column by column. Burdock reads rows with iterrows, which upcasts
+       the integers of a frame with any float column to floats (e.g. 1.0),
+       although they are declared as ints; here they are written as ints
+       (e.g. 1). Otherwise the output is the same."""
+    header = f"{name}.data:::POINT\n"
+    columns = [_column_records(var, df[var.name]) for var in variables]
+
+    for parts in zip(*columns):
+        out.write(header)
+        out.write(''.join(parts))
+        out.write('\n')
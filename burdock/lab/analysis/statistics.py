@@ -0,0 +1,85 @@
+import math
+from dataclasses import dataclass, field
+from typing import Dict
+
+from pandas import Series
+
+from burdock.core import DaikonType, DaikonVariable
+
+
+@dataclass
+class RunningStatistics:
+    """
+    Summary statistics for a single column, accumulated one chunk of rows
+    at a time in constant memory. Chunks are merged with Chan et al.'s
+    parallel update for the mean and sum of squared deviations, so the
+    results match Series.describe() up to floating point error.
+
+    Quantiles cannot be computed exactly in a single bounded pass, so
+    unlike the StatisticsExpander only count, mean, std, min and max are
+    produced, unless the whole column is at hand afterwards (see
+    update_quantiles).
+    """
+    column: str
+    count: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+    min: float = math.inf
+    max: float = -math.inf
+    # Named as Series.describe() names them, e.g. '25%'.
+    quantiles: Dict[str, float] = field(default_factory=dict)
+
+    def update(self, values: Series):
+        values = values.dropna().astype(float)
+        n = len(values)
+        if n == 0:
+            return
+
+        chunk_mean = float(values.mean())
+        chunk_m2 = float(((values - chunk_mean) ** 2).sum())
+
+        total = self.count + n
+        delta = chunk_mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += chunk_m2 + delta * delta * self.count * n / total
+        self.count = total
+
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def update_quantiles(self, values: Series):
+        """Computes the quartiles from the whole column (which must be the
+           one every chunk was taken from), as Series.describe() does."""
+        values = values.dropna().astype(float)
+        if not len(values):
+            return
+        for q, value in values.quantile([0.25, 0.5, 0.75]).items():
+            self.quantiles[f'{q * 100:g}%'] = float(value)
+
+    @property
+    def std(self) -> float:
+        if self.count < 2:
+            return math.nan
+        return math.sqrt(self.m2 / (self.count - 1))
+
+    def constants(self) -> Dict[str, DaikonVariable]:
+        """Returns the statistics as Daikon constants, named the same way
+           as the StatisticsExpander names them (e.g. 'hp_mean')."""
+        if self.count == 0:
+            return {}
+
+        # In the order of Series.describe().
+        values = {
+            'count': float(self.count),
+            'mean': self.mean,
+            'std': self.std,
+            'min': self.min,
+            **self.quantiles,
+            'max': self.max,
+        }
+
+        constants = {}
+        for stat, value in values.items():
+            name = f"{self.column}_{stat}"
+            constants[name] = DaikonVariable(name, DaikonType.float, constant_value=value)
+        return constants
@@ -0,0 +1,252 @@
+import multiprocessing
+import pickle
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from multiprocessing.context import BaseContext
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from pandas.tseries.frequencies import to_offset
+
+from burdock.lab.analysis.daikon import run_daikon_on
+from burdock.lab.analysis.invariants import parse_ppt_invariants
+from burdock.lab.analysis.layout import SchemaLayout
+from burdock.lab.analysis.profiles import STANDARD, AnalysisProfile, ColumnGroup
+from burdock.lab.util.metrics import REGISTRY
+from burdock.lab.util.timing import StageTimer
+
+
+@dataclass(frozen=True)
+class TimeWindow:
+    """A half-open interval of time, [start, end)."""
+    label: str
+    start: pd.Timestamp
+    end: pd.Timestamp
+
+
+def time_windows(start: pd.Timestamp, end: pd.Timestamp, freq: str, size: Optional[str] = None) -> List[TimeWindow]:
+    """
+    The windows covering [start, end]. Without a size, these are the
+    consecutive calendar periods of the given frequency (a pandas offset
+    alias, e.g. 'Y' for years or 'M' for months). With a size (e.g. '365D'),
+    they are windows of that length, starting every freq, i.e. rolling
+    windows which may overlap.
+    """
+    if size is None:
+        return [TimeWindow(str(period), period.start_time, (period + 1).start_time)
+                for period in pd.period_range(start, end, freq=freq)]
+
+    length = to_offset(size)
+    windows = []
+    for window_start in pd.date_range(start, end, freq=freq):
+        window_end = window_start + length
+        windows.append(TimeWindow(f"{window_start:%Y-%m-%d}/{window_end:%Y-%m-%d}", window_start, window_end))
+    return windows
+
+
+def split_windows(df: DataFrame, time_column: Optional[str], freq: str,
+                  size: Optional[str] = None) -> Iterator[Tuple[TimeWindow, DataFrame]]:
+    """
+    Splits a frame into windows (see time_windows) by its time column, or by
+    its index if time_column is None. The time column is dropped from the
+    windows' frames. Rows without a time (NaT) and empty windows are skipped.
+
+    Raises ValueError if the times cannot be parsed as datetimes.
+    """
+    if time_column is None:
+        if not isinstance(df.index, pd.DatetimeIndex):
+            raise ValueError("A time column is required for frames without a DatetimeIndex.")
+        times = df.index.values
+        frame = df
+    else:
+        times = pd.to_datetime(df[time_column]).values
+        frame = df.drop(columns=[time_column])
+
+    present = ~pd.isna(times)
+    if not present.all():
+        times = times[present]
+        frame = frame[present]
+
+    if not len(frame):
+        return
+
+    # Sort once, so that each window is a slice rather than a scan.
+    order = np.argsort(times, kind='stable')
+    times = times[order]
+
+    for window in time_windows(pd.Timestamp(times[0]), pd.Timestamp(times[-1]), freq, size):
+        i, j = np.searchsorted(times, [window.start.to_datetime64(), window.end.to_datetime64()])
+        if i < j:
+            yield window, frame.iloc[order[i:j]]
+
+
+def analyze_window(layout: SchemaLayout, df: DataFrame, groups: Optional[Sequence[ColumnGroup]],
+                   options: Sequence[str]) -> Tuple[List[str], dict, dict]:
+    """Analyzes a single window with a shared layout. Returns its invariants,
+       its stage times and Daikon's stats."""
+    timer = StageTimer()
+    with timer.stage('expand'):
+        expansion = layout.expand(df)
+
+    if groups is None:
+        ppts = [layout.name]
+        run = run_daikon_on(lambda out: layout.write_decls(out, expansion),
+                            lambda out: layout.write_dtrace(out, df, expansion),
+                            timer, options)
+    else:
+        ppt_groups = OrderedDict((f'{layout.name}_g{i}', list(group)) for i, group in enumerate(groups))
+        ppts = list(ppt_groups)
+        run = run_daikon_on(lambda out: layout.write_group_decls(out, expansion, ppt_groups),
+                            lambda out: layout.write_group_dtrace(out, df, expansion, ppt_groups),
+                            timer, options)
+
+    with timer.stage('parse_invariants'):
+        parsed = parse_ppt_invariants(run.stdout)
+        invariants = list(OrderedDict.fromkeys(invariant for ppt in ppts for invariant in parsed.get(ppt, [])))
+
+    return invariants, timer.as_dict(), run.stats()
+
+
+# The arguments of the last analysis seen by each worker process, and the
+# key they were sent under, so that they are only unpickled once per worker
+# rather than once per window (the pool is shared by every analysis).
+_worker_args: Optional[Tuple[str, Tuple[SchemaLayout, Optional[Sequence[ColumnGroup]], Sequence[str]]]] = None
+
+
+def _analyze_window(key: str, args: bytes, df: DataFrame) -> Tuple[List[str], dict, dict]:
+    global _worker_args
+    if _worker_args is None or _worker_args[0] != key:
+        _worker_args = (key, pickle.loads(args))
+    layout, groups, options = _worker_args[1]
+    return analyze_window(layout, df, groups, options)
+
+
+def default_mp_context() -> BaseContext:
+    """Worker processes must not be forked from a kernel, whose threads
+       (e.g. its IO and heartbeat threads) would be copied mid-flight, so
+       they are started by a fork server where there is one."""
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+@dataclass
+class WindowResult:
+    """The invariants of one window, and how they differ from those of the
+       previous window (both empty for the first)."""
+    window: TimeWindow
+    rows: int
+    invariants: List[str]
+    appeared: List[str] = field(default_factory=list)
+    disappeared: List[str] = field(default_factory=list)
+    stages: dict = field(default_factory=dict)
+    daikon: dict = field(default_factory=dict)
+
+    def model(self) -> dict:
+        return {
+            'window': self.window.label,
+            'start': self.window.start.isoformat(),
+            'end': self.window.end.isoformat(),
+            'rows': self.rows,
+            'invariants': self.invariants,
+            'appeared': self.appeared,
+            'disappeared': self.disappeared,
+            'stages': self.stages,
+            'daikon': self.daikon,
+        }
+
+
+class WindowedAnalyzer:
+    """
+    Analyzes how a time-indexed frame's invariants change over time, by
+    splitting it into windows (see split_windows) and analyzing each in
+    parallel, in a pool of worker processes. The pool is started on the
+    first analysis (by default, see default_mp_context), shared by every
+    analysis after it, and stopped by close.
+
+    The schema-dependent work (matching, declarations, and for wide frames,
+    picking related columns) is done once, over the whole frame, and shared
+    by every window. Results are yielded in window order, each as soon as it
+    (and every window before it) is done.
+    """
+    processes: Optional[int]
+    mp_context: Optional[BaseContext]
+
+    _pool: Optional[ProcessPoolExecutor]
+    _lock: threading.Lock
+
+    def __init__(self, processes: Optional[int] = None, mp_context: Optional[BaseContext] = None):
+        self.processes = processes
+        self.mp_context = mp_context
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                mp_context = self.mp_context if self.mp_context is not None else default_mp_context()
+                self._pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=mp_context)
+            return self._pool
+
+    def _discard_pool(self, pool: ProcessPoolExecutor):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False)
+
+    def close(self):
+        """Stops the worker processes, if any. They are started again by
+           the next analysis."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    def analyze(self, layout: SchemaLayout, df: DataFrame, time_column: Optional[str], freq: str,
+                size: Optional[str] = None, profile: AnalysisProfile = STANDARD) -> Iterator[WindowResult]:
+        """The layout must be that of df without its time column."""
+        windows = list(split_windows(df, time_column, freq, size))
+        if not windows:
+            return
+
+        frame = df if time_column is None else df.drop(columns=[time_column])
+        groups = profile.column_groups(frame)
+        # Builds the layout's declarations, before the workers receive it.
+        layout.expand(windows[0][1])
+
+        key = uuid.uuid4().hex
+        args = pickle.dumps((layout, groups, profile.daikon_options()))
+
+        pool = self._get_pool()
+        futures: List[Future] = []
+        try:
+            futures = [pool.submit(_analyze_window, key, args, window_df) for _, window_df in windows]
+
+            previous = None
+            for (window, window_df), future in zip(windows, futures):
+                try:
+                    invariants, stages, daikon = future.result()
+                except BrokenProcessPool:
+                    # e.g. a worker was killed; the next analysis starts a new pool.
+                    self._discard_pool(pool)
+                    raise
+                REGISTRY.inc('burdock_windows_analyzed_total', 'Time windows analyzed.')
+
+                result = WindowResult(window, len(window_df), invariants, stages=stages, daikon=daikon)
+                if previous is not None:
+                    current = set(invariants)
+                    result.appeared = [invariant for invariant in invariants if invariant not in previous]
+                    result.disappeared = [invariant for invariant in previous if invariant not in current]
+                previous = OrderedDict.fromkeys(invariants)
+
+                yield result
+        finally:
+            # If the caller stops early, don't analyze the remaining windows.
+            for future in futures:
+                future.cancel()
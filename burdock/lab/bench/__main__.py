@@ -0,0 +1,191 @@
+"""
+Benchmarks for Burdock inspection.
+
+    python -m burdock.lab.bench run --out base.json
+    python -m burdock.lab.bench run --out new.json --rows 1000 10000 --columns 5 50
+    python -m burdock.lab.bench compare base.json new.json
+    python -m burdock.lab.bench startup --out startup.json
+    python -m burdock.lab.bench load --out load.json --kernels 1 8 --concurrency 1 16
+    python -m burdock.lab.bench transfer --out transfer.json --columns 10 100
+
+`compare` exits with status 1 if any measurement regressed.
+"""
+import argparse
+import sys
+
+from burdock.lab.analysis.profiles import PROFILES
+from burdock.lab.bench.frames import DEFAULT_COLUMNS, DEFAULT_MAX_CELLS, DEFAULT_ROWS, DEFAULT_SAMPLES_DIR, \
+    sample_cases, synthetic_cases
+from burdock.lab.bench.load import REQUEST_KINDS, LoadBenchmark, load_scenarios
+from burdock.lab.bench.results import compare_results, load_results, max_rss, save_results
+from burdock.lab.bench.startup import STARTUP_MODES, StartupBenchmark
+from burdock.lab.bench.transfer import TransferBenchmark
+
+parser = argparse.ArgumentParser(prog='python -m burdock.lab.bench',
+                                 description='Benchmark Burdock inspection, stage by stage.')
+subparsers = parser.add_subparsers(dest='command')
+
+run_parser = subparsers.add_parser('run', help='Run the benchmarks and store the results as JSON.')
+run_parser.add_argument('--out', dest='out_path', metavar='path', required=True)
+run_parser.add_argument('--label', dest='label', default=None)
+run_parser.add_argument('--samples-dir', dest='samples_dir', metavar='path', default=DEFAULT_SAMPLES_DIR)
+run_parser.add_argument('--no-samples', dest='samples', action='store_false')
+run_parser.add_argument('--rows', dest='rows', type=int, nargs='*', default=DEFAULT_ROWS)
+run_parser.add_argument('--columns', dest='columns', type=int, nargs='*', default=DEFAULT_COLUMNS)
+run_parser.add_argument('--max-cells', dest='max_cells', type=int, default=DEFAULT_MAX_CELLS,
+                        help='Skip synthetic frames with more than this many cells.')
+run_parser.add_argument('--repeat', dest='repeat', type=int, default=3)
+run_parser.add_argument('--skip-daikon', dest='skip_daikon', action='store_true',
+                        help='Only generate the inputs to Daikon, without running it.')
+run_parser.add_argument('--no-memory', dest='trace_memory', action='store_false')
+run_parser.add_argument('--analysis-profile', dest='analysis_profile', choices=PROFILES, default=None,
+                        help='The analysis profile to inspect with (default: standard).')
+
+startup_parser = subparsers.add_parser('startup', help='Measure kernel startup and first inspection latency, '
+                                                       'and store the results as JSON.')
+startup_parser.add_argument('--out', dest='out_path', metavar='path', required=True)
+startup_parser.add_argument('--label', dest='label', default=None)
+startup_parser.add_argument('--modes', dest='modes', nargs='*', choices=STARTUP_MODES, default=None,
+                            help='How the agent is installed (default: every mode).')
+startup_parser.add_argument('--repeat', dest='repeat', type=int, default=3)
+startup_parser.add_argument('--idle', dest='idle', type=float, default=1.0,
+                            help='Seconds the kernel is left idle before the first inspection.')
+startup_parser.add_argument('--rows', dest='rows', type=int, default=1_000)
+startup_parser.add_argument('--columns', dest='columns', type=int, default=5)
+startup_parser.add_argument('--skip-daikon', dest='skip_daikon', action='store_true',
+                            help='Only generate the inputs to Daikon, without running it.')
+startup_parser.add_argument('--kernel-name', dest='kernel_name', default='python3')
+
+load_parser = subparsers.add_parser('load', help='Drive stub kernels through the manager under load, '
+                                                 'and store the results as JSON.')
+load_parser.add_argument('--out', dest='out_path', metavar='path', required=True)
+load_parser.add_argument('--label', dest='label', default=None)
+load_parser.add_argument('--kernels', dest='kernels', type=int, nargs='*', default=[1, 4, 16])
+load_parser.add_argument('--concurrency', dest='concurrency', type=int, nargs='*', default=[1, 8, 32],
+                         help='Concurrent requests per kernel.')
+load_parser.add_argument('--requests', dest='requests', type=int, default=200,
+                         help='Requests per kernel, per scenario.')
+load_parser.add_argument('--kind', dest='kind', choices=REQUEST_KINDS, default='ping')
+load_parser.add_argument('--delay', dest='delay', type=float, default=0.0,
+                         help='Seconds each execution takes in the stub kernels.')
+load_parser.add_argument('--result-bytes', dest='result_bytes', type=int, default=16)
+load_parser.add_argument('--stream-chunks', dest='stream_chunks', type=int, default=0)
+load_parser.add_argument('--stream-bytes', dest='stream_bytes', type=int, default=64)
+load_parser.add_argument('--noise-rate', dest='noise_rate', type=float, default=0.0,
+                         help='Unsolicited iopub messages per second from each stub kernel.')
+
+transfer_parser = subparsers.add_parser('transfer', help='Compare getting bulk data from the agent as JSON '
+                                                         'and as binary buffers, and store the results as JSON.')
+transfer_parser.add_argument('--out', dest='out_path', metavar='path', required=True)
+transfer_parser.add_argument('--label', dest='label', default=None)
+transfer_parser.add_argument('--columns', dest='columns', type=int, nargs='*', default=[10, 100])
+transfer_parser.add_argument('--rows', dest='rows', type=int, default=1_000)
+transfer_parser.add_argument('--limit', dest='limit', type=int, default=10_000,
+                             help='Invariants per page of an inspection.')
+transfer_parser.add_argument('--repeat', dest='repeat', type=int, default=5)
+transfer_parser.add_argument('--kernel-name', dest='kernel_name', default='python3')
+
+compare_parser = subparsers.add_parser('compare', help='Compare two stored runs.')
+compare_parser.add_argument('base_path', metavar='base')
+compare_parser.add_argument('new_path', metavar='new')
+compare_parser.add_argument('--threshold', dest='threshold', type=float, default=0.10,
+                            help='Relative change to report, e.g. 0.10 for 10%%.')
+
+
+def log(message: str):
+    print(message, file=sys.stderr, flush=True)
+
+
+def run(args) -> int:
+    # Imported here, as it pulls in IPython and the agent.
+    from burdock.lab.bench.inspection import InspectionBenchmark
+
+    cases = []
+    if args.samples:
+        cases += sample_cases(args.samples_dir)
+    cases += synthetic_cases(args.rows, args.columns, args.max_cells, log=log)
+
+    benchmark = InspectionBenchmark(repeat=args.repeat,
+                                    skip_daikon=args.skip_daikon,
+                                    trace_memory=args.trace_memory,
+                                    analysis_profile=args.analysis_profile)
+    results = benchmark.run(cases, log=log)
+
+    save_results(args.out_path, results, benchmark.max_rss(), label=args.label)
+    log(f"Wrote {len(results)} results to {args.out_path}.")
+    return 0
+
+
+def startup(args) -> int:
+    benchmark = StartupBenchmark(repeat=args.repeat,
+                                 idle=args.idle,
+                                 rows=args.rows,
+                                 columns=args.columns,
+                                 skip_daikon=args.skip_daikon,
+                                 kernel_name=args.kernel_name)
+    results = benchmark.run(args.modes, log=log)
+
+    save_results(args.out_path, results, max_rss(), label=args.label)
+    log(f"Wrote {len(results)} results to {args.out_path}.")
+    return 0
+
+
+def load(args) -> int:
+    stub_options = ['--delay', str(args.delay),
+                    '--result-bytes', str(args.result_bytes),
+                    '--stream-chunks', str(args.stream_chunks),
+                    '--stream-bytes', str(args.stream_bytes),
+                    '--noise-rate', str(args.noise_rate)]
+    scenarios = load_scenarios(args.kernels, args.concurrency, args.requests, args.kind, stub_options)
+
+    results = LoadBenchmark().run(scenarios, log=log)
+
+    save_results(args.out_path, results, max_rss(), label=args.label)
+    log(f"Wrote {len(results)} results to {args.out_path}.")
+    return 0
+
+
+def transfer(args) -> int:
+    benchmark = TransferBenchmark(repeat=args.repeat, rows=args.rows, limit=args.limit,
+                                  kernel_name=args.kernel_name)
+    results = benchmark.run(args.columns, log=log)
+
+    save_results(args.out_path, results, max_rss(), label=args.label)
+    log(f"Wrote {len(results)} results to {args.out_path}.")
+    return 0
+
+
+def compare(args) -> int:
+    base, new = load_results(args.base_path), load_results(args.new_path)
+    regressions, improvements = compare_results(base, new, threshold=args.threshold)
+
+    for title, changes in (('Regressions', regressions), ('Improvements', improvements)):
+        print(f"{title}:")
+        for change in changes:
+            print(f"    {change}")
+        if not changes:
+            print("    (none)")
+
+    return 1 if regressions else 0
+
+
+def main(argv=None) -> int:
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        return run(args)
+    if args.command == 'startup':
+        return startup(args)
+    if args.command == 'load':
+        return load(args)
+    if args.command == 'transfer':
+        return transfer(args)
+    if args.command == 'compare':
+        return compare(args)
+
+    parser.print_help()
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+from dataclasses import dataclass
+from glob import glob
+from os import path
+from typing import Callable, Iterable, List
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+# The samples shipped with the repository (etc/samples), when running from a checkout.
+DEFAULT_SAMPLES_DIR = path.normpath(path.join(path.dirname(__file__), '..', '..', '..', 'etc', 'samples'))
+
+DEFAULT_ROWS = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+DEFAULT_COLUMNS = [5, 50, 500]
+# Enough for the narrowest frame with the most rows (10M x 5), so that the
+# full range of rows runs by default.
+DEFAULT_MAX_CELLS = 50_000_000
+
+
+@dataclass
+class FrameCase:
+    """A dataframe to benchmark against. Frames are only built when
+       needed, since the largest synthetic ones take a while (and a lot
+       of memory) to construct."""
+    name: str
+    kind: str
+    rows: int
+    columns: int
+    make: Callable[[], DataFrame]
+
+
+def synthetic_frame(rows: int, columns: int, seed: int = 0) -> DataFrame:
+    """
+    Builds a frame with a mix of integer, float and derived columns, so
+    that Daikon has both unary and cross-column invariants to find:
+
+        c0 (int), c1 (float), c2 = 2 * c0 + 1, c3 (int), c4 (float), ...
+    """
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(columns):
+        if i % 3 == 0:
+            data[f'c{i}'] = rng.integers(0, 1000, size=rows)
+        elif i % 3 == 1:
+            data[f'c{i}'] = rng.normal(100.0, 15.0, size=rows)
+        else:
+            data[f'c{i}'] = 2 * data[f'c{i - 2}'] + 1
+    return pd.DataFrame(data)
+
+
+def sample_cases(samples_dir: str = DEFAULT_SAMPLES_DIR) -> List[FrameCase]:
+    cases = []
+    for csv_path in sorted(glob(path.join(samples_dir, '*.csv'))):
+        name = path.splitext(path.basename(csv_path))[0]
+        df = pd.read_csv(csv_path)
+        cases.append(FrameCase(
+            name=name,
+            kind='sample',
+            rows=len(df),
+            columns=len(df.columns),
+            make=lambda df=df: df
+        ))
+    return cases
+
+
+def synthetic_cases(rows: Iterable[int] = DEFAULT_ROWS,
+                    columns: Iterable[int] = DEFAULT_COLUMNS,
+                    max_cells: int = None, log=None) -> List[FrameCase]:
+    """All combinations of rows x columns, skipping (and logging) any larger
+       than max_cells."""
+    cases = []
+    for n_rows in rows:
+        for n_columns in columns:
+            if max_cells is not None and n_rows * n_columns > max_cells:
+                if log:
+                    log(f"Skipping synthetic_{n_rows}x{n_columns}: more than {max_cells} cells (see --max-cells).")
+                continue
+            cases.append(FrameCase(
+                name=f'synthetic_{n_rows}x{n_columns}',
+                kind='synthetic',
+                rows=n_rows,
+                columns=n_columns,
+                make=lambda r=n_rows, c=n_columns: synthetic_frame(r, c)
+            ))
+    return cases
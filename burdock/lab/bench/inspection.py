@@ -0,0 +1,121 @@
+import gc
+import os
+import statistics
+import tracemalloc
+from contextlib import redirect_stdout
+from typing import Dict, List, Optional
+
+from IPython import InteractiveShell
+
+from burdock.lab.agent import BurdockAgent
+from burdock.lab.bench.frames import FrameCase
+from burdock.lab.bench.results import max_rss
+from burdock.lab.util.memory import TracedPeak
+from burdock.lab.util.timing import StageTimer
+
+
+class InspectionBenchmark:
+    """
+    Drives a (headless, i.e. not installed) BurdockAgent through the same
+    do_inspect/analyze path the front end uses, recording how long each
+    stage takes and how much memory it needs.
+
+    Each case is first run `repeat` times for timing, then once more
+    under tracemalloc to measure memory (tracemalloc slows everything
+    down, so the two are never measured together).
+
+    With skip_daikon, only the inputs to Daikon are generated. This is
+    useful where Daikon (Java) is not available.
+
+    Inspections use the named analysis profile (see analysis.profiles).
+    """
+    agent: BurdockAgent
+    repeat: int
+    skip_daikon: bool
+    trace_memory: bool
+    analysis_profile: Optional[str]
+
+    def __init__(self, repeat: int = 3, skip_daikon: bool = False, trace_memory: bool = True,
+                 analysis_profile: Optional[str] = None):
+        self.agent = BurdockAgent(InteractiveShell.instance(), install=False)
+        self.repeat = repeat
+        self.skip_daikon = skip_daikon
+        self.trace_memory = trace_memory
+        self.analysis_profile = analysis_profile
+
+    def _run_once(self, name: str) -> StageTimer:
+        timer = StageTimer()
+
+        # Burdock reports every column it tags on stdout, which is not
+        # what we want to measure (or read).
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            if self.skip_daikon:
+                decls_path, dtrace_path = self.agent.generate_daikon_inputs(name, timer)
+                os.remove(decls_path)
+                os.remove(dtrace_path)
+            else:
+                # Otherwise every run after the first would reuse the first's invariants.
+                self.agent.incremental.forget(name)
+                self.agent.do_inspect(name, len(name), timer, analysis_profile=self.analysis_profile)
+
+        return timer
+
+    def run_case(self, case: FrameCase) -> dict:
+        user_ns = self.agent.shell.user_ns
+        user_ns[case.name] = case.make()
+
+        try:
+            runs: List[StageTimer] = []
+            for _ in range(self.repeat):
+                gc.collect()
+                runs.append(self._run_once(case.name))
+
+            stages: Dict[str, dict] = {}
+            for stage in runs[0].stages:
+                walls = [run.stages[stage].wall for run in runs]
+                stages[stage] = {'wall': statistics.median(walls), 'runs': walls, 'peak_bytes': None}
+
+            peak_bytes = None
+            if self.trace_memory:
+                gc.collect()
+                tracemalloc.start()
+                try:
+                    with TracedPeak() as peak:
+                        traced = self._run_once(case.name)
+                finally:
+                    tracemalloc.stop()
+
+                for stage, record in traced.stages.items():
+                    stages[stage]['peak_bytes'] = record.peak_bytes
+                # Stages are measured relative to the memory traced when they
+                # start, so one may need more than the case as a whole did.
+                peak_bytes = max([peak.bytes] + [record.peak_bytes or 0 for record in traced.stages.values()])
+        finally:
+            del user_ns[case.name]
+
+        return {
+            'name': case.name,
+            'kind': case.kind,
+            'rows': case.rows,
+            'columns': case.columns,
+            'wall': sum(stage['wall'] for stage in stages.values()),
+            'peak_bytes': peak_bytes,
+            'stages': stages,
+        }
+
+    def run(self, cases: List[FrameCase], log=None) -> List[dict]:
+        results = []
+        for case in cases:
+            if log:
+                log(f"{case.name} ({case.rows} x {case.columns})...")
+            result = self.run_case(case)
+            if log:
+                log(f"    {result['wall']:.3f}s")
+            results.append(result)
+        return results
+
+    @staticmethod
+    def max_rss() -> dict:
+        """High-water resident set sizes for this process, and for its
+           (reaped) children, i.e. Daikon."""
+        return max_rss()
@@ -0,0 +1,206 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from itertools import product
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+from jupyter_client import MultiKernelManager
+
+from burdock.lab.bench.stub_kernel import STUB_KERNEL_NAME, StubKernelSpecManager
+from burdock.lab.manager import BurdockManager, MultiBurdockManager
+from burdock.lab.util.msg_predicates import filter_stdout, on_execution_idle
+
+# What each simulated request does:
+#   ping:    an execution whose result is awaited (BurdockManager.ping, i.e.
+#            BurdockKernelClient.execute_retval).
+#   stream:  an execution whose stdout is streamed (as analyze_windows is).
+#   profile: BurdockManager.profile, i.e. waiting for the kernel to be idle
+#            and sending a request over the comm. Each client profiles a
+#            dataframe of its own, so no two requests are coalesced.
+#   profile_coalesced: the same, but every client profiles the same
+#            dataframe, so concurrent requests are coalesced into one.
+REQUEST_KINDS = ('ping', 'stream', 'profile', 'profile_coalesced')
+
+
+@dataclass
+class LoadScenario:
+    """N stub kernels, each sent `requests` requests by `concurrency`
+       concurrent clients, with the stub kernels' options."""
+    kernels: int
+    concurrency: int
+    requests: int
+    kind: str = 'ping'
+    stub_options: List[str] = field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        return f'load/{self.kind}/{self.kernels}x{self.concurrency}'
+
+
+def load_scenarios(kernels: List[int], concurrency: List[int], requests: int, kind: str = 'ping',
+                   stub_options: Optional[List[str]] = None) -> List[LoadScenario]:
+    return [LoadScenario(n, m, requests, kind, list(stub_options or []))
+            for n, m in product(kernels, concurrency)]
+
+
+def _current_rss() -> Optional[int]:
+    # Only on Linux; elsewhere, max_rss has to do.
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+@contextmanager
+def temporary_kernels(**kwargs) -> Iterator[MultiKernelManager]:
+    """A MultiKernelManager (given kwargs) whose kernels' connection files are
+       written to a temporary directory, rather than the current one. Every
+       kernel still running is shut down, and the directory removed, on exit."""
+    with tempfile.TemporaryDirectory(prefix='burdock-kernels-') as connection_dir:
+        multi_kernel_manager = MultiKernelManager(connection_dir=connection_dir, **kwargs)
+        try:
+            yield multi_kernel_manager
+        finally:
+            multi_kernel_manager.shutdown_all(now=True)
+
+
+async def wait_until_ready(instance: BurdockManager, timeout: float):
+    """Waits until the kernel answers a ping. Until the iopub channel's
+       subscription has reached the kernel, results are dropped, so (as the
+       notebook server's nudge does) pings are sent until one is answered."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            await asyncio.wait_for(instance.ping(), 1.0)
+            return
+        except asyncio.TimeoutError:
+            if time.monotonic() > deadline:
+                raise
+
+
+class LoadBenchmark:
+    """
+    Drives simulated kernels (see stub_kernel) through a MultiBurdockManager,
+    to measure how the manager, its kernel clients and their channels cope
+    with many kernels and many concurrent requests, independently of what
+    the requests would cost in a real kernel.
+
+    For each scenario, reports throughput (requests per second), the median
+    and 99th percentile latency of a request, the number of threads and the
+    resources held by the manager while under load, and the memory (RSS) of
+    this process.
+    """
+    startup_timeout: float
+
+    def __init__(self, startup_timeout: float = 30.0):
+        self.startup_timeout = startup_timeout
+
+    @staticmethod
+    async def _request(instance: BurdockManager, kind: str, client: int):
+        if kind == 'ping':
+            await instance.ping()
+        elif kind == 'stream':
+            queue = instance.stream('print()', filter_pred=filter_stdout, close_pred=on_execution_idle)
+            while True:
+                msg = await queue.get()
+                queue.task_done()
+                if msg is queue.sentinel:
+                    break
+        elif kind == 'profile':
+            await instance.profile(f'df{client}')
+        elif kind == 'profile_coalesced':
+            await instance.profile('df')
+        else:
+            raise ValueError(f"Unknown request kind: {kind!r}")
+
+    async def _client(self, instance: BurdockManager, kind: str, client: int, requests: int,
+                      latencies: List[float], errors: Dict[str, int]):
+        for _ in range(requests):
+            start = time.perf_counter()
+            try:
+                await self._request(instance, kind, client)
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    async def _drive(self, multi_kernel_manager: MultiKernelManager, kernel_ids: List[str],
+                     scenario: LoadScenario) -> dict:
+        multi = MultiBurdockManager(multi_kernel_manager, autoload=False)
+        try:
+            for kernel_id in kernel_ids:
+                multi.create_instance(kernel_id)
+            instances = [multi.get_instance(kernel_id) for kernel_id in kernel_ids]
+            await asyncio.gather(*(wait_until_ready(instance, self.startup_timeout) for instance in instances))
+
+            latencies: List[float] = []
+            errors: Dict[str, int] = {}
+            per_client = max(scenario.requests // scenario.concurrency, 1)
+            clients = [self._client(instance, scenario.kind, client, per_client, latencies, errors)
+                       for instance in instances for client in range(scenario.concurrency)]
+
+            start = time.perf_counter()
+            await asyncio.gather(*clients)
+            wall = time.perf_counter() - start
+
+            return {
+                'wall': wall,
+                'latencies': latencies,
+                'errors': errors,
+                'threads': threading.active_count(),
+                'resources': multi.resource_counts(),
+                'rss': _current_rss(),
+            }
+        finally:
+            for kernel_id in kernel_ids:
+                multi.remove_instance(kernel_id)
+
+    def run_scenario(self, scenario: LoadScenario) -> dict:
+        with temporary_kernels(kernel_spec_manager=StubKernelSpecManager()) as multi_kernel_manager:
+            kernel_ids = [multi_kernel_manager.start_kernel(kernel_name=STUB_KERNEL_NAME,
+                                                            extra_arguments=scenario.stub_options)
+                          for _ in range(scenario.kernels)]
+            measured = asyncio.run(self._drive(multi_kernel_manager, kernel_ids, scenario))
+
+        latencies = np.array(measured['latencies'])
+        p50, p99 = np.percentile(latencies, [50, 99]) if len(latencies) else (None, None)
+
+        return {
+            'name': scenario.name,
+            'kind': 'load',
+            'kernels': scenario.kernels,
+            'concurrency': scenario.concurrency,
+            'requests': len(latencies),
+            'errors': measured['errors'],
+            'throughput': len(latencies) / measured['wall'] if measured['wall'] else None,
+            'wall': measured['wall'],
+            'peak_bytes': measured['rss'],
+            'threads': measured['threads'],
+            'resources': measured['resources'],
+            # As stages, so that runs can be compared like any other (see compare_results).
+            'stages': {
+                'p50': {'wall': float(p50) if p50 is not None else None, 'peak_bytes': None},
+                'p99': {'wall': float(p99) if p99 is not None else None, 'peak_bytes': None},
+            },
+        }
+
+    def run(self, scenarios: List[LoadScenario], log=None) -> List[dict]:
+        results = []
+        for scenario in scenarios:
+            if log:
+                log(f"{scenario.name}...")
+            result = self.run_scenario(scenario)
+            if log and result['requests']:
+                p50, p99 = result['stages']['p50']['wall'], result['stages']['p99']['wall']
+                log(f"    {result['throughput']:.0f} req/s, p50 {p50 * 1000:.2f}ms, p99 {p99 * 1000:.2f}ms, "
+                    f"{result['threads']} threads, {result['errors'] or 'no'} errors")
+            elif log:
+                log(f"    every request failed: {result['errors']}")
+            results.append(result)
+        return results
@@ -0,0 +1,118 @@
+import json
+import platform
+import resource
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+RESULTS_VERSION = 1
+
+
+def environment() -> dict:
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+    }
+
+
+def _max_rss_bytes(who) -> int:
+    # ru_maxrss is in kilobytes on Linux, but in bytes on macOS.
+    max_rss = resource.getrusage(who).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def max_rss() -> dict:
+    """High-water resident set sizes for this process, and for its (reaped)
+       children, i.e. Daikon or kernels."""
+    return {
+        'self': _max_rss_bytes(resource.RUSAGE_SELF),
+        'children': _max_rss_bytes(resource.RUSAGE_CHILDREN),
+    }
+
+
+def save_results(out_path: str, cases: List[dict], max_rss: dict, label: Optional[str] = None):
+    document = {
+        'version': RESULTS_VERSION,
+        'label': label,
+        'created': datetime.now().isoformat(),
+        'environment': environment(),
+        'max_rss': max_rss,
+        'cases': cases,
+    }
+    with open(out_path, 'w') as f:
+        json.dump(document, f, indent=2)
+
+
+def load_results(in_path: str) -> dict:
+    with open(in_path) as f:
+        document = json.load(f)
+
+    if document.get('version') != RESULTS_VERSION:
+        raise ValueError(f"{in_path} is not a version {RESULTS_VERSION} benchmark result.")
+    return document
+
+
+@dataclass
+class Change:
+    """A difference in one measurement of one case between two runs."""
+    case: str
+    stage: str
+    metric: str
+    base: float
+    new: float
+
+    @property
+    def ratio(self) -> float:
+        return self.new / self.base if self.base else float('inf')
+
+    def __str__(self):
+        return f"{self.case} / {self.stage} / {self.metric}: {self.base:.4g} -> {self.new:.4g} ({self.ratio:.2f}x)"
+
+
+def compare_results(base: dict, new: dict,
+                    threshold: float = 0.10,
+                    min_wall: float = 0.005,
+                    min_bytes: int = 1024 * 1024) -> (List[Change], List[Change]):
+    """
+    Compares two benchmark documents case by case and stage by stage.
+    Returns (regressions, improvements): the measurements which changed by
+    more than threshold (as a fraction). Changes smaller than min_wall
+    seconds or min_bytes bytes are ignored as noise.
+
+    Cases and stages present in only one of the documents are skipped.
+    """
+    regressions, improvements = [], []
+    base_cases = {case['name']: case for case in base['cases']}
+
+    for new_case in new['cases']:
+        base_case = base_cases.get(new_case['name'])
+        if base_case is None:
+            continue
+
+        measurements = [('total', 'wall', base_case['wall'], new_case['wall'], min_wall),
+                        ('total', 'peak_bytes', base_case['peak_bytes'], new_case['peak_bytes'], min_bytes)]
+
+        for stage, new_stage in new_case['stages'].items():
+            base_stage = base_case['stages'].get(stage)
+            if base_stage is None:
+                continue
+            measurements.append((stage, 'wall', base_stage['wall'], new_stage['wall'], min_wall))
+            measurements.append((stage, 'peak_bytes', base_stage['peak_bytes'], new_stage['peak_bytes'], min_bytes))
+
+        for stage, metric, base_value, new_value, noise in measurements:
+            if base_value is None or new_value is None or abs(new_value - base_value) < noise:
+                continue
+
+            change = Change(new_case['name'], stage, metric, base_value, new_value)
+            if new_value > base_value * (1 + threshold):
+                regressions.append(change)
+            elif new_value < base_value * (1 - threshold):
+                improvements.append(change)
+
+    return regressions, improvements
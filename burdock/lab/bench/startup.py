@@ -0,0 +1,138 @@
+import os
+import statistics
+import time
+from typing import Dict, List, Optional
+
+from jupyter_client import BlockingKernelClient, KernelManager
+
+from burdock.lab import PREWARM_ENV
+from burdock.lab.manager import EXTENSION, INSTALL_CODE
+
+# How the agent gets into the kernel: (extra kernel arguments, environment).
+#   on_demand:  installed by the server when it is first needed.
+#   extension:  installed at startup by the IPython extension, which leaves
+#               the analysis modules to the first inspection.
+#   prewarm:    as extension, but the analysis modules are loaded in the
+#               background straight away (the default for the extension).
+STARTUP_MODES = {
+    'on_demand': ([], {}),
+    'extension': ([f'--ext={EXTENSION}'], {PREWARM_ENV: '0'}),
+    'prewarm': ([f'--ext={EXTENSION}'], {PREWARM_ENV: '1'}),
+}
+
+
+class StartupBenchmark:
+    """
+    Measures how long it takes for a freshly started kernel to answer its
+    first inspection, for each way of installing the agent (see
+    STARTUP_MODES). Each run starts its own kernel, and is split into:
+
+        startup         until the kernel answers a kernel_info request
+        install         installing the agent, as the server does
+        first_inspect   the first inspection of a synthetic frame
+
+    Between startup and install, the frame is built (untimed), and the
+    kernel is left idle for `idle` seconds, which stands for the time the
+    user takes to get to their first inspection.
+
+    With skip_daikon, the first inspection only generates the inputs to
+    Daikon, as for InspectionBenchmark.
+    """
+    repeat: int
+    idle: float
+    rows: int
+    columns: int
+    skip_daikon: bool
+    kernel_name: str
+    timeout: float
+
+    def __init__(self, repeat: int = 3, idle: float = 1.0, rows: int = 1_000, columns: int = 5,
+                 skip_daikon: bool = False, kernel_name: str = 'python3', timeout: float = 120.0):
+        self.repeat = repeat
+        self.idle = idle
+        self.rows = rows
+        self.columns = columns
+        self.skip_daikon = skip_daikon
+        self.kernel_name = kernel_name
+        self.timeout = timeout
+
+    def _execute(self, client: BlockingKernelClient, code: str) -> float:
+        """Runs code in the kernel, and returns how long it took to reply.
+           Raises RuntimeError if the code raised."""
+        start = time.perf_counter()
+        msg_id = client.execute(code, silent=True)
+        while True:
+            reply = client.get_shell_msg(timeout=self.timeout)
+            if reply['parent_header'].get('msg_id') == msg_id:
+                break
+        wall = time.perf_counter() - start
+
+        content = reply['content']
+        if content['status'] != 'ok':
+            raise RuntimeError(f"{content.get('ename')}: {content.get('evalue')}")
+        return wall
+
+    def _inspect_code(self) -> str:
+        if self.skip_daikon:
+            return "import os\nfor _path in __burdock__.generate_daikon_inputs('df'):\n    os.remove(_path)\n"
+        return "__burdock__.do_inspect('df', 2)\n"
+
+    def _run_once(self, mode: str) -> Dict[str, float]:
+        extra_arguments, env = STARTUP_MODES[mode]
+        manager = KernelManager(kernel_name=self.kernel_name)
+        client = None
+
+        start = time.perf_counter()
+        manager.start_kernel(extra_arguments=extra_arguments, env={**os.environ, **env})
+        try:
+            client = manager.client()
+            client.start_channels()
+            client.wait_for_ready(timeout=self.timeout)
+            walls = {'startup': time.perf_counter() - start}
+
+            # Built with pandas alone (as a user would), as importing any of
+            # Burdock here would take its imports out of the measurements.
+            self._execute(client, (
+                "import numpy as np\n"
+                "import pandas as pd\n"
+                f"df = pd.DataFrame(np.random.default_rng(0).integers(0, 1000, size=({self.rows}, {self.columns})),\n"
+                f"                  columns=[f'c{{i}}' for i in range({self.columns})])\n"
+            ))
+            time.sleep(self.idle)
+
+            walls['install'] = self._execute(client, INSTALL_CODE)
+            walls['first_inspect'] = self._execute(client, self._inspect_code())
+            return walls
+        finally:
+            if client is not None:
+                client.stop_channels()
+            manager.shutdown_kernel(now=True)
+
+    def run_mode(self, mode: str) -> dict:
+        runs: List[Dict[str, float]] = [self._run_once(mode) for _ in range(self.repeat)]
+
+        stages = dict()
+        for stage in runs[0]:
+            walls = [run[stage] for run in runs]
+            stages[stage] = {'wall': statistics.median(walls), 'runs': walls, 'peak_bytes': None}
+
+        return {
+            'name': f'startup/{mode}',
+            'kind': 'startup',
+            'rows': self.rows,
+            'columns': self.columns,
+            'wall': sum(stage['wall'] for stage in stages.values()),
+            'peak_bytes': None,
+            'stages': stages,
+        }
+
+    def run(self, modes: Optional[List[str]] = None, log=None) -> List[dict]:
+        results = []
+        for mode in modes or list(STARTUP_MODES):
+            if log:
+                log(f"startup/{mode}...")
+            result = self.run_mode(mode)
+            if log:
+                log("    " + ", ".join(f"{stage} {record['wall']:.3f}s" for stage, record in result['stages'].items()))
+            results.append(result)
+        return results
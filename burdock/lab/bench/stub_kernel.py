@@ -0,0 +1,222 @@
+"""
+A stand-in for an IPython kernel, for load testing the channel and manager
+layers without the cost (or variability) of running real code:
+
+    python -m burdock.lab.bench.stub_kernel -f connection.json [options]
+
+It speaks just enough of the Jupyter messaging protocol to be managed by a
+KernelManager: it answers kernel_info and shutdown requests, echoes
+heartbeats, and answers every execute_request (without looking at its code)
+with a busy status, an execute_input, optionally some stream output, an
+execute_result, an execute_reply and an idle status, as IPython would.
+Every comm message is answered as the agent answers a request for a
+dataframe which does not exist, padded to the size of an execute_result.
+How long each execution takes and how large its output is are options.
+
+Kernel managers given a StubKernelSpecManager launch it by STUB_KERNEL_NAME,
+with its options as the kernel's extra_arguments.
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from typing import Optional
+
+import zmq
+from jupyter_client.kernelspec import KernelSpec, KernelSpecManager
+from jupyter_client.session import Session
+
+# The name given to the stub kernel's spec (see stub_kernel_spec).
+STUB_KERNEL_NAME = 'burdock_stub'
+
+parser = argparse.ArgumentParser(prog='python -m burdock.lab.bench.stub_kernel',
+                                 description='A stub Jupyter kernel for load testing.')
+parser.add_argument('-f', dest='connection_file', metavar='path', required=True)
+parser.add_argument('--delay', dest='delay', type=float, default=0.0,
+                    help='Seconds each execution takes.')
+parser.add_argument('--result-bytes', dest='result_bytes', type=int, default=16,
+                    help='Size of each execute_result (as a Python string literal).')
+parser.add_argument('--stream-chunks', dest='stream_chunks', type=int, default=0,
+                    help='Number of stdout stream messages sent by each execution.')
+parser.add_argument('--stream-bytes', dest='stream_bytes', type=int, default=64,
+                    help='Size of each stream message.')
+parser.add_argument('--noise-rate', dest='noise_rate', type=float, default=0.0,
+                    help='Unsolicited stream messages per second (as from a chatty background thread).')
+
+
+def stub_kernel_spec() -> KernelSpec:
+    return KernelSpec(argv=[sys.executable, '-m', 'burdock.lab.bench.stub_kernel', '-f', '{connection_file}'],
+                      display_name='Burdock stub', language='python')
+
+
+class StubKernelSpecManager(KernelSpecManager):
+    """Finds the stub kernel (by STUB_KERNEL_NAME) as well as the installed ones."""
+
+    def find_kernel_specs(self):
+        specs = super().find_kernel_specs()
+        specs[STUB_KERNEL_NAME] = os.path.dirname(__file__)
+        return specs
+
+    def get_kernel_spec(self, kernel_name):
+        if kernel_name == STUB_KERNEL_NAME:
+            return stub_kernel_spec()
+        return super().get_kernel_spec(kernel_name)
+
+
+class StubKernel:
+    session: Session
+    delay: float
+    result_bytes: int
+    stream_chunks: int
+    stream_bytes: int
+    noise_rate: float
+
+    execution_count: int
+
+    def __init__(self, connection: dict, delay: float = 0.0, result_bytes: int = 16,
+                 stream_chunks: int = 0, stream_bytes: int = 64, noise_rate: float = 0.0):
+        self.connection = connection
+        self.session = Session(key=connection['key'].encode(),
+                               signature_scheme=connection.get('signature_scheme', 'hmac-sha256'))
+        self.delay = delay
+        self.result_bytes = result_bytes
+        self.stream_chunks = stream_chunks
+        self.stream_bytes = stream_bytes
+        self.noise_rate = noise_rate
+        self.execution_count = 0
+
+        self.context = zmq.Context()
+        self.shell = self._bind(zmq.ROUTER, 'shell_port')
+        self.control = self._bind(zmq.ROUTER, 'control_port')
+        self.stdin = self._bind(zmq.ROUTER, 'stdin_port')
+        self.iopub = self._bind(zmq.PUB, 'iopub_port')
+        self._iopub_lock = threading.Lock()
+
+    def _bind(self, kind: int, port_name: str) -> zmq.Socket:
+        socket = self.context.socket(kind)
+        socket.linger = 0
+        socket.bind(f"{self.connection['transport']}://{self.connection['ip']}:{self.connection[port_name]}")
+        return socket
+
+    def _publish(self, msg_type: str, content: dict, parent: Optional[dict] = None):
+        # The iopub socket is shared with the noise thread, and zmq sockets are not thread-safe.
+        with self._iopub_lock:
+            self.session.send(self.iopub, msg_type, content, parent=parent, ident=msg_type.encode())
+
+    def _heartbeat(self):
+        socket = self.context.socket(zmq.REP)
+        socket.linger = 0
+        socket.bind(f"{self.connection['transport']}://{self.connection['ip']}:{self.connection['hb_port']}")
+        while True:
+            socket.send(socket.recv())
+
+    def _noise(self):
+        text = 'n' * self.stream_bytes
+        while True:
+            time.sleep(1.0 / self.noise_rate)
+            self._publish('stream', {'name': 'stdout', 'text': text})
+
+    def _execute(self, socket: zmq.Socket, idents: list, msg: dict):
+        self.execution_count += 1
+        count = self.execution_count
+
+        self._publish('status', {'execution_state': 'busy'}, msg)
+        self._publish('execute_input', {'code': msg['content'].get('code', ''), 'execution_count': count}, msg)
+
+        if self.delay:
+            time.sleep(self.delay)
+        text = 's' * (self.stream_bytes - 1) + '\n'
+        for _ in range(self.stream_chunks):
+            self._publish('stream', {'name': 'stdout', 'text': text}, msg)
+
+        if not msg['content'].get('silent'):
+            self._publish('execute_result', {
+                'execution_count': count,
+                'data': {'text/plain': repr('r' * max(self.result_bytes - 2, 0))},
+                'metadata': {},
+            }, msg)
+
+        self.session.send(socket, 'execute_reply', {
+            'status': 'ok',
+            'execution_count': count,
+            'user_expressions': {},
+            'payload': [],
+        }, parent=msg, ident=idents)
+        self._publish('status', {'execution_state': 'idle'}, msg)
+
+    def _comm_msg(self, msg: dict):
+        self._publish('status', {'execution_state': 'busy'}, msg)
+        if self.delay:
+            time.sleep(self.delay)
+        self._publish('comm_msg', {
+            'comm_id': msg['content']['comm_id'],
+            'data': {'status': 'ok', 'found': False, 'padding': 'r' * self.result_bytes},
+        }, msg)
+        self._publish('status', {'execution_state': 'idle'}, msg)
+
+    def _kernel_info(self, socket: zmq.Socket, idents: list, msg: dict):
+        self._publish('status', {'execution_state': 'busy'}, msg)
+        self.session.send(socket, 'kernel_info_reply', {
+            'status': 'ok',
+            'protocol_version': '5.3',
+            'implementation': 'burdock_stub',
+            'implementation_version': '0',
+            'language_info': {'name': 'python', 'version': sys.version.split()[0]},
+            'banner': 'Burdock stub kernel',
+        }, parent=msg, ident=idents)
+        self._publish('status', {'execution_state': 'idle'}, msg)
+
+    def serve(self):
+        threading.Thread(target=self._heartbeat, name='stub-heartbeat', daemon=True).start()
+        if self.noise_rate > 0:
+            threading.Thread(target=self._noise, name='stub-noise', daemon=True).start()
+        self._publish('status', {'execution_state': 'starting'})
+
+        poller = zmq.Poller()
+        for socket in (self.shell, self.control, self.stdin):
+            poller.register(socket, zmq.POLLIN)
+
+        while True:
+            for socket, _ in poller.poll():
+                idents, msg = self.session.recv(socket, mode=0)
+                msg_type = msg['header']['msg_type']
+
+                if msg_type == 'execute_request':
+                    self._execute(socket, idents, msg)
+                elif msg_type == 'comm_msg':
+                    self._comm_msg(msg)
+                elif msg_type == 'comm_open':
+                    self._publish('status', {'execution_state': 'busy'}, msg)
+                    self._publish('status', {'execution_state': 'idle'}, msg)
+                elif msg_type == 'kernel_info_request':
+                    self._kernel_info(socket, idents, msg)
+                elif msg_type == 'shutdown_request':
+                    self.session.send(socket, 'shutdown_reply', msg['content'], parent=msg, ident=idents)
+                    return
+                elif msg_type == 'interrupt_request':
+                    self.session.send(socket, 'interrupt_reply', {'status': 'ok'}, parent=msg, ident=idents)
+
+
+def main(argv=None) -> int:
+    args = parser.parse_args(argv)
+    # As IPython does while idle; kernel managers interrupt kernels before shutting them down.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    with open(args.connection_file) as f:
+        connection = json.load(f)
+
+    kernel = StubKernel(connection,
+                        delay=args.delay,
+                        result_bytes=args.result_bytes,
+                        stream_chunks=args.stream_chunks,
+                        stream_bytes=args.stream_bytes,
+                        noise_rate=args.noise_rate)
+    kernel.serve()
+    # Daemon threads (heartbeat, noise) may be blocked in zmq calls.
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
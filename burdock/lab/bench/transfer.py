@@ -0,0 +1,123 @@
+import asyncio
+import json
+import statistics
+import time
+from typing import Dict, List
+
+from jupyter_client import MultiKernelManager
+
+from burdock.lab.bench.load import temporary_kernels, wait_until_ready
+from burdock.lab.kernel.message import Message
+from burdock.lab.manager import BurdockManager, MultiBurdockManager
+
+# What is transferred from the agent to the server:
+#   statistics:  BurdockManager.column_statistics, i.e. a few numbers per column.
+#   invariants:  BurdockManager.inspect, i.e. a page of structured invariants.
+PAYLOADS = ('statistics', 'invariants')
+
+# How it is encoded: in the comm message's JSON content, or in its buffers.
+ENCODINGS = ('json', 'binary')
+
+
+def _message_bytes(msg: Message) -> int:
+    return len(json.dumps(msg.content)) + sum(buffer.nbytes for buffer in msg.buffers)
+
+
+class TransferBenchmark:
+    """
+    Measures how long it takes to get bulk data from the agent to the
+    server (from sending the request to having the data decoded), and how
+    large the reply is, with the data encoded as JSON and as binary
+    buffers (see kernel.buffers). Each frame is analyzed once beforehand,
+    so that the inspections measured only reuse its invariants, rather
+    than run Daikon.
+
+    Each number of columns runs in a kernel of its own, with a synthetic
+    frame of that many (numeric) columns.
+    """
+    repeat: int
+    rows: int
+    limit: int
+    kernel_name: str
+    timeout: float
+
+    def __init__(self, repeat: int = 5, rows: int = 1_000, limit: int = 10_000,
+                 kernel_name: str = 'python3', timeout: float = 120.0):
+        self.repeat = repeat
+        self.rows = rows
+        self.limit = limit
+        self.kernel_name = kernel_name
+        self.timeout = timeout
+
+    async def _request(self, instance: BurdockManager, payload: str, binary: bool):
+        if payload == 'statistics':
+            await instance.column_statistics('df', binary=binary)
+        elif payload == 'invariants':
+            await instance.inspect('df', binary=binary, limit=self.limit)
+        else:
+            raise ValueError(f"Unknown payload: {payload!r}")
+
+    async def _measure(self, multi_kernel_manager: MultiKernelManager, kernel_id: str, columns: int) -> List[dict]:
+        multi = MultiBurdockManager(multi_kernel_manager, autoload=False)
+        multi.create_instance(kernel_id)
+        instance = multi.get_instance(kernel_id)
+
+        # Every reply to our requests is seen on iopub, where its size is taken.
+        replies: List[Message] = []
+        instance.client.iopub_channel.register_listener(lambda msg: msg.header.msg_type == 'comm_msg',
+                                                        replies.append)
+        try:
+            await wait_until_ready(instance, self.timeout)
+            await asyncio.wait_for(instance._execute(
+                "import numpy as np\n"
+                "import pandas as pd\n"
+                f"df = pd.DataFrame(np.random.default_rng(0).integers(0, 1000, size=({self.rows}, {columns})),\n"
+                f"                  columns=[f'c{{i}}' for i in range({columns})])\n"
+                "len(df)\n"
+            ), self.timeout)
+            await asyncio.wait_for(instance.inspect('df', binary=False), self.timeout)
+
+            results = []
+            for payload in PAYLOADS:
+                for encoding in ENCODINGS:
+                    walls = []
+                    for _ in range(self.repeat):
+                        start = time.perf_counter()
+                        await asyncio.wait_for(self._request(instance, payload, encoding == 'binary'), self.timeout)
+                        walls.append(time.perf_counter() - start)
+                    wall = statistics.median(walls)
+
+                    results.append({
+                        'name': f'transfer/{payload}/{encoding}/{columns}',
+                        'kind': 'transfer',
+                        'rows': self.rows,
+                        'columns': columns,
+                        'bytes': _message_bytes(replies[-1]),
+                        'wall': wall,
+                        'peak_bytes': None,
+                        'stages': {'round_trip': {'wall': wall, 'runs': walls, 'peak_bytes': None}},
+                    })
+            return results
+        finally:
+            multi.remove_instance(kernel_id)
+
+    def run_columns(self, columns: int) -> List[dict]:
+        with temporary_kernels() as multi_kernel_manager:
+            kernel_id = multi_kernel_manager.start_kernel(kernel_name=self.kernel_name)
+            return asyncio.run(self._measure(multi_kernel_manager, kernel_id, columns))
+
+    def run(self, columns: List[int], log=None) -> List[dict]:
+        results = []
+        for n in columns:
+            if log:
+                log(f"transfer/{n} columns...")
+            cases = self.run_columns(n)
+            if log:
+                by_name: Dict[str, dict] = {case['name']: case for case in cases}
+                for payload in PAYLOADS:
+                    json_case = by_name[f'transfer/{payload}/json/{n}']
+                    binary_case = by_name[f'transfer/{payload}/binary/{n}']
+                    log(f"    {payload}: json {json_case['wall'] * 1000:.2f}ms, {json_case['bytes']} bytes; "
+                        f"binary {binary_case['wall'] * 1000:.2f}ms, {binary_case['bytes']} bytes")
+            results.extend(cases)
+        return results
@@ -63,3 +63,75 @@ class KernelExecutionError(BurdockHTTPError):
 
     def __init__(self, exception=None, *args, **kwargs):
         super().__init__(exception=exception, *args, **kwargs)
+
+
+class InvalidVariableName(BurdockHTTPError):
+    status_code = 400
+    log_message_format = "{name!r} is not a valid variable name."
+
+    def __init__(self, name=None, *args, **kwargs):
+        super().__init__(name=name, *args, **kwargs)
+
+
+class FileNotFound(BurdockHTTPError):
+    status_code = 404
+    log_message_format = "File {path} not found."
+
+    def __init__(self, path=None, *args, **kwargs):
+        super().__init__(path=path, *args, **kwargs)
+
+
+class FileOutsideRoot(BurdockHTTPError):
+    status_code = 403
+    log_message_format = "File {path} is outside of the server root directory."
+
+    def __init__(self, path=None, *args, **kwargs):
+        super().__init__(path=path, *args, **kwargs)
+
+
+class FileNotAnalyzable(BurdockHTTPError):
+    status_code = 400
+    log_message_format = "File {path} could not be analyzed: {reason_text}"
+
+    def __init__(self, path=None, reason_text=None, *args, **kwargs):
+        super().__init__(path=path, reason_text=reason_text, *args, **kwargs)
+
+
+class InvalidWindowSpec(BurdockHTTPError):
+    status_code = 400
+    log_message_format = "Invalid time windows: {reason_text}"
+
+    def __init__(self, reason_text=None, *args, **kwargs):
+        super().__init__(reason_text=reason_text, *args, **kwargs)
+
+
+class KernelUnavailable(BurdockHTTPError):
+    status_code = 503
+    log_message_format = "Kernel {kernel_id} went away during the request ({cause})."
+
+    def __init__(self, kernel_id=None, cause=None, *args, **kwargs):
+        super().__init__(kernel_id=kernel_id, cause=cause, *args, **kwargs)
+
+
+class KernelBusy(BurdockHTTPError):
+    status_code = 503
+    log_message_format = "Kernel {kernel_id} has been busy for {busy_for:.1f}s; try again once it is idle."
+
+    def __init__(self, kernel_id=None, busy_for=0.0, *args, **kwargs):
+        super().__init__(kernel_id=kernel_id, busy_for=busy_for, *args, **kwargs)
+
+
+class KernelUnresponsive(BurdockHTTPError):
+    status_code = 503
+    log_message_format = "Kernel {kernel_id} has missed its last {missed} heartbeats."
+
+    def __init__(self, kernel_id=None, missed=0, *args, **kwargs):
+        super().__init__(kernel_id=kernel_id, missed=missed, *args, **kwargs)
+
+
+class DataFrameNotFound(BurdockHTTPError):
+    status_code = 404
+    log_message_format = "No dataframe named {name!r} in kernel {kernel_id}."
+
+    def __init__(self, kernel_id=None, name=None, *args, **kwargs):
+        super().__init__(kernel_id=kernel_id, name=name, *args, **kwargs)
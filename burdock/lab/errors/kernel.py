@@ -22,3 +22,17 @@ class ExecuteError(IPythonExecuteException):
     name: str
     value: str
     traceback: List[str]
+
+
+@dataclass
+class KernelLost(IPythonExecuteException):
+    """Raised for requests pending when their kernel was shut down or restarted."""
+    kernel_id: str
+    reason: str
+
+
+@dataclass
+class CommNoReply(IPythonExecuteException):
+    """Raised when the kernel is done handling a comm message without having
+       replied to it (e.g. the handler raised, or there is no such comm)."""
+    comm_id: str
@@ -1,17 +1,28 @@
 import json
 import uuid
+from os import path
+from typing import Dict, List, Optional
+
+import numpy as np
 
 from jupyter_client import MultiKernelManager, KernelManager
 from notebook.base.handlers import APIHandler
+from pandas.tseries.frequencies import to_offset
 from tornado import web
+from tornado.ioloop import IOLoop
 
+from burdock.lab.analysis.csv_file import CsvFileAnalyzer, CsvFormatError
+from burdock.lab.analysis.profiles import PROFILES
 from burdock.lab.errors.http import KernelNotFound, KernelNotIPython, BurdockNotFound, \
-    BurdockAlreadyExists
+    BurdockAlreadyExists, FileNotFound, FileOutsideRoot, FileNotAnalyzable, InvalidVariableName, \
+    InvalidWindowSpec, DataFrameNotFound
 from burdock.lab.manager import MultiBurdockManager, BurdockManager
+from burdock.lab.util.metrics import REGISTRY
 
 
 class BaseBurdockHandler(APIHandler):
     multi_burdock_manager: MultiBurdockManager
+    file_analyzer: CsvFileAnalyzer
 
     @property
     def multi_kernel_manager(self) -> MultiKernelManager:
@@ -47,10 +58,25 @@ class BaseBurdockHandler(APIHandler):
         # about the class being abstract without it...
         raise NotImplementedError()
 
+    def _get_file_path(self, relative_path: str) -> str:
+        """Resolves a path relative to the server root directory, refusing
+           anything (e.g. via '..' or symlinks) that escapes it."""
+        root_dir = path.realpath(self.contents_manager.root_dir)
+        file_path = path.realpath(path.join(root_dir, relative_path or ''))
+
+        if not file_path.startswith(root_dir + path.sep):
+            raise FileOutsideRoot(relative_path)
+
+        if not path.isfile(file_path):
+            raise FileNotFound(relative_path)
+
+        return file_path
+
     # noinspection PyMethodOverriding
-    def initialize(self, multi_burdock_manager: MultiBurdockManager):
+    def initialize(self, multi_burdock_manager: MultiBurdockManager, file_analyzer: CsvFileAnalyzer = None):
         super().initialize()
         self.multi_burdock_manager = multi_burdock_manager
+        self.file_analyzer = file_analyzer
 
 
 # noinspection PyAbstractClass
@@ -69,10 +95,12 @@ class MultiBurdockHandler(BaseBurdockHandler):
 
         _ = self._get_kernel_manager(kernel_id)
 
-        if kernel_id in multi_bm:
+        # An instance whose kernel was restarted exists, but needs its agent re-installed.
+        if kernel_id in multi_bm and multi_bm.get_instance(kernel_id).is_installed:
             raise BurdockAlreadyExists(kernel_id)
 
-        multi_bm.create_instance(kernel_id)
+        if kernel_id not in multi_bm:
+            multi_bm.create_instance(kernel_id)
         bm = self._get_burdock_manager(kernel_id)
 
         return self.finish(await bm.install())
@@ -97,9 +125,146 @@ class BurdockHandler(BaseBurdockHandler):
         return self.finish(response)
 
 
+# noinspection PyAbstractClass
+class BurdockProfileHandler(BaseBurdockHandler):
+    @web.authenticated
+    async def post(self, kernel_id: str):
+        _ = self._get_kernel_manager(kernel_id)
+        bm = self._get_burdock_manager(kernel_id)
+
+        body = json.loads(self.request.body)
+        name = body.get('name')
+
+        if not isinstance(name, str) or not name.isidentifier():
+            raise InvalidVariableName(name)
+
+        report = await bm.profile(name)
+        if report is None:
+            raise DataFrameNotFound(kernel_id, name)
+
+        return self.finish(json.dumps(report))
+
+
+def encode_statistics(statistics: Dict[str, np.ndarray]) -> Dict[str, List[Optional[float]]]:
+    """Statistics' arrays as lists, with NaN (which is not JSON) as None."""
+    return {statistic: [None if value != value else value for value in array.tolist()]
+            for statistic, array in statistics.items()}
+
+
+# noinspection PyAbstractClass
+class BurdockStatisticsHandler(BaseBurdockHandler):
+    @web.authenticated
+    async def post(self, kernel_id: str):
+        """The statistics of a dataframe's numeric columns (see
+           BurdockAgent.column_statistics), which the agent sends as binary
+           buffers, and which are only encoded as JSON (once) here."""
+        _ = self._get_kernel_manager(kernel_id)
+        bm = self._get_burdock_manager(kernel_id)
+
+        body = json.loads(self.request.body)
+        name = body.get('name')
+
+        if not isinstance(name, str) or not name.isidentifier():
+            raise InvalidVariableName(name)
+
+        result = await bm.column_statistics(name)
+        if result is None:
+            raise DataFrameNotFound(kernel_id, name)
+
+        columns, statistics = result
+        model = {
+            'name': name,
+            'columns': columns,
+            'statistics': encode_statistics(statistics),
+        }
+        return self.finish(json.dumps(model))
+
+
+# noinspection PyAbstractClass
+class BurdockWindowsHandler(BaseBurdockHandler):
+    @web.authenticated
+    async def post(self, kernel_id: str):
+        """Streams the results of a windowed analysis (see
+           BurdockAgent.analyze_windows) as newline-delimited JSON, one
+           window per line, as each window is done. Errors after the first
+           window can no longer change the response's status, so they end
+           the stream with a line of the form {"error": {"status_code": ...,
+           "message": ...}} instead."""
+        _ = self._get_kernel_manager(kernel_id)
+        bm = self._get_burdock_manager(kernel_id)
+
+        body = json.loads(self.request.body)
+        name = body.get('name')
+        time_column = body.get('time_column')
+        freq = body.get('freq', 'Y')
+        size = body.get('size')
+        analysis_profile = body.get('analysis_profile')
+
+        if not isinstance(name, str) or not name.isidentifier():
+            raise InvalidVariableName(name)
+        if time_column is not None and not isinstance(time_column, str):
+            raise InvalidWindowSpec(f"time_column must be a string, not {time_column!r}.")
+        if analysis_profile is not None and analysis_profile not in PROFILES:
+            raise InvalidWindowSpec(f"Unknown analysis profile: {analysis_profile!r}.")
+        for offset in (freq, size):
+            try:
+                if offset is not None:
+                    to_offset(offset)
+            except (TypeError, ValueError):
+                raise InvalidWindowSpec(f"{offset!r} is not a valid frequency.")
+
+        self.set_header('Content-Type', 'application/x-ndjson')
+        streamed = False
+        try:
+            async for model in bm.analyze_windows(name, time_column, freq, size, analysis_profile):
+                self.write(json.dumps(model) + '\n')
+                await self.flush()
+                streamed = True
+        except web.HTTPError as e:
+            if not streamed:
+                raise
+            self.log.warning("Windowed analysis of %s failed after streaming began: %s", name, e.log_message)
+            self.write(json.dumps({'error': {'status_code': e.status_code, 'message': e.log_message}}) + '\n')
+
+        return self.finish()
+
+
+# noinspection PyAbstractClass
+class FileAnalysisHandler(BaseBurdockHandler):
+    @web.authenticated
+    async def post(self, *args, **kwargs):
+        body = json.loads(self.request.body)
+        relative_path = body.get('path')
+
+        file_path = self._get_file_path(relative_path)
+
+        # Analysis is blocking (parsing, and waiting on Daikon), so it must
+        # not run on the server's event loop.
+        try:
+            model = await IOLoop.current().run_in_executor(None, self.file_analyzer.analyze, file_path)
+        except CsvFormatError as e:
+            raise FileNotAnalyzable(relative_path, str(e))
+
+        model['path'] = relative_path
+        return self.finish(json.dumps(model))
+
+
+# noinspection PyAbstractClass
+class MetricsHandler(BaseBurdockHandler):
+    @web.authenticated
+    async def get(self, *args, **kwargs):
+        self.set_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        return self.finish(REGISTRY.render())
+
+
 _kernel_id_re = r"(?P<kernel_id>\w+-\w+-\w+-\w+-\w+)"
 
 default_handlers = [
     (r"/api/burdock/?", MultiBurdockHandler),
+    (r"/api/burdock/files/?", FileAnalysisHandler),
+    (r"/api/burdock/metrics/?", MetricsHandler),
     (r"/api/burdock/%s" % _kernel_id_re, BurdockHandler),
+    (r"/api/burdock/%s/profile" % _kernel_id_re, BurdockProfileHandler),
+    (r"/api/burdock/%s/windows" % _kernel_id_re, BurdockWindowsHandler),
+    (r"/api/burdock/%s/statistics" % _kernel_id_re, BurdockStatisticsHandler),
 ]
@@ -0,0 +1,116 @@
+"""
+Bulk data in Jupyter messages' binary buffers, rather than in their JSON
+content.
+
+Arrays are sent as their raw bytes, one buffer each, and described in the
+content by a spec giving the buffer's index, dtype and shape:
+
+    {'kind': {'buffer': 2, 'dtype': '|u1', 'shape': [120]}, ...}
+
+Received buffers are memoryviews onto the message's frames, and arrays are
+read from them in place (with np.frombuffer), i.e. they are read-only, and
+keep their message's frames alive.
+
+Strings are packed into one buffer of UTF-8 text, and an array of the
+offsets at which each string ends.
+"""
+from typing import Dict, List, Mapping, Sequence, Tuple
+
+import numpy as np
+
+from burdock.lab.kernel.message import Message
+
+ArraySpec = dict
+
+
+def pack_arrays(arrays: Mapping[str, np.ndarray], buffers: list) -> Dict[str, ArraySpec]:
+    """Appends the arrays' bytes to buffers (without copying arrays which
+       are already contiguous), and returns their specs, by name."""
+    specs = dict()
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        if array.dtype.hasobject:
+            raise TypeError(f"Array {name!r} holds Python objects, which cannot be sent as a buffer.")
+
+        specs[name] = {'buffer': len(buffers), 'dtype': array.dtype.str, 'shape': list(array.shape)}
+        buffers.append(memoryview(array).cast('B') if array.size else b'')
+    return specs
+
+
+def unpack_arrays(specs: Mapping[str, ArraySpec], buffers: Sequence) -> Dict[str, np.ndarray]:
+    """The arrays described by specs, read in place from buffers."""
+    return {name: np.frombuffer(buffers[spec['buffer']], dtype=np.dtype(spec['dtype'])).reshape(spec['shape'])
+            for name, spec in specs.items()}
+
+
+def message_arrays(msg: Message, specs: Mapping[str, ArraySpec]) -> Dict[str, np.ndarray]:
+    return unpack_arrays(specs, msg.buffers)
+
+
+def pack_strings(strings: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """The strings' UTF-8 text, as bytes, and the offset at which each ends."""
+    encoded = [string.encode() for string in strings]
+    ends = np.cumsum([len(data) for data in encoded], dtype=np.uint32)
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), ends
+
+
+def unpack_strings(data: np.ndarray, ends: np.ndarray) -> List[str]:
+    text = memoryview(data)
+    starts = [0, *ends[:-1].tolist()]
+    return [str(text[start:end], 'utf-8') for start, end in zip(starts, ends.tolist())]
+
+
+def pack_invariants(invariants: Sequence, buffers: list) -> dict:
+    """
+    Packs structured invariants (see analysis.catalog) as buffers: as
+    encode_invariants does, with names listed once in the content, but with
+    everything per invariant in arrays.
+
+        {'count': 2, 'columns': ['hp', 'hp_max'], 'kinds': ['bounds', 'comparison'],
+         'arrays': {'text': ..., 'text_ends': ..., 'kind': ..., 'column_ids': ...,
+                    'column_ends': ..., 'confidence': ...}}
+
+    column_ids holds every invariant's column indices one after the other,
+    and column_ends the offset at which each invariant's indices end.
+    """
+    columns: Dict[str, int] = dict()
+    kinds: Dict[str, int] = dict()
+
+    column_ids = [columns.setdefault(column, len(columns))
+                  for invariant in invariants for column in invariant.columns]
+    column_counts = [len(invariant.columns) for invariant in invariants]
+    text, text_ends = pack_strings([invariant.text for invariant in invariants])
+
+    arrays = {
+        'text': text,
+        'text_ends': text_ends,
+        'kind': np.array([kinds.setdefault(invariant.kind, len(kinds)) for invariant in invariants], dtype=np.uint8),
+        'column_ids': np.array(column_ids, dtype=np.int32),
+        'column_ends': np.cumsum(column_counts, dtype=np.uint32),
+        'confidence': np.array([invariant.confidence for invariant in invariants], dtype=np.float32),
+    }
+    return {
+        'count': len(invariants),
+        'columns': list(columns),
+        'kinds': list(kinds),
+        'arrays': pack_arrays(arrays, buffers),
+    }
+
+
+def unpack_invariants(packed: dict, buffers: Sequence) -> dict:
+    """Unpacks invariants packed by pack_invariants, in the same form as
+       encode_invariants, but with arrays for kind and confidence, and each
+       invariant's column_ids as a view onto the one array."""
+    arrays = unpack_arrays(packed['arrays'], buffers)
+    column_ids = arrays['column_ids']
+    column_ends = arrays['column_ends'].tolist()
+    column_starts = [0, *column_ends[:-1]]
+
+    return {
+        'columns': packed['columns'],
+        'kinds': packed['kinds'],
+        'text': unpack_strings(arrays['text'], arrays['text_ends']),
+        'kind': arrays['kind'],
+        'column_ids': [column_ids[start:end] for start, end in zip(column_starts, column_ends)],
+        'confidence': arrays['confidence'],
+    }
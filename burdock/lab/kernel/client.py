@@ -1,11 +1,15 @@
+from typing import Optional
+
 from jupyter_client import KernelManager
+from jupyter_client.session import new_id
 from jupyter_client.threaded import ThreadedKernelClient
 from traitlets import Type
 
-from burdock.lab.errors.kernel import ExecuteError, ExecuteAbort
+from burdock.lab.errors.kernel import CommNoReply, ExecuteError, ExecuteAbort
 from burdock.lab.kernel.message import Message
 from burdock.lab.util.channels import MessagePredicate, PubSubAsyncChannel, DealerRouterAsyncChannel
 from burdock.lab.util.finite_queue import FiniteQueue
+from burdock.lab.util.msg_predicates import on_execution_idle
 
 
 class BurdockKernelClient(ThreadedKernelClient):
@@ -27,6 +31,14 @@ class BurdockKernelClient(ThreadedKernelClient):
             parent=km,
         ))
 
+        # A session of our own: with the kernel manager's, iopub messages
+        # already seen by its other clients would be dropped as duplicates
+        # (see Session.clone), and our requests could not be told apart
+        # from theirs.
+        session = km.session.clone()
+        session.session = new_id()
+        kw['session'] = session
+
         # add kwargs last, for manual overrides
         kw.update(kwargs)
         return BurdockKernelClient(**kw)
@@ -71,3 +83,42 @@ class BurdockKernelClient(ThreadedKernelClient):
             result_future.set_exception(ExecuteAbort())
 
         return await result_future
+
+    def comm_open(self, target_name: str, data: Optional[dict] = None) -> str:
+        """Opens a comm to the kernel's target_name target, and returns its id.
+           The kernel answers messages sent over it on iopub (see comm_request)."""
+        comm_id = new_id()
+        self.shell_channel.send(self.session.msg('comm_open', {
+            'comm_id': comm_id,
+            'target_name': target_name,
+            'data': data or {},
+        }))
+        return comm_id
+
+    def comm_close(self, comm_id: str, data: Optional[dict] = None):
+        """Closes a comm opened by comm_open. The kernel does not reply."""
+        self.shell_channel.send(self.session.msg('comm_close', {
+            'comm_id': comm_id,
+            'data': data or {},
+        }))
+
+    async def comm_request(self, comm_id: str, data: dict) -> Message:
+        """
+        Sends data over a comm, and returns the first comm message the kernel
+        sends in reply, whose binary buffers (if any) are in Message.buffers.
+        Raises CommNoReply if the kernel went idle without replying.
+        """
+        raw_msg = self.session.msg('comm_msg', {'comm_id': comm_id, 'data': data})
+        msg_id = raw_msg['header']['msg_id']
+        # The kernel goes idle after replying, or without replying if the
+        # request failed, in which case it must not be waited for forever.
+        reply_future = self.iopub_channel.register_future(
+            msg_id,
+            lambda m: m.header.msg_type == 'comm_msg' or on_execution_idle(m)
+        )
+        self.shell_channel.send(raw_msg)
+
+        reply = await reply_future
+        if reply.header.msg_type != 'comm_msg':
+            raise CommNoReply(comm_id)
+        return reply
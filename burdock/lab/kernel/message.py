@@ -1,7 +1,10 @@
+import json
 from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Optional
 
+from jupyter_client.jsonutil import date_default
+
 
 @dataclass
 class MessageHeader:
@@ -50,4 +53,9 @@ class Message:
 
         self.metadata = raw.get('metadata', {})
         self.content = raw.get('content', {})
+        # memoryviews onto the message's binary frames (see kernel.buffers).
         self.buffers = raw.get('buffers', [])
+
+    def to_json(self) -> str:
+        """The message as JSON, without its binary buffers."""
+        return json.dumps({key: value for key, value in self.raw.items() if key != 'buffers'}, default=date_default)
@@ -0,0 +1,265 @@
+import asyncio
+import threading
+import time
+from typing import Optional, Set
+
+import zmq
+import zmq.asyncio
+
+from burdock.lab.kernel.client import BurdockKernelClient
+from burdock.lab.kernel.message import Message
+from burdock.lab.util.channels import ListenerRecord
+from burdock.lab.util.metrics import REGISTRY, RollingHistogram
+from burdock.lab.util.msg_predicates import filter_status
+
+# Seconds between heartbeats, and how long to wait for each to come back.
+HEARTBEAT_INTERVAL = 5.0
+HEARTBEAT_TIMEOUT = 1.0
+# Consecutive missed heartbeats after which a kernel is deemed unresponsive.
+MAX_MISSED_HEARTBEATS = 3
+
+# Heartbeats are echoed by the kernel's heartbeat thread (without the GIL),
+# so they take well under a millisecond unless something is wrong.
+HEARTBEAT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class KernelMonitor:
+    """
+    Follows how busy and how responsive a kernel is:
+
+    * Its execution state, from the `status` messages it publishes on
+      iopub: the kernel is busy while any request it has started (by
+      anyone, e.g. a long cell run by the user) has not finished.
+    * The latency of its heartbeat, measured every HEARTBEAT_INTERVAL
+      seconds by run_heartbeat. The heartbeat is answered even while the
+      kernel is busy, so it tells a busy kernel from a hung or dead one.
+
+    Recent busy periods and heartbeat latencies are kept as rolling
+    histograms, and also recorded (per kernel) in the REGISTRY.
+
+    It also counts the executions (execute_requests) which finished, other
+    than those sent from session_id (i.e. Burdock's own), and its
+    generation, which goes up whenever any other request finishes (e.g. an
+    execution, but also a comm message to a widget) or the kernel restarts.
+    Anything which could have changed the user's variables changes the
+    generation, which is how the manager knows when what it last heard from
+    the agent may be out of date.
+
+    The state is updated on the iopub channel's IO thread (and the
+    heartbeat on the server's event loop), under a lock. Waiting for the
+    kernel to become idle (wait_idle) happens on the event loop: the one the
+    monitor was created on, or if none was running, the one wait_idle is
+    first called from.
+    """
+    client: BurdockKernelClient
+    kernel_id: Optional[str]
+    session_id: Optional[str]
+
+    execution_state: str
+    executions: int
+    generation: int
+    busy_since: Optional[float]
+    missed_heartbeats: int
+    last_heartbeat: Optional[float]
+    busy_times: RollingHistogram
+    heartbeat_latencies: RollingHistogram
+
+    _busy_parents: Set[str]
+    _lock: threading.Lock
+    _idle: Optional[asyncio.Event]
+    _loop: Optional[asyncio.AbstractEventLoop]
+    _listener: ListenerRecord
+
+    def __init__(self, client: BurdockKernelClient, kernel_id: Optional[str] = None,
+                 session_id: Optional[str] = None):
+        self.client = client
+        self.kernel_id = kernel_id
+        self.session_id = session_id
+
+        self.execution_state = 'unknown'
+        self.executions = 0
+        self.generation = 0
+        self.busy_since = None
+        self.missed_heartbeats = 0
+        self.last_heartbeat = None
+        self.busy_times = RollingHistogram(window=300.0, slots=10)
+        self.heartbeat_latencies = RollingHistogram(window=60.0, slots=6, buckets=HEARTBEAT_BUCKETS)
+
+        self._busy_parents = set()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._idle = None
+        try:
+            self._bind_loop(asyncio.get_running_loop())
+        except RuntimeError:
+            pass
+
+        self._listener = client.iopub_channel.register_listener(filter_status, self._on_status)
+
+    # --------------------------------------------------------------------------
+    # Execution state
+    # --------------------------------------------------------------------------
+
+    @property
+    def is_busy(self) -> bool:
+        return self.execution_state == 'busy'
+
+    @property
+    def is_responsive(self) -> bool:
+        return self.missed_heartbeats < MAX_MISSED_HEARTBEATS
+
+    def busy_for(self) -> float:
+        """Seconds since the kernel last became busy, or 0 if it is not."""
+        busy_since = self.busy_since
+        return time.monotonic() - busy_since if busy_since is not None else 0.0
+
+    def _on_status(self, msg: Message):
+        state = msg.content.get('execution_state')
+        parent = msg.parent_header
+        parent_msg_id = parent.msg_id if parent else None
+        now = time.monotonic()
+
+        with self._lock:
+            if state == 'busy':
+                self._busy_parents.add(parent_msg_id)
+            elif state == 'idle':
+                self._busy_parents.discard(parent_msg_id)
+                if parent is None or parent.session != self.session_id:
+                    self.generation += 1
+                    if parent and parent.msg_type == 'execute_request':
+                        self.executions += 1
+            elif state == 'starting':
+                self._busy_parents.clear()
+
+            was_busy = self.execution_state == 'busy'
+            self.execution_state = 'busy' if self._busy_parents else (state if state == 'starting' else 'idle')
+
+            if self.is_busy and not was_busy:
+                self.busy_since = now
+            elif was_busy and not self.is_busy:
+                busy_time = now - self.busy_since
+                self.busy_since = None
+                self.busy_times.observe(busy_time, now)
+                REGISTRY.observe('burdock_kernel_busy_seconds', busy_time,
+                                 'How long kernels stay busy (with any request) at a time.',
+                                 kernel_id=self.kernel_id)
+
+            is_busy = self.is_busy
+            loop, idle = self._loop, self._idle
+        if loop is not None:
+            loop.call_soon_threadsafe(idle.clear if is_busy else idle.set)
+
+    def reset(self):
+        """Forgets the execution state, e.g. once the kernel has restarted
+           (and its pending requests will never finish)."""
+        with self._lock:
+            self._busy_parents.clear()
+            self.execution_state = 'unknown'
+            self.executions += 1
+            self.generation += 1
+            self.busy_since = None
+            self.missed_heartbeats = 0
+            loop, idle = self._loop, self._idle
+        if loop is not None:
+            loop.call_soon_threadsafe(idle.set)
+
+    def _bind_loop(self, loop: asyncio.AbstractEventLoop):
+        # Must be called on the loop, which the idle event is bound to.
+        with self._lock:
+            if self._loop is None:
+                self._loop = loop
+                self._idle = asyncio.Event()
+                if not self.is_busy:
+                    self._idle.set()
+
+    async def wait_idle(self, timeout: Optional[float]) -> bool:
+        """Waits (at most timeout seconds) for the kernel to become idle.
+           Returns whether it did."""
+        if not self.is_busy:
+            return True
+
+        self._bind_loop(asyncio.get_running_loop())
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if not self.is_busy:
+                    return True
+                # It went busy again before we got to run, but the event has
+                # not been cleared yet (which would only happen after us).
+                self._idle.clear()
+
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._idle.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+
+    # --------------------------------------------------------------------------
+    # Heartbeat
+    # --------------------------------------------------------------------------
+
+    def _heartbeat_socket(self, context: zmq.asyncio.Context) -> zmq.asyncio.Socket:
+        socket = context.socket(zmq.REQ)
+        socket.linger = 0
+        socket.connect(self.client._make_url('hb'))
+        return socket
+
+    async def heartbeat(self, socket: zmq.asyncio.Socket) -> Optional[float]:
+        """Sends a single heartbeat, and returns how long it took to come
+           back, or None if it did not within HEARTBEAT_TIMEOUT seconds (the
+           socket must then be replaced)."""
+        start = time.perf_counter()
+        await socket.send(b'burdock')
+        try:
+            await asyncio.wait_for(socket.recv(), HEARTBEAT_TIMEOUT)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.missed_heartbeats += 1
+            REGISTRY.inc('burdock_kernel_heartbeats_missed_total', 'Kernel heartbeats which were not answered in time.',
+                         kernel_id=self.kernel_id)
+            return None
+
+        latency = time.perf_counter() - start
+        with self._lock:
+            self.missed_heartbeats = 0
+            self.last_heartbeat = time.monotonic()
+        self.heartbeat_latencies.observe(latency)
+        REGISTRY.observe('burdock_kernel_heartbeat_seconds', latency, 'Round trip time of kernel heartbeats.',
+                         buckets=HEARTBEAT_BUCKETS, kernel_id=self.kernel_id)
+        return latency
+
+    async def run_heartbeat(self, interval: float = HEARTBEAT_INTERVAL):
+        """Measures the heartbeat every interval seconds, until cancelled."""
+        context = zmq.asyncio.Context.instance()
+        socket = self._heartbeat_socket(context)
+        try:
+            while True:
+                if await self.heartbeat(socket) is None:
+                    # A REQ socket which got no reply cannot send again.
+                    socket.close()
+                    socket = self._heartbeat_socket(context)
+                await asyncio.sleep(interval)
+        finally:
+            socket.close()
+
+    # --------------------------------------------------------------------------
+    # Reporting
+    # --------------------------------------------------------------------------
+
+    def close(self):
+        self.client.iopub_channel.unregister_listener(self._listener)
+
+    def model(self) -> dict:
+        """A JSON-safe summary, for the instance's model in the API."""
+        return {
+            'execution_state': self.execution_state,
+            'executions': self.executions,
+            'generation': self.generation,
+            'busy_for': self.busy_for(),
+            'responsive': self.is_responsive,
+            'missed_heartbeats': self.missed_heartbeats,
+            'busy_times': self.busy_times.summary(),
+            'heartbeat_latencies': self.heartbeat_latencies.summary(),
+        }
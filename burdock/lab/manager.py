@@ -1,65 +1,280 @@
 import ast
+import asyncio
+import functools
 import json
-from dataclasses import asdict
-from typing import Dict
+import weakref
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
 
+import numpy as np
 from jupyter_client import KernelManager, MultiKernelManager
+from jupyter_client.kernelspec import KernelSpecManager
 from jupyter_client.jsonutil import date_default
 
-from burdock.lab.errors.http import BurdockNotFound, KernelExecutionError, KernelNotFound
-from burdock.lab.errors.kernel import IPythonExecuteException, FancyPingFailed
+from burdock.lab.errors.http import BurdockNotFound, KernelBusy, KernelExecutionError, KernelNotFound, \
+    KernelUnavailable, KernelUnresponsive
+from burdock.lab.errors.kernel import CommNoReply, ExecuteError, IPythonExecuteException, FancyPingFailed, \
+    KernelLost
+from burdock.lab.kernel.buffers import message_arrays, unpack_invariants
 from burdock.lab.kernel.client import BurdockKernelClient
 from burdock.lab.kernel.message import Message
-from burdock.lab.util.msg_predicates import filter_stdout, filter_stderr, on_execution_idle
+from burdock.lab.kernel.monitor import HEARTBEAT_INTERVAL, KernelMonitor
+from burdock.lab.util.channels import ListenerRecord
+from burdock.lab.util.finite_queue import FiniteQueue
+from burdock.lab.util.metrics import REGISTRY
+from burdock.lab.util.msg_predicates import filter_error, filter_stdout, filter_stderr, on_execution_idle, \
+    has_metrics_report
+
+# The IPython extension which installs the agent (see load_ipython_extension).
+EXTENSION = 'burdock.lab'
+
+# Installs the agent into a kernel (see BurdockManager.install).
+INSTALL_CODE = (
+    "from IPython.core.getipython import get_ipython\n"
+    "from burdock.lab.agent import install_agent\n"
+    "install_agent(get_ipython())"
+    "\n"
+)
+
+# The agent's comm target (see BurdockAgent.install).
+COMM_TARGET = 'burdocklab_target'
+
+# Seconds a request waits for a busy kernel to become idle before giving up.
+BUSY_TIMEOUT = 5.0
 
 
 class BurdockManager:
     """
     A manager which keeps track of a single instance of Burdock and its
     associated kernel.
+
+    Requests are only sent to the kernel once it is idle (see
+    KernelMonitor), rather than queueing behind whatever it is running,
+    where nothing could tell them from a hung kernel. A request to a busy
+    kernel waits for at most busy_timeout seconds, and then fails with
+    KernelBusy. Identical requests in flight at the same time share one
+    execution, and the list of dataframes is answered from the last one
+    the agent sent, for as long as no execution could have changed it.
     """
     kernel_manager: KernelManager
+    kernel_id: Optional[str]
     client: BurdockKernelClient
+    monitor: KernelMonitor
+    busy_timeout: Optional[float]
 
     is_installed: bool
-
-    def __init__(self, km: KernelManager):
+    is_closed: bool
+
+    _metrics_listener: ListenerRecord
+    _install_lock: asyncio.Lock
+    _heartbeat: Optional[asyncio.Future]
+    # Our comm to the agent, once opened (see _comm_request).
+    _comm_id: Optional[str]
+    _in_flight: Dict[Hashable, asyncio.Future]
+    # The agent's last list of dataframes, and monitor.generation at the time.
+    _dataframe_variables: Optional[Tuple[int, str]]
+
+    def __init__(self, km: KernelManager, kernel_id: Optional[str] = None,
+                 busy_timeout: Optional[float] = BUSY_TIMEOUT,
+                 heartbeat_interval: Optional[float] = HEARTBEAT_INTERVAL):
         self.kernel_manager = km
+        self.kernel_id = kernel_id
         self.client = BurdockKernelClient.create(km)
         self.client.start_channels()
+        self.busy_timeout = busy_timeout
+        self.is_installed = False
+        self.is_closed = False
+        self._install_lock = asyncio.Lock()
+        self._in_flight = dict()
+        self._dataframe_variables = None
+        self._comm_id = None
+
+        self.monitor = KernelMonitor(self.client, kernel_id, session_id=self.client.session.session)
+        self._heartbeat = None
+        if heartbeat_interval is not None:
+            self._heartbeat = asyncio.ensure_future(self.monitor.run_heartbeat(heartbeat_interval))
+
+        # The agent piggybacks its metrics on the comm messages it sends to
+        # the front end, which we also see (on iopub).
+        self._metrics_listener = self.client.iopub_channel.register_listener(has_metrics_report,
+                                                                             self._on_metrics_report)
+
+        # Restarts by the kernel's own restarter (i.e. after it died), rather
+        # than through the server, are only seen through these callbacks.
+        km.add_restart_callback(self._on_kernel_restart, 'restart')
+        km.add_restart_callback(self._on_kernel_dead, 'dead')
+
+    def _on_metrics_report(self, msg: Message):
+        REGISTRY.merge(msg.metadata['burdock_metrics'], kernel_id=self.kernel_id)
+
+    def _drop_pending(self, reason: str, listeners: bool = False):
+        error = KernelLost(self.kernel_id, reason)
+        for channel in (self.client.shell_channel, self.client.iopub_channel, self.client.stdin_channel):
+            channel.clear_registrations(error, listeners=listeners)
+
+    def _on_kernel_restart(self):
+        self.kernel_restarted('restarted', alive=False)
+
+    def _on_kernel_dead(self):
+        self.kernel_restarted('died', alive=False)
+
+    def _close_comm(self):
+        if self._comm_id is not None:
+            self.client.comm_close(self._comm_id)
+            self._comm_id = None
+
+    def kernel_restarted(self, reason: str = 'restarted', alive: bool = True):
+        """Called when the kernel is (about to be) restarted. Requests pending
+           on the old kernel fail, and the agent is re-installed the next
+           time it is needed. If the old kernel may still be alive (i.e. it
+           is about to be restarted, rather than dead), our comm is closed."""
+        REGISTRY.inc('burdock_kernel_restarts_total', 'Kernel restarts (or deaths) seen by Burdock.')
         self.is_installed = False
+        if alive:
+            self._close_comm()
+        self._comm_id = None
+        self.monitor.reset()
+        self._drop_pending(reason)
+
+    def close(self):
+        """Stops this manager's channels (and their threads), and frees
+           everything registered on them. Called when its kernel is shut
+           down; the manager cannot be used afterwards."""
+        if self.is_closed:
+            return
+        self.is_closed = True
+        self.is_installed = False
+
+        self.kernel_manager.remove_restart_callback(self._on_kernel_restart, 'restart')
+        self.kernel_manager.remove_restart_callback(self._on_kernel_dead, 'dead')
+
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+        self.monitor.close()
+        # Sent before the channels stop, which they only do once it is.
+        self._close_comm()
+        self.client.stop_channels()
+        self._drop_pending('shut down', listeners=True)
 
     async def _execute(self, code) -> Message:
         try:
-            return await self.client.execute_retval(code)
+            with REGISTRY.span('burdock_kernel_execute_seconds',
+                               'Time taken to execute code in a kernel and receive its result.'):
+                return await self.client.execute_retval(code)
+        except KernelLost as e:
+            raise KernelUnavailable(e.kernel_id, e.reason)
         except IPythonExecuteException as e:
+            REGISTRY.inc('burdock_kernel_execute_errors_total',
+                         'Executions in a kernel which raised or were aborted.')
             raise KernelExecutionError(e)
 
-    def _stream(self, code, filter_pred=None, close_pred=None):
+    async def _comm_request(self, request: str, data: dict) -> Message:
+        """Sends a request (see BurdockAgent.handle_request) to the agent
+           over a comm, opening it first if need be, and returns its reply.
+           Unlike the result of an execution, the reply may carry buffers."""
+        await self.ensure_installed()
+        await self._when_idle(request)
+        if self._comm_id is None:
+            self._comm_id = self.client.comm_open(COMM_TARGET)
+
+        try:
+            with REGISTRY.span('burdock_kernel_comm_seconds',
+                               'Time taken to send a request to an agent over a comm and receive its reply.'):
+                reply = await self.client.comm_request(self._comm_id, {'request': request, **data})
+        except KernelLost as e:
+            raise KernelUnavailable(e.kernel_id, e.reason)
+        except CommNoReply as e:
+            # The comm may have been closed by the kernel; open another next time.
+            self._comm_id = None
+            raise KernelExecutionError(ExecuteError(name='CommNoReply',
+                                                    value=f"No reply to {request!r} on comm {e.comm_id}",
+                                                    traceback=[]))
+
+        content = reply.content['data']
+        if content.get('status') == 'error':
+            raise KernelExecutionError(ExecuteError(name=content['ename'], value=content['evalue'], traceback=[]))
+        return reply
+
+    def registration_counts(self) -> Dict[str, int]:
+        """The number of records registered on this manager's channels, by kind."""
+        counts = dict()
+        for channel in (self.client.shell_channel, self.client.iopub_channel, self.client.stdin_channel):
+            for kind, count in channel.registration_counts().items():
+                counts[kind] = counts.get(kind, 0) + count
+        return counts
+
+    def stream(self, code, filter_pred=None, close_pred=None) -> FiniteQueue:
+        """Executes code in the kernel, and returns a queue of the iopub
+           messages it produces which match filter_pred, until one matches
+           close_pred (see BurdockKernelClient.execute_output)."""
         return self.client.execute_output(code, filter_pred, close_pred)
 
+    @staticmethod
+    def _count_dispatch(request: str, action: str):
+        REGISTRY.inc('burdock_busy_dispatch_total',
+                     'Requests which did not go straight to their kernel, by what happened instead '
+                     '(deferred, coalesced, cached or rejected).',
+                     request=request, action=action)
+
+    async def _when_idle(self, request: str):
+        """Waits for the kernel to finish what it is doing before a request
+           is sent to it. Raises KernelUnresponsive if its heartbeat has
+           stopped, and KernelBusy if it is still busy after busy_timeout
+           seconds.
+
+           The request must be sent straight after, without awaiting anything
+           else, so that no other request can be started in between by the
+           server. A request which reached the kernel from elsewhere (e.g. a
+           cell run by the user) but has not been announced on iopub yet can
+           still be ahead of it."""
+        monitor = self.monitor
+        if not monitor.is_responsive:
+            self._count_dispatch(request, 'rejected')
+            raise KernelUnresponsive(self.kernel_id, monitor.missed_heartbeats)
+
+        if monitor.is_busy:
+            self._count_dispatch(request, 'deferred')
+            if not await monitor.wait_idle(self.busy_timeout):
+                self._count_dispatch(request, 'rejected')
+                raise KernelBusy(self.kernel_id, monitor.busy_for())
+
+    async def _coalesced(self, key: Tuple[str, ...], request: Callable[[], Awaitable]):
+        """Runs request(), unless an identical one (by key) is already in
+           flight, in which case its result is shared."""
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(request())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self._count_dispatch(key[0], 'coalesced')
+        # A caller giving up must not cancel the request for the others.
+        return await asyncio.shield(future)
+
+    async def ensure_installed(self):
+        """Installs the agent, unless it is already installed (e.g. it must
+           be re-installed after the kernel restarts)."""
+        async with self._install_lock:
+            if not self.is_installed:
+                await self.install()
+
     async def install(self):
         """
-        Check if a BurdockAgent is installed in the kernel, and if not,
-        install one.
+        Install a BurdockAgent in the kernel, unless the kernel has one
+        already (e.g. it was launched with the IPython extension).
         """
-        response = await self._execute((
-            "from IPython.core.getipython import get_ipython\n"
-            "from burdock.lab.agent import BurdockAgent\n"
-            "BurdockAgent(get_ipython())"
-            "\n"
-        ))
+        await self._when_idle('install')
+        response = await self._execute(INSTALL_CODE)
 
         self.is_installed = True
-        return json.dumps(asdict(response), default=date_default)
+        return response.to_json()
 
     async def ping(self):
         response = await self._execute("'po' + 'ng'")
 
-        return json.dumps(asdict(response), default=date_default)
+        return response.to_json()
 
     async def fancy_ping(self):
-        queue = self._stream(
+        queue = self.stream(
             '_ = [print(i) for i in [1,2,3]]',
             filter_pred=lambda msg: filter_stdout(msg) or filter_stderr(msg),
             close_pred=on_execution_idle
@@ -85,26 +300,230 @@ class BurdockManager:
         return json.dumps(outputs, default=date_default)
 
     async def list_dfvars(self):
+        # The agent only updates its list after an execution, so until any
+        # other request finishes (see KernelMonitor.generation), the last
+        # list it sent is still current.
+        cached = self._dataframe_variables
+        if cached is not None and cached[0] == self.monitor.generation:
+            self._count_dispatch('list_dfvars', 'cached')
+            return cached[1]
+        return await self._coalesced(('list_dfvars',), self._list_dfvars)
+
+    async def _list_dfvars(self):
+        await self.ensure_installed()
+        await self._when_idle('list_dfvars')
+        generation = self.monitor.generation
         response = await self._execute("__burdock__.data_frame_variables")
-        return json.dumps(asdict(response), default=date_default)
+        result = response.to_json()
+        self._dataframe_variables = (generation, result)
+        return result
+
+    async def profile(self, var_name: str) -> Optional[dict]:
+        """Profile a single analysis of the named dataframe in the kernel
+           (see BurdockAgent.profile), and return the report, or None if there
+           is no such dataframe. The report is sent as the comm reply's JSON
+           content, rather than as the repr of an execution's result."""
+        return await self._coalesced(('profile', var_name), lambda: self._profile(var_name))
+
+    async def _profile(self, var_name: str) -> Optional[dict]:
+        reply = await self._comm_request('profile', {'name': var_name})
+        content = reply.content['data']
+        return content['report'] if content['found'] else None
+
+    async def column_statistics(self, var_name: str,
+                                binary: bool = True) -> Optional[Tuple[List[str], Dict[str, np.ndarray]]]:
+        """The statistics of the named dataframe's numeric columns (see
+           BurdockAgent.column_statistics), by statistic, or None if there is
+           no such dataframe. Unless binary is unset, the arrays are sent in
+           the reply's buffers, and read from them without copying."""
+        reply = await self._comm_request('statistics', {'name': var_name, 'binary': binary})
+        content = reply.content['data']
+        if not content['found']:
+            return None
+
+        statistics = content['statistics']
+        if binary:
+            arrays = message_arrays(reply, statistics['arrays'])
+        else:
+            arrays = {statistic: np.array(values, dtype=np.float64) for statistic, values in statistics.items()}
+        return content['columns'], arrays
+
+    async def inspect(self, var_name: str, binary: bool = True, **options) -> Optional[dict]:
+        """Inspects the named dataframe as the front end does, passing on
+           options (filters, limit and cursor, see BurdockAgent.do_inspect),
+           and returns the page of invariants, or None if there is no such
+           dataframe. Unless binary is unset, the invariants are sent packed
+           in the reply's buffers (see kernel.buffers.unpack_invariants)."""
+        reply = await self._comm_request('inspect', {'code': var_name, 'cursor_pos': len(var_name),
+                                                     'binary': binary, **options})
+        page = reply.content['data'].get('mimebundle', {}).get('application/json', {})
+        if 'invariants' not in page:
+            return None
+
+        if binary:
+            page = {**page, 'invariants': unpack_invariants(page['invariants'], reply.buffers)}
+        return page
+
+    async def analyze_windows(self, var_name: str, time_column: Optional[str], freq: str,
+                              size: Optional[str] = None,
+                              analysis_profile: Optional[str] = None) -> AsyncIterator[dict]:
+        """Analyze the named dataframe per time window in the kernel (see
+           BurdockAgent.analyze_windows), yielding each window's results as
+           soon as the kernel prints them."""
+        await self.ensure_installed()
+        await self._when_idle('analyze_windows')
+        queue = self.stream(
+            f'__burdock__.print_windows({var_name!r}, {time_column!r}, {freq!r}, {size!r}, {analysis_profile!r})',
+            filter_pred=lambda msg: filter_stdout(msg) or filter_error(msg),
+            close_pred=on_execution_idle
+        )
+
+        # Stream messages may split or join lines arbitrarily.
+        buffer = ''
+        while True:
+            msg = await queue.get()
+            queue.task_done()
+            if msg is queue.sentinel:
+                break
+
+            if filter_error(msg):
+                REGISTRY.inc('burdock_kernel_execute_errors_total',
+                             'Executions in a kernel which raised or were aborted.')
+                raise KernelExecutionError(ExecuteError(name=msg.content['ename'],
+                                                        value=msg.content['evalue'],
+                                                        traceback=msg.content['traceback']))
+
+            *lines, buffer = (buffer + msg.content['text']).split('\n')
+            for line in lines:
+                if line.startswith('{'):
+                    yield json.loads(line)
 
     async def generate_daikon_inputs(self, var_name: str) -> (str, str):
-        response = await self._execute(f'__burdock__.analyze(\"{var_name}\")')
+        await self.ensure_installed()
+        await self._when_idle('generate_daikon_inputs')
+        response = await self._execute(f'__burdock__.generate_daikon_inputs(\"{var_name}\")')
         (decls_path, dtrace_path) = ast.literal_eval(response.content['data']['text/plain'])
         return decls_path, dtrace_path
 
 
+def _before(method: Callable, hook: Callable) -> Callable:
+    """Wraps a (sync or async) method of a kernel manager, so that
+       hook(kernel_id, *args, **kwargs) is called before it."""
+    @functools.wraps(method)
+    def wrapper(kernel_id, *args, **kwargs):
+        hook(kernel_id, *args, **kwargs)
+        return method(kernel_id, *args, **kwargs)
+    return wrapper
+
+
+def _is_ipython_kernel(multi_kernel_manager: MultiKernelManager, kernel_name: Optional[str]) -> bool:
+    # The server sets the kernel spec manager, but a bare manager may not have one.
+    spec_manager = multi_kernel_manager.kernel_spec_manager or KernelSpecManager()
+    try:
+        spec = spec_manager.get_kernel_spec(kernel_name or multi_kernel_manager.default_kernel_name)
+    except Exception:
+        return False
+    return any('ipykernel' in arg for arg in spec.argv)
+
+
+# Every MultiBurdockManager, for the process-wide gauges (see _register_gauges).
+_multi_managers: 'weakref.WeakSet[MultiBurdockManager]' = weakref.WeakSet()
+
+
+def _register_gauges():
+    """Registers gauges over every live MultiBurdockManager, so that a second
+       manager (e.g. in a benchmark) is counted along with the first. Gauges
+       are keyed by name and labels, so registering them again replaces them."""
+    def total(count: Callable[['MultiBurdockManager'], int]) -> Callable[[], int]:
+        return lambda: sum(count(multi) for multi in list(_multi_managers))
+
+    REGISTRY.gauge('burdock_instances', total(len),
+                   'Number of live Burdock instances (one per kernel).')
+    for kind in ('events', 'futures', 'queues', 'listeners'):
+        REGISTRY.gauge('burdock_channel_registrations',
+                       total(lambda multi, kind=kind: multi.registration_counts().get(kind, 0)),
+                       'Number of records registered on kernel channels, by kind.',
+                       kind=kind)
+    REGISTRY.gauge('burdock_channel_threads', total(lambda multi: multi.resource_counts()['threads']),
+                   'Number of live IO threads of Burdock kernel clients.')
+    REGISTRY.gauge('burdock_kernels_busy',
+                   total(lambda multi: sum(1 for instance in list(multi._instances.values())
+                                           if instance.monitor.is_busy)),
+                   'Number of kernels (with a Burdock instance) which are busy.')
+
+
 class MultiBurdockManager:
     """
     A manager which keeps track of all extant BurdockManagers and their
     associated kernel managers.
+
+    Kernel shutdowns (including culling) and restarts through the server
+    are followed by wrapping the multi kernel manager's shutdown_kernel
+    and restart_kernel: when a kernel is shut down, its BurdockManager is
+    closed and dropped, and when it is restarted, its agent is re-installed
+    the next time it is needed.
+
+    With autoload, IPython kernels started through the server are launched
+    with the IPython extension (see burdock.lab.load_ipython_extension), so
+    their agent is installed, and its imports warmed up, before it is first
+    needed. Installing it again is then a no-op. The launch arguments are
+    kept across restarts.
     """
     _instances: Dict[str, BurdockManager]
 
-    def __init__(self, multi_kernel_manager: MultiKernelManager):
+    def __init__(self, multi_kernel_manager: MultiKernelManager, autoload: bool = True):
         self.multi_kernel_manager = multi_kernel_manager
         self._instances = dict()
 
+        if autoload:
+            multi_kernel_manager.start_kernel = self._with_extension(multi_kernel_manager.start_kernel)
+
+        multi_kernel_manager.shutdown_kernel = _before(multi_kernel_manager.shutdown_kernel,
+                                                       self._on_shutdown_kernel)
+        multi_kernel_manager.restart_kernel = _before(multi_kernel_manager.restart_kernel,
+                                                      self._on_restart_kernel)
+
+        _multi_managers.add(self)
+        _register_gauges()
+
+    def _with_extension(self, start_kernel: Callable) -> Callable:
+        @functools.wraps(start_kernel)
+        def wrapper(*args, **kwargs):
+            if _is_ipython_kernel(self.multi_kernel_manager, kwargs.get('kernel_name')):
+                kwargs['extra_arguments'] = [*kwargs.get('extra_arguments', []), f'--ext={EXTENSION}']
+            return start_kernel(*args, **kwargs)
+        return wrapper
+
+    def _on_shutdown_kernel(self, kernel_id: str, now: bool = False, restart: bool = False):
+        if restart:
+            self._on_restart_kernel(kernel_id)
+        else:
+            self.remove_instance(kernel_id)
+
+    def _on_restart_kernel(self, kernel_id: str, *args, **kwargs):
+        instance = self._instances.get(kernel_id)
+        if instance is not None:
+            instance.kernel_restarted()
+
+    def registration_counts(self) -> Dict[str, int]:
+        counts = dict()
+        for instance in list(self._instances.values()):
+            for kind, count in instance.registration_counts().items():
+                counts[kind] = counts.get(kind, 0) + count
+        return counts
+
+    def resource_counts(self) -> Dict[str, int]:
+        """Counts of the live resources held for kernels: instances, the
+           IO and heartbeat threads of their clients, and the records
+           registered on their channels."""
+        counts = {'instances': len(self), 'threads': 0, 'events': 0, 'futures': 0, 'queues': 0, 'listeners': 0}
+        for instance in list(self._instances.values()):
+            client = instance.client
+            threads = [getattr(client, 'ioloop_thread', None), getattr(client, '_hb_channel', None)]
+            counts['threads'] += sum(1 for thread in threads if thread is not None and thread.is_alive())
+        counts.update(self.registration_counts())
+        return counts
+
     def _check_kernel(self, kernel_id):
         """Check a that a kernel_id exists and raise 404 if not."""
         if kernel_id not in self.multi_kernel_manager:
@@ -118,6 +537,7 @@ class MultiBurdockManager:
         return list(self._instances.keys())
 
     def list_instances(self):
+        self.prune()
         instances = []
         kernel_ids = self.list_kernel_ids()
 
@@ -132,9 +552,26 @@ class MultiBurdockManager:
 
     def create_instance(self, kernel_id):
         self._check_kernel(kernel_id)
+        self.prune()
 
         km = self.multi_kernel_manager.get_kernel(kernel_id)
-        self._instances[kernel_id] = BurdockManager(km)
+        self._instances[kernel_id] = BurdockManager(km, kernel_id)
+
+    def remove_instance(self, kernel_id: str):
+        """Closes and forgets the instance for a kernel, if there is one,
+           along with the metrics labelled with the kernel's id."""
+        instance = self._instances.pop(kernel_id, None)
+        if instance is not None:
+            instance.close()
+        REGISTRY.remove_series(kernel_id=kernel_id)
+
+    def prune(self):
+        """Removes the instances of kernels which no longer exist, e.g.
+           because they were shut down without going through the multi
+           kernel manager's shutdown_kernel (as shutdown_all does)."""
+        for kernel_id in list(self._instances):
+            if kernel_id not in self.multi_kernel_manager:
+                self.remove_instance(kernel_id)
 
     def get_instance(self, kernel_id: str):
         return self._instances[kernel_id]
@@ -147,7 +584,8 @@ class MultiBurdockManager:
 
         model = {
             "id": kernel_id,
-            "installed": instance.is_installed
+            "installed": instance.is_installed,
+            "kernel": instance.monitor.model()
         }
         return model
 
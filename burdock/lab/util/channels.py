@@ -13,8 +13,10 @@ from zmq.eventloop.zmqstream import ZMQStream
 
 from burdock.lab.kernel.message import Message
 from burdock.lab.util.finite_queue import FiniteQueue
+from burdock.lab.util.metrics import REGISTRY
 
 MessagePredicate = Callable[[Message], bool]
+MessageCallback = Callable[[Message], None]
 
 
 @dataclass(frozen=True)
@@ -47,6 +49,16 @@ class QueueRecord:
     queue: FiniteQueue = field(default_factory=FiniteQueue)
 
 
+@dataclass(frozen=True)
+class ListenerRecord:
+    """Represents a persistent listener on an AsyncChannel. Unlike the other
+       records, a listener is not tied to a parent message and is never
+       removed automatically: callback(message) is called (on the channel's
+       IO thread) for every message for which predicate(message) holds."""
+    predicate: MessagePredicate
+    callback: MessageCallback
+
+
 class AsyncChannel(ThreadedZMQSocketChannel):
     """
     Mostly identical to ThreadedZMQSocketChannel, but with some
@@ -62,6 +74,7 @@ class AsyncChannel(ThreadedZMQSocketChannel):
     events: Dict[str, Set[EventRecord]]
     futures: Dict[str, Set[FutureRecord]]
     queues: Dict[str, Set[QueueRecord]]
+    listeners: Set[ListenerRecord]
 
     logger: Optional[Logger] = None
 
@@ -70,6 +83,7 @@ class AsyncChannel(ThreadedZMQSocketChannel):
         self.events = defaultdict(set)
         self.futures = defaultdict(set)
         self.queues = defaultdict(set)
+        self.listeners = set()
         self.logger = logger
 
     def register_event(self, parent_msg_id: Optional[str], predicate: MessagePredicate) -> Event:
@@ -114,6 +128,46 @@ class AsyncChannel(ThreadedZMQSocketChannel):
             if record.queue == queue:
                 records -= {record}
 
+    def register_listener(self, predicate: MessagePredicate, callback: MessageCallback) -> ListenerRecord:
+        record = ListenerRecord(predicate, callback)
+        self.listeners |= {record}
+        return record
+
+    def unregister_listener(self, record: ListenerRecord):
+        self.listeners -= {record}
+
+    def clear_registrations(self, error: BaseException, listeners: bool = True):
+        """Drops every registered record, e.g. once the kernel has gone
+           away and they will never be satisfied. Whatever waits on them is
+           released: events are set, futures fail with error, and queues are
+           closed. Listeners are only dropped if listeners is set."""
+        events, futures, queues = self.events, self.futures, self.queues
+        self.events, self.futures, self.queues = defaultdict(set), defaultdict(set), defaultdict(set)
+
+        for records in events.values():
+            for record in records:
+                record.event.set()
+        for records in futures.values():
+            for record in records:
+                if not record.future.done():
+                    record.future.set_exception(error)
+        for records in queues.values():
+            for record in records:
+                if not record.queue.closed.is_set():
+                    record.queue.close_nowait()
+
+        if listeners:
+            self.listeners = set()
+
+    def registration_counts(self) -> Dict[str, int]:
+        """The number of records currently registered, by kind."""
+        return {
+            'events': sum(len(records) for records in list(self.events.values())),
+            'futures': sum(len(records) for records in list(self.futures.values())),
+            'queues': sum(len(records) for records in list(self.queues.values())),
+            'listeners': len(self.listeners),
+        }
+
     def _handle_events(self, msg: Message):
         parent_msg_id = msg.parent_header.msg_id if msg.parent_header else None
 
@@ -159,12 +213,21 @@ class AsyncChannel(ThreadedZMQSocketChannel):
             if not records:
                 del self.queues[parent_msg_id]
 
-    def call_handlers(self, raw_msg: dict):
-        msg = Message(raw_msg)
+    def _handle_listeners(self, msg: Message):
+        for record in list(self.listeners):
+            if record.predicate(msg):
+                record.callback(msg)
 
-        self._handle_events(msg)
-        self._handle_futures(msg)
-        self._handle_queues(msg)
+    def call_handlers(self, raw_msg: dict):
+        with REGISTRY.span('burdock_channel_dispatch_seconds',
+                           'Time spent dispatching a message received on a kernel channel.',
+                           channel=type(self).__name__):
+            msg = Message(raw_msg)
+
+            self._handle_events(msg)
+            self._handle_futures(msg)
+            self._handle_queues(msg)
+            self._handle_listeners(msg)
 
 
 class DealerRouterAsyncChannel(AsyncChannel):
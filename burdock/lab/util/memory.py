@@ -0,0 +1,65 @@
+import threading
+import tracemalloc
+from typing import List, Optional
+
+
+class TracedPeak:
+    """
+    Measures the peak memory traced by tracemalloc over the body of a with
+    statement, beyond what was traced when it started:
+
+        with TracedPeak() as peak:
+            ...
+        peak.bytes
+
+    tracemalloc keeps a single peak, which each measurement resets when it
+    starts. Measurements may be nested (e.g. a stage within a profiled
+    analysis): the peak is folded into every open measurement before it is
+    reset, so each still sees the largest peak over the whole of its body.
+
+    bytes is None if tracemalloc was not tracing when the measurement
+    started. Without tracemalloc.reset_peak (before Python 3.9), the peak
+    cannot be reset, so it is the largest since tracing started.
+    """
+    bytes: Optional[int]
+
+    _base: int
+    _peak: int
+
+    # Open measurements, innermost last. tracemalloc's peak is global, so
+    # this is shared by every thread.
+    _open: List['TracedPeak'] = []
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.bytes = None
+
+    @classmethod
+    def _fold(cls) -> int:
+        """Folds the current peak into every open measurement, and returns
+           the memory traced now."""
+        current, peak = tracemalloc.get_traced_memory()
+        for measurement in cls._open:
+            measurement._peak = max(measurement._peak, peak)
+        return current
+
+    def __enter__(self) -> 'TracedPeak':
+        if not tracemalloc.is_tracing():
+            return self
+
+        with self._lock:
+            self._fold()
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            self._base, self._peak = tracemalloc.get_traced_memory()
+            self._open.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        with self._lock:
+            if self not in self._open:
+                return
+            if tracemalloc.is_tracing():
+                self._fold()
+            self._open.remove(self)
+        self.bytes = max(self._peak - self._base, 0)
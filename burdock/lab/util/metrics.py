@@ -0,0 +1,322 @@
+import math
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+# Upper bounds (in seconds) of the default histogram buckets. Inspections
+# range from milliseconds (cache hits) to minutes (Daikon on wide frames).
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: dict) -> Labels:
+    return tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ''
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+class Counter:
+    """A monotonically increasing count (e.g. of cache hits)."""
+    value: float
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class Histogram:
+    """Counts observations (e.g. durations) into cumulative buckets, in the
+       same way as a Prometheus histogram."""
+    buckets: Tuple[float, ...]
+    counts: list
+    sum: float
+    count: int
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RollingHistogram:
+    """
+    A histogram of recent observations only: those of (roughly) the last
+    `window` seconds. Observations are counted into `slots` consecutive
+    sub-histograms, each covering window / slots seconds, and expire a
+    whole slot at a time, so memory is bounded however many there are.
+
+    Quantiles are estimated from the buckets, by interpolating linearly
+    within the bucket the quantile falls into (as Prometheus does).
+    """
+    window: float
+    buckets: Tuple[float, ...]
+
+    _slot_seconds: float
+    _slots: Deque[Tuple[int, Histogram]]
+    _lock: threading.Lock
+
+    def __init__(self, window: float = 60.0, slots: int = 6, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.window = window
+        self.buckets = tuple(buckets)
+        self._slot_seconds = window / slots
+        self._slots = deque(maxlen=slots)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, now: Optional[float] = None):
+        index = int((time.monotonic() if now is None else now) // self._slot_seconds)
+        with self._lock:
+            if not self._slots or self._slots[-1][0] != index:
+                self._slots.append((index, Histogram(self.buckets)))
+            self._slots[-1][1].observe(value)
+
+    def histogram(self, now: Optional[float] = None) -> Histogram:
+        """The observations of the current window, merged into one histogram."""
+        index = int((time.monotonic() if now is None else now) // self._slot_seconds)
+        merged = Histogram(self.buckets)
+        with self._lock:
+            for slot_index, slot in self._slots:
+                if slot_index > index - self._slots.maxlen:
+                    merged.counts = [a + b for a, b in zip(merged.counts, slot.counts)]
+                    merged.sum += slot.sum
+                    merged.count += slot.count
+        return merged
+
+    def quantile(self, q: float, now: Optional[float] = None) -> Optional[float]:
+        """An estimate of the q-quantile (0 <= q <= 1) of the current window,
+           or None if it is empty. Values beyond the last bucket are reported
+           as its upper bound."""
+        histogram = self.histogram(now)
+        if not histogram.count:
+            return None
+
+        rank = q * histogram.count
+        cumulative = 0
+        for i, count in enumerate(histogram.counts):
+            if count and cumulative + count >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def summary(self, now: Optional[float] = None) -> dict:
+        histogram = self.histogram(now)
+        return {
+            'window': self.window,
+            'count': histogram.count,
+            'mean': histogram.sum / histogram.count if histogram.count else None,
+            'p50': self.quantile(0.50, now),
+            'p90': self.quantile(0.90, now),
+            'p99': self.quantile(0.99, now),
+        }
+
+
+class MetricsRegistry:
+    """
+    A thread-safe collection of counters, histograms and gauges, which can
+    be rendered in the Prometheus text exposition format.
+
+    Metrics are identified by name and labels, and are created on first
+    use. Gauges are callbacks, evaluated only when the registry is
+    rendered (e.g. to report the size of some collection).
+
+    Registries can also be drained into JSON-safe snapshots and merged
+    into other registries. This is how metrics recorded in a kernel (by
+    the agent) are reported to, and exposed by, the server.
+    """
+    _lock: threading.Lock
+    _help: Dict[str, str]
+    _types: Dict[str, str]
+    _counters: Dict[Tuple[str, Labels], Counter]
+    _histograms: Dict[Tuple[str, Labels], Histogram]
+    _gauges: Dict[Tuple[str, Labels], Callable[[], float]]
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = OrderedDict()
+        self._types = dict()
+        self._counters = dict()
+        self._histograms = dict()
+        self._gauges = dict()
+
+    def _declare(self, name: str, kind: str, help_text: str):
+        if name not in self._types:
+            self._types[name] = kind
+            self._help[name] = help_text
+
+    # --------------------------------------------------------------------------
+    # Recording
+    # --------------------------------------------------------------------------
+
+    def inc(self, name: str, help_text: str = '', amount: float = 1.0, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._declare(name, 'counter', help_text)
+            counter = self._counters.get(key)
+            if counter is None:
+                counter = self._counters[key] = Counter()
+            counter.inc(amount)
+
+    def observe(self, name: str, value: float, help_text: str = '', buckets=DEFAULT_BUCKETS, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._declare(name, 'histogram', help_text)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, name: str, help_text: str = '', **labels):
+        """Times the body of the with statement into the named histogram.
+           The observation is recorded even if the body raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, help_text, **labels)
+
+    def gauge(self, name: str, func: Callable[[], float], help_text: str = '', **labels):
+        with self._lock:
+            self._declare(name, 'gauge', help_text)
+            self._gauges[(name, _labels(labels))] = func
+
+    def remove_gauge(self, name: str, **labels):
+        with self._lock:
+            self._gauges.pop((name, _labels(labels)), None)
+
+    def remove_series(self, **labels):
+        """Removes every counter, histogram and gauge labelled with (at
+           least) labels, e.g. those of a kernel which was shut down."""
+        wanted = set(_labels(labels))
+        with self._lock:
+            for metrics in (self._counters, self._histograms, self._gauges):
+                for key in [key for key in metrics if wanted.issubset(key[1])]:
+                    del metrics[key]
+
+    # --------------------------------------------------------------------------
+    # Reporting
+    # --------------------------------------------------------------------------
+
+    def is_empty(self) -> bool:
+        """Whether nothing has been counted or observed (since the last drain)."""
+        with self._lock:
+            return not self._counters and not self._histograms
+
+    def drain(self) -> dict:
+        """Returns a JSON-safe snapshot of all counters and histograms, and
+           resets them (so that successive snapshots are deltas)."""
+        with self._lock:
+            snapshot = {
+                'help': dict(self._help),
+                'counters': [
+                    [name, list(map(list, labels)), counter.value]
+                    for (name, labels), counter in self._counters.items()
+                ],
+                'histograms': [
+                    [name, list(map(list, labels)), list(histogram.buckets), histogram.counts,
+                     histogram.sum, histogram.count]
+                    for (name, labels), histogram in self._histograms.items()
+                ],
+            }
+            self._counters.clear()
+            self._histograms.clear()
+        return snapshot
+
+    def merge(self, snapshot: dict, **extra_labels):
+        """Adds a snapshot from drain() into this registry, adding extra_labels
+           (e.g. the kernel the snapshot came from) to each metric."""
+        help_texts = snapshot.get('help', {})
+
+        with self._lock:
+            for name, labels, value in snapshot.get('counters', []):
+                self._declare(name, 'counter', help_texts.get(name, ''))
+                key = (name, _labels({**dict(labels), **extra_labels}))
+                counter = self._counters.get(key)
+                if counter is None:
+                    counter = self._counters[key] = Counter()
+                counter.inc(value)
+
+            for name, labels, buckets, counts, total, count in snapshot.get('histograms', []):
+                self._declare(name, 'histogram', help_texts.get(name, ''))
+                key = (name, _labels({**dict(labels), **extra_labels}))
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram(tuple(buckets))
+                if list(histogram.buckets) != list(buckets):
+                    continue
+                histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+                histogram.sum += total
+                histogram.count += count
+
+    def render(self) -> str:
+        """Renders every metric in the Prometheus text exposition format (0.0.4)."""
+        with self._lock:
+            gauges = list(self._gauges.items())
+            counters = [(key, counter.value) for key, counter in self._counters.items()]
+            histograms = [(key, histogram.buckets, list(histogram.counts), histogram.sum, histogram.count)
+                          for key, histogram in self._histograms.items()]
+            help_texts = dict(self._help)
+            types = dict(self._types)
+
+        samples: Dict[str, list] = OrderedDict((name, []) for name in help_texts)
+
+        for (name, labels), func in gauges:
+            try:
+                value = float(func())
+            except Exception:
+                continue
+            samples[name].append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for (name, labels), value in counters:
+            samples[name].append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for (name, labels), buckets, counts, total, count in histograms:
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = (('le', _format_value(bound)),)
+                samples[name].append(f"{name}_bucket{_format_labels(labels, le)} {cumulative}")
+            samples[name].append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            samples[name].append(f"{name}_count{_format_labels(labels)} {count}")
+
+        lines = []
+        for name, metric_samples in samples.items():
+            if not metric_samples:
+                continue
+            lines.append(f"# HELP {name} {help_texts[name]}")
+            lines.append(f"# TYPE {name} {types[name]}")
+            lines.extend(metric_samples)
+
+        return '\n'.join(lines) + '\n'
+
+
+# The registry for this process. The server and each kernel (agent) have
+# their own; the agent's metrics are reported to the server over the comm.
+REGISTRY = MetricsRegistry()
+
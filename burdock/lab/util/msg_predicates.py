@@ -21,9 +21,22 @@ def filter_stderr(msg: Message) -> bool:
         return False
 
 
+def filter_error(msg: Message) -> bool:
+    return msg.header.msg_type == 'error'
+
+
 def on_execution_idle(msg: Message) -> bool:
     try:
         return msg.header.msg_type == 'status' \
                and msg.content['execution_state'] == 'idle'
     except KeyError:
         return False
+
+
+def has_metrics_report(msg: Message) -> bool:
+    return msg.header.msg_type == 'comm_msg' \
+           and 'burdock_metrics' in msg.metadata
+
+
+def filter_status(msg: Message) -> bool:
+    return msg.header.msg_type == 'status'
@@ -0,0 +1,79 @@
+import base64
+import cProfile
+import io
+import marshal
+import pstats
+import tracemalloc
+from typing import Optional
+
+from burdock.lab.util.memory import TracedPeak
+
+
+class ProfileCapture:
+    """
+    Profiles the body of a with statement with cProfile, and traces its
+    allocations with tracemalloc:
+
+        with ProfileCapture() as capture:
+            ...
+        report = capture.report()
+
+    Both add considerable overhead, so this is only meant for one-off
+    diagnosis of a single slow operation.
+    """
+    frames: int
+
+    _profiler: cProfile.Profile
+    _started_tracing: bool
+    _snapshot: Optional[tracemalloc.Snapshot]
+    _peak: TracedPeak
+
+    def __init__(self, frames: int = 1):
+        self.frames = frames
+        self._profiler = cProfile.Profile()
+        self._started_tracing = False
+        self._snapshot = None
+        self._peak = TracedPeak()
+
+    def __enter__(self) -> 'ProfileCapture':
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracing = True
+        self._peak.__enter__()
+        self._profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._profiler.disable()
+
+        self._peak.__exit__(exc_type, exc_val, exc_tb)
+        self._snapshot = tracemalloc.take_snapshot()
+        if self._started_tracing:
+            tracemalloc.stop()
+
+    def report(self, top: int = 25) -> dict:
+        """A JSON-safe report of the capture. The pstats data is the same as
+           Profile.dump_stats would write, base64-encoded, so it can be saved
+           to a file and loaded with pstats.Stats (or snakeviz, etc.)."""
+        stats = pstats.Stats(self._profiler)
+
+        summary = io.StringIO()
+        pstats.Stats(self._profiler, stream=summary).sort_stats('cumulative').print_stats(top)
+
+        allocations = []
+        if self._snapshot is not None:
+            for statistic in self._snapshot.statistics('lineno')[:top]:
+                frame = statistic.traceback[0]
+                allocations.append({
+                    'file': frame.filename,
+                    'line': frame.lineno,
+                    'size': statistic.size,
+                    'count': statistic.count,
+                })
+
+        return {
+            'pstats': base64.b64encode(marshal.dumps(stats.stats)).decode('ascii'),
+            'summary': summary.getvalue(),
+            'top_allocations': allocations,
+            'peak_traced_bytes': self._peak.bytes,
+        }
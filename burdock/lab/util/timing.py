@@ -0,0 +1,70 @@
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from burdock.lab.util.memory import TracedPeak
+from burdock.lab.util.metrics import MetricsRegistry
+
+
+@dataclass
+class StageRecord:
+    """Wall time (and, if tracemalloc is tracing, peak traced memory)
+       accumulated over every run of a single named stage."""
+    wall: float = 0.0
+    calls: int = 0
+    peak_bytes: Optional[int] = None
+
+
+@dataclass
+class StageTimer:
+    """
+    Records how long each named stage of a pipeline takes. Stages may be
+    entered several times (their times accumulate), and are reported in
+    the order they were first entered.
+
+    Peak memory per stage is only recorded while tracemalloc is tracing
+    (see TracedPeak), and does not hide the peak from any measurement
+    enclosing the stage.
+
+    If a registry is given, each run of a stage is also observed into its
+    burdock_analysis_stage_seconds histogram.
+    """
+    stages: Dict[str, StageRecord] = field(default_factory=OrderedDict)
+    registry: Optional[MetricsRegistry] = None
+
+    @contextmanager
+    def stage(self, name: str):
+        record = self.stages.setdefault(name, StageRecord())
+
+        peak = TracedPeak()
+        start = time.perf_counter()
+        try:
+            with peak:
+                yield record
+        finally:
+            elapsed = time.perf_counter() - start
+            record.wall += elapsed
+            record.calls += 1
+
+            if self.registry is not None:
+                self.registry.observe('burdock_analysis_stage_seconds', elapsed,
+                                      'Time spent in each stage of an analysis.', stage=name)
+
+            if peak.bytes is not None:
+                record.peak_bytes = max(record.peak_bytes or 0, peak.bytes)
+
+    @property
+    def total(self) -> float:
+        return sum(record.wall for record in self.stages.values())
+
+    def as_dict(self) -> Dict[str, dict]:
+        return {
+            name: {
+                'wall': record.wall,
+                'calls': record.calls,
+                'peak_bytes': record.peak_bytes
+            }
+            for name, record in self.stages.items()
+        }
@@ -9,6 +9,12 @@ import IRequest = BurdockInspectionHandler.IRequest;
 
 const TARGET_NAME = 'burdocklab_target';
 
+/**
+ * Milliseconds an inspection waits for a busy kernel to become idle before
+ * it is given up on (as the server's own requests do, see BUSY_TIMEOUT).
+ */
+const BUSY_TIMEOUT = 5000;
+
 export class BurdockConnector extends DataConnector<IReply, void, IRequest> {
     private _id: string;
     private _session: IClientSession;
@@ -36,12 +42,46 @@ export class BurdockConnector extends DataConnector<IReply, void, IRequest> {
         return comm;
     }
 
+    /**
+     * Resolves once the kernel is not busy, with whether it became idle in
+     * time. Otherwise, an inspection would be queued behind the running cell.
+     */
+    whenIdle(timeout: number = BUSY_TIMEOUT): Promise<boolean> {
+        const session = this._session;
+        if (session.status !== 'busy') {
+            return Promise.resolve(true);
+        }
+
+        return new Promise<boolean>(resolve => {
+            let timer = 0;
+            const done = (idle: boolean) => {
+                window.clearTimeout(timer);
+                session.statusChanged.disconnect(onStatus);
+                resolve(idle);
+            };
+            const onStatus = (_: IClientSession, status: Kernel.Status) => {
+                if (status !== 'busy') done(true);
+            };
+
+            session.statusChanged.connect(onStatus);
+            timer = window.setTimeout(() => done(false), timeout);
+        });
+    }
+
+    /** Inspects, or resolves with undefined if the kernel stayed busy. */
     async fetch(request: IRequest): Promise<IReply | undefined> {
+        if (!(await this.whenIdle())) {
+            return undefined;
+        }
+
         const comm = await this.ensureComm();
 
+        // Filters and pagination (columns, kinds, min_confidence, limit, cursor) are passed as they are.
+        const {text, offset, ...options} = request;
         const data: KernelMessage.ICommMsgMsg['content']['data'] = {
-            code: request.text,
-            cursor_pos: request.offset
+            ...options,
+            code: text,
+            cursor_pos: offset
         };
 
         return new Promise<IReply | undefined>((resolve, reject) => {
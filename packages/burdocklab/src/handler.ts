@@ -16,12 +16,16 @@ import {
 import { CodeEditor } from "@jupyterlab/codeeditor";
 
 import { IBurdockInspector } from "./tokens";
+import { BurdockInvariants, BurdockInvariantsWidget } from "./invariants";
 import { ReadonlyJSONObject } from "@phosphor/coreutils";
 import IInspectable = IBurdockInspector.IInspectable;
 import IUpdate = IBurdockInspector.IUpdate;
 
 const DEBOUNCER_LIMIT = 250;
 
+/** The number of invariants asked for at a time. */
+const PAGE_SIZE = 50;
+
 export class BurdockInspectionHandler implements IDisposable, IInspectable {
     private _cleared: Signal<this, void> = new Signal<this, void>(this);
     private _disposed: Signal<this, void> = new Signal<this, void>(this);
@@ -111,21 +115,28 @@ export class BurdockInspectionHandler implements IDisposable, IInspectable {
         const pending = ++this._pending;
 
         try {
-            const reply = await this._connector.fetch({offset, text});
+            const reply = await this._connector.fetch({offset, text, limit: PAGE_SIZE});
 
-            // If handler has been disposed or a newer request is pending, bail.
-            if (this.isDisposed || pending !== this._pending) {
+            // If handler has been disposed, a newer request is pending, or the
+            // kernel stayed busy, bail.
+            if (this.isDisposed || pending !== this._pending || !reply) {
                 this._inspected.emit(update);
                 return;
             }
 
             console.log("REPLY: ", JSON.stringify(reply));
             const {data} = reply;
+            const page = BurdockInvariants.decodePage(data);
             const mimeType = this._rendermime.preferredMimeType(data);
 
             console.log("MIMETYPE: ", mimeType);
 
-            if (mimeType) {
+            if (page) {
+                update.content = new BurdockInvariantsWidget({
+                    page,
+                    loadMore: (cursor: string) => this._fetchPage(text, offset, cursor)
+                });
+            } else if (mimeType) {
                 const widget = this._rendermime.createRenderer(mimeType);
                 const model = new MimeModel({data});
 
@@ -141,6 +152,12 @@ export class BurdockInspectionHandler implements IDisposable, IInspectable {
         }
     }
 
+    /** The page of invariants at cursor, or null if the kernel no longer has it. */
+    private async _fetchPage(text: string, offset: number, cursor: string): Promise<BurdockInvariants.IPage | null> {
+        const reply = await this._connector.fetch({offset, text, limit: PAGE_SIZE, cursor});
+        return reply ? BurdockInvariants.decodePage(reply.data) : null;
+    }
+
     private _onChange(): void {
         void this._debouncer.invoke();
     }
@@ -179,5 +196,20 @@ export namespace BurdockInspectionHandler {
 
         /** The text being inspected. */
         text: string;
+
+        /** Only invariants mentioning any of these columns. */
+        columns?: string[];
+
+        /** Only invariants of these kinds (e.g. 'bounds', 'comparison'). */
+        kinds?: string[];
+
+        /** Only invariants with at least this confidence. */
+        min_confidence?: number;
+
+        /** The number of invariants per page. */
+        limit?: number;
+
+        /** The `next_cursor` of a previous reply, to get the page after it. */
+        cursor?: string;
     }
 }
\ No newline at end of file
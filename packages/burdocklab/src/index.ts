@@ -2,4 +2,5 @@ export * from './connector';
 export * from './commands';
 export * from './handler';
 export * from './inspector';
+export * from './invariants';
 export * from './tokens';
\ No newline at end of file
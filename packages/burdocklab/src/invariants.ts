@@ -0,0 +1,140 @@
+import { Widget } from "@phosphor/widgets";
+import { ReadonlyJSONObject } from "@phosphor/coreutils";
+
+const WIDGET_CLASS = 'jp-BurdockInvariants';
+const SUMMARY_CLASS = 'jp-BurdockInvariants-summary';
+const TABLE_CLASS = 'jp-BurdockInvariants-table';
+const MORE_CLASS = 'jp-BurdockInvariants-more';
+
+/**
+ * A table of a dataframe's invariants, a page at a time. Further pages are
+ * appended (by the `next_cursor` of the last one) when "Load more" is clicked.
+ */
+export class BurdockInvariantsWidget extends Widget {
+    private _cursor: string | null = null;
+    private _shown: number = 0;
+    private _total: number = 0;
+    private readonly _loadMore: (cursor: string) => Promise<BurdockInvariants.IPage | null>;
+    private readonly _summary: HTMLParagraphElement;
+    private readonly _body: HTMLTableSectionElement;
+    private readonly _more: HTMLButtonElement;
+
+    constructor(options: BurdockInvariantsWidget.IOptions) {
+        super();
+        this.addClass(WIDGET_CLASS);
+        this._loadMore = options.loadMore;
+
+        this._summary = document.createElement('p');
+        this._summary.className = SUMMARY_CLASS;
+
+        const table = document.createElement('table');
+        table.className = TABLE_CLASS;
+        const header = table.createTHead().insertRow();
+        for (const title of ['Invariant', 'Kind', 'Columns', 'Confidence']) {
+            const cell = document.createElement('th');
+            cell.textContent = title;
+            header.appendChild(cell);
+        }
+        this._body = table.createTBody();
+
+        this._more = document.createElement('button');
+        this._more.className = MORE_CLASS;
+        this._more.textContent = 'Load more';
+        this._more.onclick = () => void this._onMore();
+
+        this.node.appendChild(this._summary);
+        this.node.appendChild(table);
+        this.node.appendChild(this._more);
+
+        this.appendPage(options.page);
+    }
+
+    appendPage(page: BurdockInvariants.IPage): void {
+        for (const invariant of page.invariants) {
+            const row = this._body.insertRow();
+            row.insertCell().textContent = invariant.text;
+            row.insertCell().textContent = invariant.kind;
+            row.insertCell().textContent = invariant.columns.join(', ');
+            row.insertCell().textContent = `${Math.round(invariant.confidence * 100)}%`;
+        }
+
+        this._shown += page.invariants.length;
+        this._total = page.total;
+        this._cursor = page.next_cursor;
+        this._summary.textContent = `${this._shown} of ${this._total} invariants`;
+        this._more.hidden = this._cursor === null;
+    }
+
+    private async _onMore(): Promise<void> {
+        if (this._cursor === null || this.isDisposed) return;
+
+        this._more.disabled = true;
+        try {
+            const page = await this._loadMore(this._cursor);
+            if (this.isDisposed) return;
+
+            if (page) {
+                this.appendPage(page);
+            } else {
+                // The kernel no longer has the rest (e.g. it restarted); inspect again to see it.
+                this._cursor = null;
+                this._more.hidden = true;
+                this._summary.textContent = `${this._shown} of ${this._total} invariants (the rest have expired)`;
+            }
+        } finally {
+            this._more.disabled = false;
+        }
+    }
+}
+
+export namespace BurdockInvariantsWidget {
+    export interface IOptions {
+        /** The first page of invariants. */
+        page: BurdockInvariants.IPage;
+
+        /** Gets the page at a cursor, or null if there is none. */
+        loadMore: (cursor: string) => Promise<BurdockInvariants.IPage | null>;
+    }
+}
+
+export namespace BurdockInvariants {
+    /** A single invariant, as decoded from a page. */
+    export interface IInvariant {
+        text: string;
+        kind: string;
+        columns: string[];
+        confidence: number;
+    }
+
+    /** A page of invariants, and where the next one starts, if there is one. */
+    export interface IPage {
+        invariants: IInvariant[];
+        total: number;
+        next_cursor: string | null;
+    }
+
+    /**
+     * Decodes the page of invariants in an inspection reply's MIME bundle,
+     * which lists every invariant's text, kind, column ids and confidence
+     * column-wise, with the names of the kinds and columns listed once.
+     * Returns null if the reply has no page (e.g. it is not of a dataframe).
+     */
+    export function decodePage(data: ReadonlyJSONObject): IPage | null {
+        const json = data['application/json'] as any;
+        if (!json || !json.is_dataframe || !json.invariants) return null;
+
+        const {columns, kinds, text, kind, column_ids, confidence} = json.invariants;
+        const invariants = (text as string[]).map((invariantText: string, i: number) => ({
+            text: invariantText,
+            kind: kinds[kind[i]] as string,
+            columns: (column_ids[i] as number[]).map((id: number) => columns[id] as string),
+            confidence: confidence[i] as number
+        }));
+
+        return {
+            invariants,
+            total: json.total as number,
+            next_cursor: (json.next_cursor as string | null) || null
+        };
+    }
+}
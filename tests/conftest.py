@@ -0,0 +1,27 @@
+import pytest
+from jupyter_client.threaded import IOLoopThread
+
+from burdock.lab.kernel.client import BurdockKernelClient
+
+from tests.fakes import FakeKernelClient
+
+
+@pytest.fixture
+def loop_thread():
+    thread = IOLoopThread()
+    thread.start()
+    yield thread
+    thread.stop()
+
+
+@pytest.fixture
+def clients(loop_thread, monkeypatch):
+    """Every kernel client created by a BurdockManager, which are fakes."""
+    clients = []
+
+    def create(km, **kwargs):
+        clients.append(FakeKernelClient(loop_thread))
+        return clients[-1]
+
+    monkeypatch.setattr(BurdockKernelClient, 'create', staticmethod(create))
+    return clients
@@ -0,0 +1,132 @@
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence
+
+import zmq
+from jupyter_client.session import Session, new_id
+from jupyter_client.threaded import IOLoopThread
+
+from burdock.lab.kernel.message import Message
+from burdock.lab.util.channels import AsyncChannel
+
+
+def message(msg_type: str, content: dict, parent_id: Optional[str] = None, parent_type: str = 'execute_request',
+            session: str = 'frontend', buffers: Sequence = ()) -> Message:
+    """A message from the kernel, in reply to parent_id (sent by session)."""
+    def header(msg_id, msg_type, session):
+        return {'msg_id': msg_id, 'msg_type': msg_type, 'username': 'user', 'session': session,
+                'date': datetime.now(timezone.utc), 'version': '5.3'}
+
+    return Message({'header': header(new_id(), msg_type, 'kernel'),
+                    'parent_header': header(parent_id, parent_type, session) if parent_id else {},
+                    'content': content,
+                    'buffers': [memoryview(bytes(buffer)) for buffer in buffers]})
+
+
+def execute_result(text: str) -> Message:
+    return message('execute_result', {'data': {'text/plain': text}})
+
+
+def comm_reply(data: dict, buffers: Sequence = ()) -> Message:
+    return message('comm_msg', {'comm_id': 'comm', 'data': data}, buffers=buffers)
+
+
+class FakeKernelManager:
+    def __init__(self):
+        self.restart_callbacks: Dict[str, List[Callable]] = {'restart': [], 'dead': []}
+
+    def add_restart_callback(self, callback, event='restart'):
+        self.restart_callbacks[event].append(callback)
+
+    def remove_restart_callback(self, callback, event='restart'):
+        self.restart_callbacks[event].remove(callback)
+
+
+class FakeMultiKernelManager:
+    kernel_spec_manager = None
+    default_kernel_name = 'python3'
+
+    def __init__(self, *kernel_ids: str):
+        self.kernels = {kernel_id: FakeKernelManager() for kernel_id in kernel_ids}
+
+    def __contains__(self, kernel_id):
+        return kernel_id in self.kernels
+
+    def get_kernel(self, kernel_id) -> FakeKernelManager:
+        return self.kernels[kernel_id]
+
+    def shutdown_kernel(self, kernel_id, now=False, restart=False):
+        if not restart:
+            del self.kernels[kernel_id]
+
+    def restart_kernel(self, kernel_id, now=False):
+        pass
+
+
+class FakeKernelClient:
+    """
+    Stands in for BurdockKernelClient, over real (but unconnected)
+    channels. Executions and comm requests are recorded, and answered by
+    on_execute(code) and on_comm(data), which return the reply, or None to
+    hold the request until it is released, or the channels are cleared.
+    """
+    def __init__(self, loop_thread: IOLoopThread):
+        self.session = Session()
+        context = zmq.Context.instance()
+        self.shell_channel = AsyncChannel(context.socket(zmq.DEALER), self.session, loop_thread.ioloop)
+        self.iopub_channel = AsyncChannel(context.socket(zmq.SUB), self.session, loop_thread.ioloop)
+        self.stdin_channel = AsyncChannel(context.socket(zmq.DEALER), self.session, loop_thread.ioloop)
+
+        self.on_execute: Callable[[str], Optional[Message]] = lambda code: execute_result(repr(code))
+        self.on_comm: Callable[[dict], Optional[Message]] = lambda data: comm_reply({'status': 'ok', 'found': False})
+        self.executed: List[str] = []
+        self.comm_requests: List[dict] = []
+        self.opened_comms: List[str] = []
+        self.closed_comms: List[str] = []
+        self.channels_running = False
+        self._held: List[str] = []
+
+    def start_channels(self):
+        self.channels_running = True
+
+    def stop_channels(self):
+        self.channels_running = False
+        for channel in (self.shell_channel, self.iopub_channel, self.stdin_channel):
+            channel.close()
+
+    def _make_url(self, channel):
+        # Nothing answers, so heartbeats are missed (if any are sent).
+        return 'tcp://127.0.0.1:9'
+
+    async def _reply(self, reply: Optional[Message]) -> Message:
+        if reply is not None:
+            return reply
+        msg_id = new_id()
+        self._held.append(msg_id)
+        return await self.iopub_channel.register_future(msg_id, lambda msg: True)
+
+    def release(self, reply: Message):
+        """Answers every held request with reply, as if it came from iopub."""
+        held, self._held = self._held, []
+        for msg_id in held:
+            self.iopub_channel.call_handlers({**reply.raw, 'parent_header': {**reply.raw['header'], 'msg_id': msg_id}})
+
+    def status(self, state: str, parent_id: str, session: str = 'frontend'):
+        """Delivers a status message, as the kernel sends for every request."""
+        self.iopub_channel.call_handlers(message('status', {'execution_state': state}, parent_id,
+                                                 session=session).raw)
+
+    async def execute_retval(self, code) -> Message:
+        self.executed.append(code)
+        return await self._reply(self.on_execute(code))
+
+    def comm_open(self, target_name: str, data: Optional[dict] = None) -> str:
+        comm_id = new_id()
+        self.opened_comms.append(comm_id)
+        return comm_id
+
+    def comm_close(self, comm_id: str, data: Optional[dict] = None):
+        self.closed_comms.append(comm_id)
+
+    async def comm_request(self, comm_id: str, data: dict) -> Message:
+        self.comm_requests.append(data)
+        return await self._reply(self.on_comm(data))
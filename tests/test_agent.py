@@ -0,0 +1,38 @@
+import pytest
+from IPython import InteractiveShell
+
+from burdock.lab.agent import LOADED_ATTRIBUTES, BurdockAgent
+
+
+@pytest.fixture
+def agent():
+    return BurdockAgent(InteractiveShell.instance(), install=False)
+
+
+def test_analysis_state_is_loaded_when_first_read(agent):
+    assert not agent._loaded
+    assert not any(name in agent.__dict__ for name in LOADED_ATTRIBUTES)
+
+    assert agent.layouts is not None
+    assert agent._loaded
+    assert all(name in agent.__dict__ for name in LOADED_ATTRIBUTES)
+
+
+def test_settings_made_before_loading_are_kept(agent):
+    agent.chunk_rows = 10
+
+    agent.load()
+
+    assert agent.chunk_rows == 10
+    assert agent.windows is not None
+
+
+def test_prewarm_loads_in_the_background(agent):
+    agent.prewarm().join()
+
+    assert agent._loaded
+
+
+def test_other_missing_attributes(agent):
+    with pytest.raises(AttributeError):
+        agent.nonexistent
@@ -0,0 +1,15 @@
+from burdock.lab.bench.frames import DEFAULT_COLUMNS, DEFAULT_MAX_CELLS, DEFAULT_ROWS, synthetic_cases
+
+
+def test_default_cases_cover_every_row_count():
+    cases = synthetic_cases(DEFAULT_ROWS, DEFAULT_COLUMNS, DEFAULT_MAX_CELLS)
+
+    assert {case.rows for case in cases} == set(DEFAULT_ROWS)
+
+
+def test_skipped_cases_are_logged():
+    logged = []
+    cases = synthetic_cases([10, 1000], [5, 50], max_cells=10_000, log=logged.append)
+
+    assert [case.name for case in cases] == ['synthetic_10x5', 'synthetic_10x50', 'synthetic_1000x5']
+    assert len(logged) == 1 and 'synthetic_1000x50' in logged[0]
@@ -0,0 +1,12 @@
+from burdock.lab.bench.frames import FrameCase, synthetic_frame
+from burdock.lab.bench.inspection import InspectionBenchmark
+
+
+def test_case_peak_covers_every_stage():
+    case = FrameCase('synthetic_2000x5', 'synthetic', 2000, 5, lambda: synthetic_frame(2000, 5))
+
+    result = InspectionBenchmark(repeat=1, skip_daikon=True).run_case(case)
+    stage_peaks = [stage['peak_bytes'] for stage in result['stages'].values()]
+
+    assert all(peak is not None for peak in stage_peaks)
+    assert result['peak_bytes'] >= max(stage_peaks) > 0
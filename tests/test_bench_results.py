@@ -0,0 +1,32 @@
+from burdock.lab.bench.results import compare_results
+
+MB = 1024 * 1024
+
+
+def _results(wall, peak_bytes, **stages):
+    return {'cases': [{'name': 'case', 'wall': wall, 'peak_bytes': peak_bytes,
+                       'stages': {stage: {'wall': stage_wall, 'peak_bytes': None}
+                                  for stage, stage_wall in stages.items()}}]}
+
+
+def test_changes_beyond_the_threshold():
+    regressions, improvements = compare_results(_results(1.0, 10 * MB, run_daikon=0.5),
+                                                _results(1.5, 5 * MB, run_daikon=0.52))
+
+    assert [(change.stage, change.metric) for change in regressions] == [('total', 'wall')]
+    assert [(change.stage, change.metric) for change in improvements] == [('total', 'peak_bytes')]
+
+
+def test_small_changes_are_noise():
+    regressions, improvements = compare_results(_results(0.001, 0, match=0.001),
+                                                _results(0.004, MB // 2, match=0.004))
+
+    assert regressions == improvements == []
+
+
+def test_unmatched_cases_and_stages_are_skipped():
+    base = _results(1.0, 0, match=1.0)
+    new = _results(1.0, 0, expand=9.0)
+    new['cases'].append({'name': 'other', 'wall': 9.0, 'peak_bytes': 0, 'stages': {}})
+
+    assert compare_results(base, new) == ([], [])
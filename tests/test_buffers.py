@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from burdock.lab.analysis.catalog import StructuredInvariant, encode_invariants
+from burdock.lab.kernel.buffers import pack_arrays, pack_invariants, pack_strings, unpack_arrays, \
+    unpack_invariants, unpack_strings
+
+
+def _received(buffers):
+    # As the server receives them: memoryviews onto the message's frames.
+    return [memoryview(bytes(buffer)) for buffer in buffers]
+
+
+def test_arrays_round_trip_without_copying():
+    arrays = {'mean': np.array([1.5, np.nan]), 'shape': np.arange(6, dtype=np.int32).reshape(2, 3),
+              'empty': np.array([], dtype=np.float32)}
+    buffers = []
+    specs = pack_arrays(arrays, buffers)
+
+    assert specs['shape'] == {'buffer': 1, 'dtype': '<i4', 'shape': [2, 3]}
+
+    unpacked = unpack_arrays(specs, _received(buffers))
+    for name, array in arrays.items():
+        np.testing.assert_array_equal(unpacked[name], array)
+        assert unpacked[name].dtype == array.dtype
+    assert not unpacked['mean'].flags.owndata
+    assert not unpacked['mean'].flags.writeable
+
+
+def test_object_arrays_are_refused():
+    with pytest.raises(TypeError):
+        pack_arrays({'names': np.array(['a', None], dtype=object)}, [])
+
+
+def test_strings_round_trip():
+    strings = ['hp >= 0', '', 'name one of { "é", "ü" }']
+
+    assert unpack_strings(*pack_strings(strings)) == strings
+
+
+def test_invariants_round_trip():
+    invariants = [
+        StructuredInvariant('hp >= 0', 'bounds', ('hp',), 1.0),
+        StructuredInvariant('hp_max >= hp', 'comparison', ('hp', 'hp_max'), 0.75),
+        StructuredInvariant('size == 4', 'one_of', (), 1.0),
+    ]
+    buffers = []
+    packed = pack_invariants(invariants, buffers)
+    unpacked = unpack_invariants(packed, _received(buffers))
+    expected = encode_invariants(invariants)
+
+    assert packed['count'] == 3
+    assert unpacked['columns'] == expected['columns']
+    assert unpacked['kinds'] == expected['kinds']
+    assert unpacked['text'] == expected['text']
+    assert unpacked['kind'].tolist() == expected['kind']
+    assert [ids.tolist() for ids in unpacked['column_ids']] == expected['column_ids']
+    assert unpacked['confidence'].tolist() == expected['confidence']
+
+
+def test_no_invariants():
+    buffers = []
+    unpacked = unpack_invariants(pack_invariants([], buffers), _received(buffers))
+
+    assert unpacked['text'] == []
+    assert unpacked['column_ids'] == []
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from burdock.lab.analysis.catalog import InvariantFilter, InvariantPages, encode_invariants, structure_invariants
+
+
+@pytest.fixture
+def structured():
+    df = pd.DataFrame({'hp': [1, 2, np.nan, 4], 'hp_max': [10, 10, 10, 10], 'mp': [0, 1, 2, 3]})
+    by_columns = {
+        frozenset({'hp'}): ['hp >= 1'],
+        frozenset({'hp_max', 'hp'}): ['hp_max >= hp'],
+        frozenset({'mp'}): ['mp >= 0', 'mp % 1 == 0'],
+        frozenset(): ['size == 4'],
+    }
+    return structure_invariants(by_columns, df)
+
+
+def test_structure(structured):
+    assert [(invariant.kind, invariant.columns, invariant.confidence) for invariant in structured] == [
+        ('bounds', ('hp',), 0.75),
+        ('comparison', ('hp', 'hp_max'), 0.75),
+        ('bounds', ('mp',), 1.0),
+        ('modulus', ('mp',), 1.0),
+        ('one_of', (), 1.0),
+    ]
+
+
+def test_filter(structured):
+    def texts(invariant_filter):
+        return [invariant.text for invariant in invariant_filter.apply(structured)]
+
+    assert texts(InvariantFilter.create(columns=['hp_max'])) == ['hp_max >= hp']
+    assert texts(InvariantFilter.create(kinds=['bounds'])) == ['hp >= 1', 'mp >= 0']
+    assert texts(InvariantFilter.create(min_confidence=0.9)) == ['mp >= 0', 'mp % 1 == 0', 'size == 4']
+    assert len(texts(InvariantFilter.create())) == 5
+
+    with pytest.raises(KeyError):
+        InvariantFilter.create(kinds=['cubic'])
+
+
+def test_encode(structured):
+    encoded = encode_invariants(structured[:2])
+
+    assert encoded == {
+        'columns': ['hp', 'hp_max'],
+        'kinds': ['bounds', 'comparison'],
+        'text': ['hp >= 1', 'hp_max >= hp'],
+        'kind': [0, 1],
+        'column_ids': [[0], [0, 1]],
+        'confidence': [0.75, 0.75],
+    }
+
+
+def test_pages(structured):
+    pages = InvariantPages()
+
+    first = pages.first(structured, limit=2)
+    assert (first.total, len(first.invariants)) == (5, 2)
+
+    second = pages.page(first.next_cursor, limit=2)
+    last = pages.page(second.next_cursor, limit=2)
+    assert first.invariants + second.invariants + last.invariants == structured
+    assert last.next_cursor is None
+
+    # Pages can be asked for again, e.g. by another client.
+    assert pages.page(first.next_cursor, limit=3).invariants == structured[2:]
+
+
+def test_single_page_is_not_kept(structured):
+    pages = InvariantPages()
+
+    page = pages.first(structured)
+    assert page.next_cursor is None
+    assert not pages._results
+
+
+@pytest.mark.parametrize('cursor', ['nonsense', 'abc:', 'abc:x'])
+def test_unknown_cursors(structured, cursor):
+    with pytest.raises(KeyError):
+        InvariantPages().page(cursor)
+
+
+def test_evicted_cursors(structured):
+    pages = InvariantPages(maxsize=1)
+    first = pages.first(structured, limit=1)
+    pages.first(structured, limit=1)
+
+    with pytest.raises(KeyError):
+        pages.page(first.next_cursor)
@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+import zmq
+from jupyter_client.session import Session
+from jupyter_client.threaded import IOLoopThread
+
+from burdock.lab.errors.kernel import KernelLost
+from burdock.lab.util.channels import AsyncChannel
+
+
+@pytest.fixture
+def channel():
+    thread = IOLoopThread()
+    thread.start()
+    socket = zmq.Context.instance().socket(zmq.SUB)
+    channel = AsyncChannel(socket, Session(), thread.ioloop)
+    yield channel
+    channel.close()
+    thread.stop()
+
+
+def test_clearing_releases_everything_waiting(channel):
+    async def clear():
+        event = channel.register_event('a', lambda msg: True)
+        future = channel.register_future('a', lambda msg: True)
+        queue = channel.register_queue('b', lambda msg: True, lambda msg: False)
+
+        channel.clear_registrations(KernelLost('k', 'shutdown'))
+
+        assert event.is_set()
+        assert isinstance(future.exception(), KernelLost)
+        assert await queue.get() is queue.sentinel
+
+    asyncio.run(clear())
+
+    assert channel.registration_counts() == {'events': 0, 'futures': 0, 'queues': 0, 'listeners': 0}
+
+
+def test_listeners_can_be_kept(channel):
+    channel.register_listener(lambda msg: True, lambda msg: None)
+
+    channel.clear_registrations(KernelLost('k', 'restart'), listeners=False)
+
+    assert channel.registration_counts()['listeners'] == 1
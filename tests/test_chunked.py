@@ -0,0 +1,81 @@
+import io
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+from burdock.expander.common import statistics_expander
+from burdock.matcher.common import numeric_matcher
+
+from burdock.lab.analysis.chunked import ChunkedTraceWriter
+from burdock.lab.analysis.layout import LayoutCache
+from burdock.lab.util.memory import TracedPeak
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({'hp': rng.integers(0, 100, 1000), 'mp': rng.normal(size=1000)})
+
+
+def _layout(df):
+    return LayoutCache().get('df', df, [numeric_matcher], [statistics_expander])
+
+
+def test_trace_matches_the_whole_frame(df):
+    layout = _layout(df)
+    expected = io.StringIO()
+    layout.write_dtrace(expected, df, layout.expand(df))
+
+    writer = ChunkedTraceWriter(layout, df, chunk_rows=300)
+    out = io.StringIO()
+    writer.write_dtrace(out)
+
+    assert out.getvalue() == expected.getvalue()
+    assert (writer.rows, writer.chunks) == (1000, 4)
+
+
+def test_constants_include_quantiles(df):
+    layout = _layout(df)
+    whole = {var.name: var.constant_value for var in layout.expand(df).constants}
+
+    writer = ChunkedTraceWriter(layout, df, chunk_rows=300)
+    writer.write_dtrace(io.StringIO())
+    chunked = {var.name: var.constant_value for var in writer.expansion.constants}
+
+    assert list(chunked) == list(whole)
+    assert 'hp_50%' in chunked
+    assert chunked == pytest.approx(whole)
+
+
+def test_peak_memory_covers_every_block(df, monkeypatch):
+    blocks = []
+    expand_block = ChunkedTraceWriter._expand_block
+
+    def expand_last_block_expensively(self, block):
+        blocks.append(block)
+        if len(blocks) == 4:
+            large = bytearray(10_000_000)
+            del large
+        return expand_block(self, block)
+
+    monkeypatch.setattr(ChunkedTraceWriter, '_expand_block', expand_last_block_expensively)
+    writer = ChunkedTraceWriter(_layout(df), df, chunk_rows=300)
+    tracemalloc.start()
+    try:
+        with TracedPeak() as peak:
+            writer.write_dtrace(io.StringIO())
+    finally:
+        tracemalloc.stop()
+
+    assert len(blocks) == 4
+    assert writer.stats()['peak_bytes'] >= 10_000_000
+    assert peak.bytes >= 10_000_000
+
+
+def test_memory_is_only_measured_while_tracing(df):
+    writer = ChunkedTraceWriter(_layout(df), df, chunk_rows=300)
+    writer.write_dtrace(io.StringIO())
+
+    assert not tracemalloc.is_tracing()
+    assert writer.stats()['peak_bytes'] is None
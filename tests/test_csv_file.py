@@ -0,0 +1,120 @@
+import os
+
+import pytest
+
+from burdock.core import DaikonType
+
+from burdock.lab.analysis.csv_file import CsvFileAnalyzer, CsvFormatError
+
+
+@pytest.fixture
+def analyzer(tmp_path, monkeypatch):
+    # Only tracing is tested here, so Daikon is never run.
+    monkeypatch.setattr(CsvFileAnalyzer, '_run_daikon', staticmethod(lambda analysis: None))
+    return CsvFileAnalyzer(chunk_bytes=16, workdir=str(tmp_path / 'work'))
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path):
+    (tmp_path / 'work').mkdir()
+
+
+def _write(tmp_path, name, data: bytes) -> str:
+    file_path = tmp_path / name
+    file_path.write_bytes(data)
+    return str(file_path)
+
+
+def _generated(tmp_path):
+    return sorted(p.name for p in (tmp_path / 'work').iterdir())
+
+
+def test_traces_every_chunk(tmp_path, analyzer):
+    file_path = _write(tmp_path, 'hp.csv', b'hp,hp_max\n' + b''.join(b'%d,%d\n' % (i, i + 10) for i in range(20)))
+
+    model = analyzer.analyze(file_path)
+
+    assert model['status'] == 'analyzed'
+    assert model['rows'] == 20
+    assert model['columns'] == ['hp', 'hp_max']
+    assert analyzer.analyze(file_path)['status'] == 'cached'
+
+
+def test_appended_rows_are_traced_alone(tmp_path, analyzer):
+    file_path = _write(tmp_path, 'hp.csv', b'hp\n1\n2\n')
+    analyzer.analyze(file_path)
+
+    with open(file_path, 'ab') as f:
+        f.write(b'3\n4\n5\n')
+    model = analyzer.analyze(file_path)
+
+    assert (model['status'], model['rows'], model['new_rows']) == ('appended', 5, 3)
+
+
+@pytest.mark.parametrize('data', [
+    b'',
+    b'hp,hp_max\n',
+    b'hp,hp_max',
+    b'\xff\xfe\x00h\x00p\n\x001\n',
+    b'hp\n1\n2\n"3\n',
+], ids=['empty', 'header only', 'header without newline', 'bad encoding', 'unterminated quote'])
+def test_rejects_bad_files(tmp_path, analyzer, data):
+    file_path = _write(tmp_path, 'bad.csv', data)
+
+    with pytest.raises(CsvFormatError):
+        analyzer.analyze(file_path)
+    assert _generated(tmp_path) == []
+
+
+def test_missing_values_in_later_chunk_make_integers_floats(tmp_path, analyzer):
+    file_path = _write(tmp_path, 'hp.csv', b'hp,name\n1,a\n2,b\n3,c\n4,d\n5,e\n,f\n7,g\n')
+
+    model = analyzer.analyze(file_path)
+    analysis = analyzer._cache[file_path]
+
+    assert model['rows'] == 7
+    assert [var.rep_type for var in analysis.variables] == [DaikonType.float, DaikonType.string]
+    with open(analysis.decls_path) as decls:
+        assert 'variable hp\n        var-kind variable\n        dec-type float\n        rep-type float' in decls.read()
+    assert analysis.statistics['hp'].count == 6
+
+
+def test_strings_in_later_chunk_are_rejected(tmp_path, analyzer):
+    file_path = _write(tmp_path, 'hp.csv', b'hp\n1\n2\n3\n4\n5\n6\n7\n8\nnine\n')
+
+    with pytest.raises(CsvFormatError):
+        analyzer.analyze(file_path)
+    assert _generated(tmp_path) == []
+    assert file_path not in analyzer._cache
+
+
+def test_errors_do_not_name_the_file(tmp_path, analyzer):
+    file_path = _write(tmp_path, 'bad.csv', b'')
+
+    with pytest.raises(CsvFormatError) as e:
+        analyzer.analyze(file_path)
+    assert str(tmp_path) not in str(e.value)
+
+
+def test_least_recently_used_files_are_discarded(tmp_path, analyzer):
+    analyzer.max_files = 2
+    paths = [_write(tmp_path, f'hp{i}.csv', b'hp\n1\n2\n') for i in range(3)]
+
+    analyzer.analyze(paths[0])
+    analyzer.analyze(paths[1])
+    analyzer.analyze(paths[0])
+    analyzer.analyze(paths[2])
+
+    assert list(analyzer._cache) == [paths[0], paths[2]]
+    assert not any(name.startswith('hp1-') for name in _generated(tmp_path))
+    assert len(_generated(tmp_path)) == 4
+
+
+def test_close_removes_its_own_workdir(tmp_path, monkeypatch):
+    monkeypatch.setattr(CsvFileAnalyzer, '_run_daikon', staticmethod(lambda analysis: None))
+    analyzer = CsvFileAnalyzer()
+    analyzer.analyze(_write(tmp_path, 'hp.csv', b'hp\n1\n2\n'))
+
+    analyzer.close()
+
+    assert not os.path.exists(analyzer.workdir)
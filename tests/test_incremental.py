@@ -0,0 +1,148 @@
+import itertools
+import re
+
+import pandas as pd
+import pytest
+from burdock.matcher.common import numeric_matcher
+
+from burdock.lab.analysis import daikon
+from burdock.lab.analysis.daikon import DaikonRun
+from burdock.lab.analysis.incremental import IncrementalAnalyzer
+from burdock.lab.analysis.layout import LayoutCache
+from burdock.lab.analysis.profiles import STANDARD, AnalysisProfile
+from burdock.lab.util.timing import StageTimer
+
+PAIRS = AnalysisProfile('pairs', matchers=(numeric_matcher,), expanders=(), max_arity=2)
+TRIPLES = AnalysisProfile('triples', matchers=(numeric_matcher,), expanders=())
+
+_ppt_re = re.compile(r'^ppt (.+)\.data:::POINT$', re.MULTILINE)
+_variable_re = re.compile(r'^\s+variable (\S+)$', re.MULTILINE)
+
+
+@pytest.fixture
+def runs(monkeypatch):
+    """Stands in for Daikon: each program point gets a bound per variable,
+       an ordering per pair, a sum per triple (unless ternary invariants
+       are disabled), and one invariant mentioning no variable which counts
+       the runs. Returns the program points of each run."""
+    runs = []
+
+    def run_daikon(decls_path, dtrace_path, options=()):
+        with open(decls_path) as f:
+            decls = f.read()
+        ppts = dict()
+        for block in decls.split('\nppt ')[1:]:
+            ppt = _ppt_re.search('ppt ' + block).group(1)
+            ppts[ppt] = _variable_re.findall(block)
+        runs.append(list(ppts))
+
+        lines = []
+        for ppt, variables in ppts.items():
+            lines += ['=' * 75, f'{ppt}.data:::POINT']
+            lines += [f'{var} >= 0' for var in variables]
+            lines += [f'{a} <= {b}' for a, b in itertools.combinations(variables, 2)]
+            if not any('Ternary' in option for option in options):
+                lines += [f'{a} + {b} <= {c}' for a, b, c in itertools.combinations(variables, 3)]
+            lines += [f'run == {len(runs)}']
+        lines.append('Exiting Daikon.')
+        return DaikonRun('\n'.join(lines), 0.0)
+
+    monkeypatch.setattr(daikon, 'run_daikon', run_daikon)
+    return runs
+
+
+def _analyze(analyzer, df, profile):
+    layout = LayoutCache().get('df', df, profile.matchers, profile.expanders)
+    return analyzer.analyze(layout, df, StageTimer(), profile)
+
+
+def _frame(**changes):
+    columns = {name: [i, i + 1, i + 2] for i, name in enumerate('abcde')}
+    columns.update(changes)
+    return pd.DataFrame(columns)
+
+
+def test_unchanged_frame_is_reused(runs):
+    analyzer = IncrementalAnalyzer()
+    first = _analyze(analyzer, _frame(), PAIRS)
+    second = _analyze(analyzer, _frame(), PAIRS)
+
+    assert first.report.mode == 'full'
+    assert second.report.mode == 'reused'
+    assert second.invariants == first.invariants
+    assert len(runs) == 1
+
+
+def test_invariants_are_attributed_to_their_columns(runs):
+    result = _analyze(IncrementalAnalyzer(), _frame(), PAIRS)
+
+    assert result.by_columns[frozenset({'a'})] == ['a >= 0']
+    assert result.by_columns[frozenset({'a', 'b'})] == ['a <= b']
+    assert result.by_columns[frozenset()] == ['run == 1']
+
+
+def test_changed_column_is_related_to_each_untouched_one(runs):
+    analyzer = IncrementalAnalyzer()
+    _analyze(analyzer, _frame(), PAIRS)
+    result = _analyze(analyzer, _frame(b=[9, 9, 9]), PAIRS)
+
+    assert result.report.mode == 'partial'
+    assert result.report.changed_columns == ['b']
+    assert runs[1] == ['df_changed', 'df_u0', 'df_u1', 'df_u2', 'df_u3']
+    assert result.report.reused_invariants == 4 + 6
+    # b's bound, its orderings with a, c, d and e, and the run counter.
+    assert result.report.recomputed_invariants == 1 + 4 + 1
+    # The same invariants as analyzing the changed frame in full (bar the
+    # run counter).
+    full = _analyze(IncrementalAnalyzer(), _frame(b=[9, 9, 9]), PAIRS)
+    assert sorted(result.invariants) == sorted(full.invariants[:-1] + ['run == 2'])
+
+
+def test_invariants_over_no_column_are_recomputed(runs):
+    analyzer = IncrementalAnalyzer()
+    _analyze(analyzer, _frame(), PAIRS)
+    result = _analyze(analyzer, _frame(b=[9, 9, 9]), PAIRS)
+
+    assert result.by_columns[frozenset()] == ['run == 2']
+    assert 'run == 1' not in result.invariants
+
+
+def test_ternary_invariants_relate_a_changed_column_to_each_pair(runs):
+    analyzer = IncrementalAnalyzer()
+    _analyze(analyzer, _frame(), TRIPLES)
+    result = _analyze(analyzer, _frame(b=[9, 9, 9]), TRIPLES)
+
+    assert result.report.mode == 'partial'
+    assert len(runs[1]) == 1 + 6
+    assert 'a + b <= c' in result.by_columns[frozenset({'a', 'b', 'c'})]
+    full = _analyze(IncrementalAnalyzer(), _frame(b=[9, 9, 9]), TRIPLES)
+    assert sorted(result.invariants) == sorted(full.invariants[:-1] + ['run == 2'])
+
+
+def test_edits_under_the_standard_profile_are_partial(runs):
+    analyzer = IncrementalAnalyzer()
+    frame = pd.DataFrame({f'c{i}': [i, i + 1, i + 2] for i in range(6)})
+    _analyze(analyzer, frame, STANDARD)
+    frame['c3'] = [9, 9, 9]
+    result = _analyze(analyzer, frame, STANDARD)
+
+    assert result.report.mode == 'partial'
+    assert result.report.reused_invariants > result.report.recomputed_invariants
+
+
+def test_ternary_frame_is_analyzed_in_full_when_that_is_cheaper(runs):
+    analyzer = IncrementalAnalyzer()
+    _analyze(analyzer, _frame(), TRIPLES)
+    result = _analyze(analyzer, _frame(a=[7, 7, 7], b=[9, 9, 9]), TRIPLES)
+
+    assert result.report.mode == 'full'
+    assert runs[1] == ['df']
+
+
+def test_mostly_changed_frame_is_analyzed_in_full(runs):
+    analyzer = IncrementalAnalyzer()
+    _analyze(analyzer, _frame(), PAIRS)
+    result = _analyze(analyzer, _frame(a=[7, 7, 7], b=[8, 8, 8], c=[9, 9, 9]), PAIRS)
+
+    assert result.report.mode == 'full'
+    assert result.report.reused_invariants == 0
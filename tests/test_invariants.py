@@ -0,0 +1,56 @@
+import pytest
+
+from burdock.lab.analysis.invariants import INVARIANT_KINDS, classify_invariant, parse_ppt_invariants
+
+
+@pytest.mark.parametrize('invariant, kind', [
+    ('hp >= 0', 'bounds'),
+    ('hp <= 100', 'bounds'),
+    ('hp one of { 1, 2, 3 }', 'one_of'),
+    ('hp has only one value', 'one_of'),
+    ('hp == 7', 'one_of'),
+    ('hp != 0', 'nonzero'),
+    ('hp % 2 == 0', 'modulus'),
+    ('hp_max >= hp', 'comparison'),
+    ('hp != mp', 'comparison'),
+    ('hp == mp', 'equality'),
+    ('hp == mp == sp', 'equality'),
+    ('hp_max == 2 * hp + 1', 'linear'),
+    ('hp - 2 * mp + sp == 0', 'ternary'),
+    ('hp == max(mp, sp)', 'ternary'),
+    ('hp_25% <= hp_50%', 'comparison'),
+    ('name == "a == b"', 'one_of'),
+    ('hp >= 0 || mp >= 0', 'other'),
+])
+def test_classify(invariant, kind):
+    assert classify_invariant(invariant) == kind
+    assert kind in INVARIANT_KINDS
+
+
+@pytest.mark.parametrize('invariant, kind', [
+    ('is_alive == true', 'one_of'),
+    ('is_alive != false', 'other'),
+    ('name != null', 'nonzero'),
+    ('name == null', 'one_of'),
+    ('hp == mp == null', 'other'),
+    ('is_alive == is_dead', 'equality'),
+])
+def test_literals_are_not_variables(invariant, kind):
+    assert classify_invariant(invariant) == kind
+
+
+def test_parse_ppt_invariants():
+    stdout = '\n'.join([
+        'Daikon version 5.8.2',
+        '=' * 75,
+        'df_g0.data:::POINT',
+        'hp >= 0',
+        'hp <= mp',
+        '=' * 75,
+        'df_g1.data:::POINT',
+        'sp one of { 1, 2 }',
+        'Exiting Daikon.',
+        'ignored',
+    ])
+
+    assert parse_ppt_invariants(stdout) == {'df_g0': ['hp >= 0', 'hp <= mp'], 'df_g1': ['sp one of { 1, 2 }']}
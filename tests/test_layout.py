@@ -0,0 +1,72 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+from burdock.core import Burdock
+from burdock.expander.common import statistics_expander
+from burdock.matcher.common import numeric_matcher
+
+from burdock.lab.analysis.layout import LayoutCache, schema_key
+
+MATCHERS = [numeric_matcher]
+EXPANDERS = [statistics_expander]
+
+
+def _burdock_dtrace(name, df) -> str:
+    out = io.StringIO()
+    Burdock(name, df).write_dtrace(out)
+    return out.getvalue()
+
+
+def _dtrace(name, df) -> str:
+    layout = LayoutCache().get(name, df, MATCHERS, EXPANDERS)
+    out = io.StringIO()
+    layout.write_dtrace(out, df, layout.expand(df))
+    return out.getvalue()
+
+
+def test_schema_key_ignores_name_and_values():
+    df = pd.DataFrame({'hp': [1, 2], 'name': ['a', 'b']})
+
+    assert schema_key(df, MATCHERS, EXPANDERS) == schema_key(df * 2, MATCHERS, EXPANDERS)
+    assert schema_key(df, MATCHERS, EXPANDERS) != schema_key(df.astype({'hp': float}), MATCHERS, EXPANDERS)
+    assert schema_key(df, MATCHERS, EXPANDERS) != schema_key(df.rename(columns={'hp': 'mp'}), MATCHERS, EXPANDERS)
+
+
+def test_same_schema_under_another_name_hits_the_cache():
+    cache = LayoutCache()
+    monday = pd.DataFrame({'hp': [1, 2, 3]})
+    tuesday = pd.DataFrame({'hp': [4, 5]})
+
+    first = cache.get('monday', monday, MATCHERS, EXPANDERS)
+    first.write_decls(io.StringIO(), first.expand(monday))
+    second = cache.get('tuesday', tuesday, MATCHERS, EXPANDERS)
+
+    assert len(cache) == 1
+    assert (first.name, second.name) == ('monday', 'tuesday')
+    assert second.latent is first.latent
+
+    decls = io.StringIO()
+    second.write_decls(decls, second.expand(tuesday))
+    assert 'ppt tuesday.data:::POINT' in decls.getvalue()
+    assert 'monday' not in decls.getvalue()
+    assert 'constant 4.5' in decls.getvalue()
+
+
+@pytest.mark.parametrize('df', [
+    pd.DataFrame({'hp': [1, 2, 3], 'mp': [0, -1, 7]}),
+    pd.DataFrame({'hp': [1.5, 2.0, np.nan]}),
+    pd.DataFrame({'hp': [1, 2, 3], 'name': ['a', 'b c', 'd'], 'alive': [True, False, True]}),
+], ids=['ints', 'floats', 'mixed with strings'])
+def test_dtrace_matches_burdock(df):
+    assert _dtrace('df', df) == _burdock_dtrace('df', df)
+
+
+def test_dtrace_writes_ints_as_declared_where_burdock_upcasts():
+    df = pd.DataFrame({'hp': [1, 2], 'ratio': [0.5, 0.25]})
+
+    ours, burdocks = _dtrace('df', df), _burdock_dtrace('df', df)
+
+    assert ours != burdocks
+    assert ours == burdocks.replace('hp\n1.0\n', 'hp\n1\n').replace('hp\n2.0\n', 'hp\n2\n')
@@ -0,0 +1,53 @@
+import asyncio
+import os
+
+from burdock.lab.bench.load import LoadBenchmark, LoadScenario, load_scenarios
+
+
+class FakeInstance:
+    def __init__(self):
+        self.profiled = []
+
+    async def profile(self, name):
+        self.profiled.append(name)
+
+
+def _profiled(kind: str):
+    instance = FakeInstance()
+    bench = LoadBenchmark()
+
+    async def clients():
+        await asyncio.gather(*(bench._client(instance, kind, client, 2, [], {}) for client in range(3)))
+
+    asyncio.run(clients())
+    return sorted(instance.profiled)
+
+
+def test_profile_clients_do_not_share_a_dataframe():
+    assert _profiled('profile') == ['df0', 'df0', 'df1', 'df1', 'df2', 'df2']
+
+
+def test_coalesced_profile_clients_do():
+    assert _profiled('profile_coalesced') == ['df'] * 6
+
+
+def test_scenario_names():
+    scenarios = load_scenarios([1, 4], [8], 100, 'profile_coalesced')
+
+    assert [scenario.name for scenario in scenarios] == ['load/profile_coalesced/1x8', 'load/profile_coalesced/4x8']
+
+
+def test_scenario_against_stub_kernels(tmp_path, monkeypatch):
+    # The stub kernels must import this package wherever they are started.
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    monkeypatch.setenv('PYTHONPATH', os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')])))
+    monkeypatch.chdir(tmp_path)
+    scenario = LoadScenario(kernels=1, concurrency=2, requests=10, kind='ping')
+
+    result = LoadBenchmark().run_scenario(scenario)
+
+    assert (result['requests'], result['errors']) == (10, {})
+    assert result['throughput'] > 0
+    assert result['resources']['instances'] == 1
+    # Connection files are kept out of the current directory.
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from burdock.lab.errors.http import KernelBusy, KernelUnresponsive
+from burdock.lab.manager import BurdockManager
+
+from tests.fakes import FakeKernelManager, comm_reply
+
+LIST_DFVARS = "__burdock__.data_frame_variables"
+
+
+def _manager(busy_timeout=0.05) -> BurdockManager:
+    manager = BurdockManager(FakeKernelManager(), 'k', busy_timeout=busy_timeout, heartbeat_interval=None)
+    manager.is_installed = True
+    return manager
+
+
+def test_busy_kernel_is_given_up_on_after_the_timeout(clients):
+    async def scenario():
+        manager = _manager()
+        clients[0].status('busy', 'cell')
+
+        with pytest.raises(KernelBusy):
+            await manager.profile('df')
+        assert clients[0].comm_requests == []
+
+    asyncio.run(scenario())
+
+
+def test_requests_wait_for_a_busy_kernel(clients):
+    async def scenario():
+        manager = _manager(busy_timeout=1.0)
+        client = clients[0]
+        client.status('busy', 'cell')
+        asyncio.get_running_loop().call_later(0.01, client.status, 'idle', 'cell')
+
+        assert await manager.profile('df') is None
+        assert len(client.comm_requests) == 1
+
+    asyncio.run(scenario())
+
+
+def test_unresponsive_kernel_is_rejected(clients):
+    async def scenario():
+        manager = _manager()
+        manager.monitor.missed_heartbeats = 3
+
+        with pytest.raises(KernelUnresponsive):
+            await manager.profile('df')
+
+    asyncio.run(scenario())
+
+
+def test_identical_requests_share_one(clients):
+    async def scenario():
+        manager = _manager()
+        client = clients[0]
+        client.on_comm = lambda data: None
+
+        requests = [asyncio.ensure_future(manager.profile(name)) for name in ('df', 'df', 'other')]
+        await asyncio.sleep(0.01)
+        assert [request['name'] for request in client.comm_requests] == ['df', 'other']
+
+        client.release(comm_reply({'status': 'ok', 'found': True, 'report': {'wall': 1.0}}))
+        assert await asyncio.gather(*requests) == [{'wall': 1.0}] * 3
+        assert manager._in_flight == {}
+
+    asyncio.run(scenario())
+
+
+def test_dataframe_list_is_cached_until_another_client_runs_something(clients):
+    async def scenario():
+        manager = _manager()
+        client = clients[0]
+        ours = client.session.session
+
+        await manager.list_dfvars()
+        # Our own requests cannot change the list.
+        client.status('busy', 'ours', session=ours)
+        client.status('idle', 'ours', session=ours)
+        await manager.list_dfvars()
+        assert client.executed.count(LIST_DFVARS) == 1
+
+        client.status('busy', 'cell')
+        client.status('idle', 'cell')
+        await manager.list_dfvars()
+        assert client.executed.count(LIST_DFVARS) == 2
+
+    asyncio.run(scenario())
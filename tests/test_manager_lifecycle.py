@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from burdock.lab.errors.http import KernelUnavailable
+from burdock.lab.manager import INSTALL_CODE, MultiBurdockManager
+
+from tests.fakes import FakeMultiKernelManager
+
+
+def _multi(*kernel_ids):
+    multi = MultiBurdockManager(FakeMultiKernelManager(*kernel_ids), autoload=False)
+    for kernel_id in kernel_ids:
+        multi.create_instance(kernel_id)
+    return multi
+
+
+def test_shutdown_closes_and_removes_the_instance(clients):
+    async def scenario():
+        multi = _multi('k')
+        instance = multi['k']
+        client = clients[0]
+        client.on_execute = lambda code: None
+        pending = asyncio.ensure_future(instance.ping())
+        await asyncio.sleep(0)
+        assert instance.registration_counts()['futures'] == 1
+
+        multi.multi_kernel_manager.shutdown_kernel('k')
+
+        assert 'k' not in multi
+        assert instance.is_closed and not client.channels_running
+        with pytest.raises(KernelUnavailable):
+            await pending
+        assert instance.registration_counts() == {'events': 0, 'futures': 0, 'queues': 0, 'listeners': 0}
+
+    asyncio.run(scenario())
+
+
+def test_kernels_gone_without_shutdown_are_pruned(clients):
+    async def scenario():
+        multi = _multi('k', 'j')
+        instance = multi['k']
+        del multi.multi_kernel_manager.kernels['k']
+
+        assert [model['id'] for model in multi.list_instances()] == ['j']
+        assert instance.is_closed
+
+    asyncio.run(scenario())
+
+
+def test_restart_reinstalls_on_the_next_request(clients):
+    async def scenario():
+        multi = _multi('k')
+        instance = multi['k']
+        client = clients[0]
+        await instance.list_dfvars()
+        await instance.profile('df')
+        comm_id = client.opened_comms[0]
+        assert instance.is_installed
+
+        multi.multi_kernel_manager.restart_kernel('k')
+
+        assert not instance.is_installed
+        assert client.closed_comms == [comm_id]
+        await instance.profile('df')
+        assert client.executed.count(INSTALL_CODE) == 2
+        assert len(client.opened_comms) == 2
+
+    asyncio.run(scenario())
+
+
+def test_pending_requests_fail_when_the_kernel_dies(clients):
+    async def scenario():
+        multi = _multi('k')
+        instance = multi['k']
+        client = clients[0]
+        instance.is_installed = True
+        client.on_execute = lambda code: None
+        pending = asyncio.ensure_future(instance.ping())
+        await asyncio.sleep(0)
+
+        for callback in multi.multi_kernel_manager.get_kernel('k').restart_callbacks['dead']:
+            callback()
+
+        with pytest.raises(KernelUnavailable):
+            await pending
+        assert not instance.is_installed and not instance.is_closed
+
+    asyncio.run(scenario())
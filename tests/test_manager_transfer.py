@@ -0,0 +1,138 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from burdock.lab.analysis.catalog import StructuredInvariant
+from burdock.lab.errors.http import KernelExecutionError
+from burdock.lab.errors.kernel import CommNoReply
+from burdock.lab.handlers import encode_statistics
+from burdock.lab.kernel.buffers import pack_arrays, pack_invariants
+from burdock.lab.manager import BurdockManager
+
+from tests.fakes import FakeKernelManager, comm_reply
+
+
+def _manager() -> BurdockManager:
+    manager = BurdockManager(FakeKernelManager(), 'k', heartbeat_interval=None)
+    manager.is_installed = True
+    return manager
+
+
+def test_column_statistics_are_read_from_the_reply_buffers(clients):
+    arrays = {'mean': np.array([1.5, np.nan]), 'max': np.array([3.0, 4.0])}
+
+    async def scenario():
+        manager = _manager()
+        buffers = []
+        specs = pack_arrays(arrays, buffers)
+        clients[0].on_comm = lambda data: comm_reply({'status': 'ok', 'found': True, 'columns': ['hp', 'mp'],
+                                                      'statistics': {'arrays': specs}}, buffers)
+
+        columns, statistics = await manager.column_statistics('df')
+
+        assert clients[0].comm_requests == [{'request': 'statistics', 'name': 'df', 'binary': True}]
+        assert columns == ['hp', 'mp']
+        for statistic, array in arrays.items():
+            np.testing.assert_array_equal(statistics[statistic], array)
+        assert not statistics['mean'].flags.owndata
+
+    asyncio.run(scenario())
+
+
+def test_column_statistics_as_json(clients):
+    async def scenario():
+        manager = _manager()
+        clients[0].on_comm = lambda data: comm_reply({'status': 'ok', 'found': True, 'columns': ['hp'],
+                                                      'statistics': {'mean': [2.5]}})
+
+        columns, statistics = await manager.column_statistics('df', binary=False)
+
+        assert columns == ['hp']
+        assert statistics['mean'].dtype == np.float64
+        np.testing.assert_array_equal(statistics['mean'], [2.5])
+
+    asyncio.run(scenario())
+
+
+def test_column_statistics_of_a_missing_frame(clients):
+    async def scenario():
+        assert await _manager().column_statistics('df') is None
+
+    asyncio.run(scenario())
+
+
+def test_statistics_encode_nan_as_null():
+    encoded = encode_statistics({'mean': np.array([1.5, np.nan]), 'max': np.array([], dtype=np.float64)})
+
+    assert encoded == {'mean': [1.5, None], 'max': []}
+    assert json.dumps(encoded) == '{"mean": [1.5, null], "max": []}'
+
+
+def test_inspected_invariants_are_unpacked_from_the_reply_buffers(clients):
+    invariants = [StructuredInvariant('hp >= 0', 'bounds', ('hp',), 1.0),
+                  StructuredInvariant('hp <= hp_max', 'comparison', ('hp', 'hp_max'), 0.5)]
+
+    async def scenario():
+        manager = _manager()
+        buffers = []
+        packed = pack_invariants(invariants, buffers)
+        clients[0].on_comm = lambda data: comm_reply(
+            {'status': 'ok', 'found': True,
+             'mimebundle': {'application/json': {'invariants': packed, 'next_cursor': None}}}, buffers)
+
+        page = await manager.inspect('df', limit=10)
+
+        assert clients[0].comm_requests[0]['limit'] == 10
+        assert page['next_cursor'] is None
+        unpacked = page['invariants']
+        assert unpacked['text'] == ['hp >= 0', 'hp <= hp_max']
+        assert [unpacked['kinds'][kind] for kind in unpacked['kind']] == ['bounds', 'comparison']
+        assert [[unpacked['columns'][i] for i in ids] for ids in unpacked['column_ids']] == [['hp'],
+                                                                                            ['hp', 'hp_max']]
+        np.testing.assert_array_equal(unpacked['confidence'], np.array([1.0, 0.5], dtype=np.float32))
+
+    asyncio.run(scenario())
+
+
+def test_inspecting_a_missing_frame(clients):
+    async def scenario():
+        assert await _manager().inspect('df') is None
+
+    asyncio.run(scenario())
+
+
+def test_comm_without_reply_is_an_execution_error_and_reopened(clients):
+    async def scenario():
+        manager = _manager()
+        client = clients[0]
+
+        def no_reply(data):
+            raise CommNoReply(client.opened_comms[-1])
+
+        client.on_comm = no_reply
+        with pytest.raises(KernelExecutionError) as info:
+            await manager.profile('df')
+        assert info.value.status_code == 500
+        assert 'CommNoReply' in info.value.log_message
+        assert manager._comm_id is None
+
+        client.on_comm = lambda data: comm_reply({'status': 'ok', 'found': False})
+        assert await manager.profile('df') is None
+        assert len(client.opened_comms) == 2
+        assert manager._comm_id == client.opened_comms[-1]
+
+    asyncio.run(scenario())
+
+
+def test_agent_errors_are_execution_errors(clients):
+    async def scenario():
+        manager = _manager()
+        clients[0].on_comm = lambda data: comm_reply({'status': 'error', 'ename': 'KeyError', 'evalue': "'x'"})
+
+        with pytest.raises(KernelExecutionError):
+            await manager.profile('df')
+        assert manager._comm_id == clients[0].opened_comms[0]
+
+    asyncio.run(scenario())
@@ -0,0 +1,35 @@
+import tracemalloc
+
+import pytest
+
+from burdock.lab.util.memory import TracedPeak
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def tracing():
+    tracemalloc.start()
+    yield
+    tracemalloc.stop()
+
+
+def test_nothing_is_measured_without_tracing():
+    with TracedPeak() as peak:
+        pass
+
+    assert peak.bytes is None
+
+
+def test_nested_measurements_keep_the_outer_peak(tracing):
+    with TracedPeak() as outer:
+        with TracedPeak() as large:
+            data = bytearray(20 * MB)
+            del data
+        with TracedPeak() as small:
+            data = bytearray(1024)
+            del data
+
+    assert outer.bytes >= 20 * MB
+    assert large.bytes >= 20 * MB
+    assert small.bytes < MB
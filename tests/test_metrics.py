@@ -0,0 +1,52 @@
+from jupyter_client import MultiKernelManager
+
+from burdock.lab.manager import MultiBurdockManager
+from burdock.lab.util.metrics import REGISTRY, MetricsRegistry
+
+
+def test_drain_returns_deltas():
+    registry = MetricsRegistry()
+    registry.inc('hits_total', 'Hits.', result='hit')
+    registry.observe('latency_seconds', 0.2, 'Latency.')
+
+    assert not registry.is_empty()
+    snapshot = registry.drain()
+    assert registry.is_empty()
+
+    merged = MetricsRegistry()
+    merged.merge(snapshot, kernel_id='k1')
+    merged.merge(snapshot, kernel_id='k1')
+    rendered = merged.render()
+    assert 'hits_total{kernel_id="k1",result="hit"} 2.0' in rendered
+    assert 'latency_seconds_count{kernel_id="k1"} 2' in rendered
+
+
+def test_remove_series_by_label():
+    registry = MetricsRegistry()
+    for kernel_id in ('k1', 'k2'):
+        registry.inc('hits_total', 'Hits.', kernel_id=kernel_id, result='hit')
+        registry.observe('latency_seconds', 0.2, 'Latency.', kernel_id=kernel_id)
+        registry.gauge('busy', lambda: 1, 'Busy.', kernel_id=kernel_id)
+    registry.inc('hits_total', 'Hits.', result='hit')
+
+    registry.remove_series(kernel_id='k1')
+
+    rendered = registry.render()
+    assert 'k1' not in rendered
+    assert rendered.count('kernel_id="k2"') > 0
+    assert 'hits_total{result="hit"} 1.0' in rendered
+
+
+def _gauge_value(name: str) -> float:
+    line, = [line for line in REGISTRY.render().splitlines() if line.startswith(name + ' ')]
+    return float(line.split()[1])
+
+
+def test_gauges_count_every_manager():
+    first = MultiBurdockManager(MultiKernelManager(), autoload=False)
+    before = _gauge_value('burdock_instances')
+
+    second = MultiBurdockManager(MultiKernelManager(), autoload=False)
+    first._instances['a'] = second._instances['b'] = object()
+
+    assert _gauge_value('burdock_instances') == before + 2
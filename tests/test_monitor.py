@@ -0,0 +1,137 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from burdock.lab.kernel.message import Message
+from burdock.lab.kernel.monitor import KernelMonitor
+
+OURS = 'burdock-session'
+
+
+class FakeIOPub:
+    def __init__(self):
+        self.listeners = []
+
+    def register_listener(self, predicate, callback):
+        self.listeners.append(callback)
+        return callback
+
+    def unregister_listener(self, record):
+        self.listeners.remove(record)
+
+
+class FakeClient:
+    def __init__(self):
+        self.iopub_channel = FakeIOPub()
+
+
+def _header(msg_id, msg_type, session):
+    return {'msg_id': msg_id, 'msg_type': msg_type, 'username': 'user', 'session': session,
+            'date': datetime.now(), 'version': '5.3'}
+
+
+def _status(monitor, state, parent_id, parent_type='execute_request', session='frontend'):
+    parent = _header(parent_id, parent_type, session) if parent_id else {}
+    msg = Message({'header': _header(f'status-{parent_id}-{state}', 'status', 'kernel'),
+                   'parent_header': parent,
+                   'content': {'execution_state': state}})
+    for listener in monitor.client.iopub_channel.listeners:
+        listener(msg)
+
+
+@pytest.fixture
+def monitor():
+    return KernelMonitor(FakeClient(), 'kernel', session_id=OURS)
+
+
+def test_busy_until_every_request_is_done(monitor):
+    _status(monitor, 'busy', 'a')
+    _status(monitor, 'busy', 'b')
+    _status(monitor, 'idle', 'a')
+    assert monitor.is_busy
+
+    _status(monitor, 'idle', 'b')
+    assert not monitor.is_busy
+    assert monitor.busy_times.summary()['count'] == 1
+
+
+def test_generation_follows_other_sessions_requests(monitor):
+    _status(monitor, 'busy', 'ours', session=OURS)
+    _status(monitor, 'idle', 'ours', session=OURS)
+    assert (monitor.executions, monitor.generation) == (0, 0)
+
+    _status(monitor, 'busy', 'cell')
+    _status(monitor, 'idle', 'cell')
+    assert (monitor.executions, monitor.generation) == (1, 1)
+
+    # e.g. a widget's comm message, which can change variables too.
+    _status(monitor, 'busy', 'widget', parent_type='comm_msg')
+    _status(monitor, 'idle', 'widget', parent_type='comm_msg')
+    assert (monitor.executions, monitor.generation) == (1, 2)
+
+    monitor.reset()
+    assert monitor.generation == 3
+
+
+def test_wait_idle():
+    async def scenario():
+        monitor = KernelMonitor(FakeClient(), 'kernel', session_id=OURS)
+        assert await monitor.wait_idle(0.01)
+
+        _status(monitor, 'busy', 'cell')
+        assert not await monitor.wait_idle(0.01)
+
+        loop = asyncio.get_running_loop()
+        # Status messages arrive on another thread.
+        loop.call_later(0.01, lambda: loop.run_in_executor(None, _status, monitor, 'idle', 'cell'))
+        assert await monitor.wait_idle(1.0)
+
+    asyncio.run(scenario())
+
+
+def test_missed_heartbeats(monitor, monkeypatch):
+    class SilentSocket:
+        async def send(self, data):
+            pass
+
+        async def recv(self):
+            await asyncio.sleep(10)
+
+    async def scenario():
+        for _ in range(3):
+            assert await monitor.heartbeat(SilentSocket()) is None
+
+    monkeypatch.setattr('burdock.lab.kernel.monitor.HEARTBEAT_TIMEOUT', 0.01)
+    asyncio.run(scenario())
+
+    assert monitor.missed_heartbeats == 3
+    assert not monitor.is_responsive
+
+
+def test_wait_idle_on_a_monitor_created_outside_the_loop(monitor):
+    async def scenario():
+        _status(monitor, 'busy', 'cell')
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.01, lambda: loop.run_in_executor(None, _status, monitor, 'idle', 'cell'))
+        return await monitor.wait_idle(1.0)
+
+    assert asyncio.run(scenario())
+
+
+def test_wait_idle_keeps_waiting_if_busy_again():
+    async def scenario():
+        monitor = KernelMonitor(FakeClient(), 'kernel', session_id=OURS)
+        _status(monitor, 'busy', 'a')
+        loop = asyncio.get_running_loop()
+
+        def idle_then_busy():
+            _status(monitor, 'idle', 'a')
+            _status(monitor, 'busy', 'b')
+
+        loop.call_later(0.01, lambda: loop.run_in_executor(None, idle_then_busy))
+        loop.call_later(0.1, lambda: loop.run_in_executor(None, _status, monitor, 'idle', 'b'))
+        assert await monitor.wait_idle(1.0)
+        assert not monitor.is_busy
+
+    asyncio.run(scenario())
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from burdock.lab.analysis.profiles import DEEP, FAST, INVARIANT_FAMILIES, STANDARD, get_profile, relation_candidates
+
+
+def _wide(columns: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({f'c{i}': rng.integers(0, 100, 50) for i in range(columns)})
+
+
+def test_standard_is_the_default():
+    assert get_profile(None) is STANDARD
+    assert STANDARD.daikon_options() == []
+    assert STANDARD.column_groups(_wide(20)) is None
+
+
+def test_standard_relates_each_column_of_a_wide_frame_to_a_few_others_and_a_pair():
+    df = _wide(30)
+    candidates = relation_candidates(df, STANDARD.per_column)
+    groups = STANDARD.column_groups(df)
+
+    for column in df.columns:
+        first, second = candidates[column][:2]
+        assert tuple(sorted((column, first, second), key=list(df.columns).index)) in groups
+    assert {len(group) for group in groups} <= {2, 3}
+    # Pairs within a triple are only analyzed as part of it.
+    triples = [set(group) for group in groups if len(group) == 3]
+    assert not any(set(group) <= triple for group in groups if len(group) == 2 for triple in triples)
+
+
+def test_deep_never_splits_and_lists_more_values():
+    assert DEEP.column_groups(_wide(40)) is None
+    for invariant in INVARIANT_FAMILIES['one_of']:
+        assert f'{invariant}.size=8' in DEEP.daikon_options()
+
+
+def test_unknown_profile():
+    with pytest.raises(KeyError):
+        get_profile('thorough')
+
+
+def test_fast_disables_ternary_and_its_families():
+    options = FAST.daikon_options()
+
+    for family in ('ternary', 'linear', 'modulus', 'nonzero'):
+        for invariant in INVARIANT_FAMILIES[family]:
+            assert f'{invariant}.enabled=false' in options
+    assert not any(invariant in option for invariant in INVARIANT_FAMILIES['bounds'] for option in options)
+    assert not FAST.finds_ternary
+
+
+def test_fast_relates_each_column_of_a_wide_frame_to_a_few_others():
+    df = _wide(30)
+    groups = FAST.column_groups(df)
+
+    assert FAST.column_groups(_wide(10)) is None
+    assert all(len(group) == 2 for group in groups)
+    assert {column for group in groups for column in group} == set(df.columns)
+    assert len(groups) <= len(df.columns) * FAST.per_column
+
+
+def test_relation_candidates_prefer_ordered_columns():
+    df = _wide(5)
+    df['hp_max'] = df['c3'] + 10
+
+    assert relation_candidates(df, 1)['hp_max'] == ['c3']
+    assert relation_candidates(df, 1)['c3'] == ['hp_max']
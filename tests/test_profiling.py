@@ -0,0 +1,40 @@
+import base64
+import marshal
+
+from burdock.lab.util.profiling import ProfileCapture
+from burdock.lab.util.timing import StageTimer
+
+MB = 1024 * 1024
+
+
+def _allocate():
+    return [bytearray(1024) for _ in range(100)]
+
+
+def test_report_covers_the_profiled_block():
+    with ProfileCapture() as capture:
+        kept = _allocate()
+
+    report = capture.report()
+    stats = marshal.loads(base64.b64decode(report['pstats']))
+
+    assert any(function == '_allocate' for _, _, function in stats)
+    assert '_allocate' in report['summary']
+    assert report['peak_traced_bytes'] >= 100 * 1024
+    assert report['top_allocations'] and all(allocation['size'] > 0 for allocation in report['top_allocations'])
+    assert len(kept) == 100
+
+
+def test_peak_covers_every_stage():
+    with ProfileCapture() as capture:
+        timer = StageTimer()
+        with timer.stage('large'):
+            large = bytearray(50 * MB)
+            del large
+        with timer.stage('small'):
+            small = bytearray(1024)
+            del small
+
+    assert capture.report()['peak_traced_bytes'] >= 50 * MB
+    assert timer.stages['large'].peak_bytes >= 50 * MB
+    assert timer.stages['small'].peak_bytes < MB
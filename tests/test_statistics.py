@@ -0,0 +1,50 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from burdock.lab.analysis.statistics import RunningStatistics
+
+
+def _accumulate(series: pd.Series, chunk: int) -> RunningStatistics:
+    statistics = RunningStatistics(series.name)
+    for start in range(0, len(series), chunk):
+        statistics.update(series.iloc[start:start + chunk])
+    return statistics
+
+
+@pytest.mark.parametrize('chunk', [1, 7, 1000])
+def test_matches_describe(chunk):
+    series = pd.Series(np.random.default_rng(0).normal(10, 3, 500), name='hp')
+    series[::11] = np.nan
+
+    statistics = _accumulate(series, chunk)
+    statistics.update_quantiles(series)
+    expected = series.describe()
+
+    constants = statistics.constants()
+    assert list(constants) == [f'hp_{stat}' for stat in expected.index]
+    for stat, value in expected.items():
+        assert constants[f'hp_{stat}'].constant_value == pytest.approx(value)
+
+
+def test_quantiles_only_when_given():
+    series = pd.Series([1, 2, 3, 4], name='hp')
+
+    assert list(_accumulate(series, 2).constants()) == ['hp_count', 'hp_mean', 'hp_std', 'hp_min', 'hp_max']
+
+
+def test_single_value_has_no_std():
+    statistics = _accumulate(pd.Series([5], name='hp'), 1)
+
+    assert statistics.count == 1
+    assert math.isnan(statistics.std)
+
+
+def test_empty_column_has_no_constants():
+    series = pd.Series([np.nan, np.nan], name='hp')
+    statistics = _accumulate(series, 1)
+    statistics.update_quantiles(series)
+
+    assert statistics.constants() == {}
@@ -0,0 +1,53 @@
+import pandas as pd
+
+from burdock.lab.analysis.windows import split_windows, time_windows
+
+
+def test_calendar_windows():
+    windows = time_windows(pd.Timestamp('2020-03-01'), pd.Timestamp('2022-02-01'), 'Y')
+
+    assert [window.label for window in windows] == ['2020', '2021', '2022']
+    assert windows[0].start == pd.Timestamp('2020-01-01')
+    assert windows[0].end == windows[1].start == pd.Timestamp('2021-01-01')
+
+
+def test_rolling_windows_overlap():
+    windows = time_windows(pd.Timestamp('2020-01-01'), pd.Timestamp('2020-03-01'), 'MS', size='60D')
+
+    assert [window.label for window in windows] == ['2020-01-01/2020-03-01',
+                                                    '2020-02-01/2020-04-01',
+                                                    '2020-03-01/2020-04-30']
+    assert windows[1].start < windows[0].end
+
+
+def test_split_by_time_column_skips_empty_windows():
+    df = pd.DataFrame({'date': ['2022-06-01', '2020-01-01', '2020-12-31'], 'hp': [3, 1, 2]})
+
+    split = list(split_windows(df, 'date', 'Y'))
+
+    assert [window.label for window, _ in split] == ['2020', '2022']
+    assert split[0][1]['hp'].tolist() == [1, 2]
+    assert list(split[0][1].columns) == ['hp']
+
+
+def test_split_skips_rows_without_a_time():
+    df = pd.DataFrame({'date': [None, '2020-01-01', 'NaT', '2021-01-01'], 'hp': [0, 1, 2, 3]})
+
+    split = list(split_windows(df, 'date', 'Y'))
+
+    assert [window.label for window, _ in split] == ['2020', '2021']
+    assert [window_df['hp'].tolist() for _, window_df in split] == [[1], [3]]
+
+
+def test_split_by_index():
+    df = pd.DataFrame({'hp': [1, 2]}, index=pd.DatetimeIndex(['2020-01-01', '2020-02-01']))
+
+    split = list(split_windows(df, None, 'M'))
+
+    assert [len(window_df) for _, window_df in split] == [1, 1]
+
+
+def test_no_times():
+    df = pd.DataFrame({'date': [None, None], 'hp': [1, 2]})
+
+    assert list(split_windows(df, 'date', 'Y')) == []